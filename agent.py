@@ -1,17 +1,49 @@
 # agent.py
 
+import os
 import streamlit as st
-import requests
-from datetime import datetime, timedelta
+from datetime import datetime
 from route_finder import format_duration  
-from fuzzywuzzy import process
-from dummyDB import get_all_trains, get_trains, get_nearby_stations
+from recommendations import PRIORITY_PARAM, PRIORITY_ROUTE_KEY, build_prompt, build_route_context
+
+# requests, the fuzzy matcher and the timetable are imported where they are
+# first used, so the page renders before any of them load
 
 
 
 # Constants
 API_BASE_URL = "http://localhost:5000"
-OLLAMA_API_URL = "http://localhost:11434/api/generate"
+
+# Route cards shown per page of search results
+ROUTES_PER_PAGE = 10
+
+@st.cache_resource
+def get_station_index():
+    """Station name index, built once per server process.
+
+    Names are read from the timetable snapshot when the API serves one, so
+    the UI never loads or indexes the trains themselves.
+    """
+    from station_index import StationIndex
+    snapshot_path = os.environ.get("TRAVEL_GUIDE_TIMETABLE")
+    if snapshot_path and not os.environ.get("TRAVEL_GUIDE_DB"):
+        from columnar_timetable import ColumnarTimetable
+        with ColumnarTimetable(snapshot_path) as snapshot:
+            return StationIndex(snapshot.stations)
+    from dummyDB import get_timetable
+    return StationIndex(get_timetable().stations())
+
+@st.cache_resource
+def get_api_client():
+    """Pooled API client shared by every session"""
+    from http_client import ApiClient
+    return ApiClient(API_BASE_URL)
+
+@st.cache_resource
+def get_llm_client():
+    """Ollama client with a disk-backed response cache"""
+    from recommendations import OllamaClient, ResponseCache
+    return OllamaClient(cache=ResponseCache(), session=get_api_client().session)
 
 class TrainRouteUI:
     def __init__(self):
@@ -28,61 +60,86 @@ class TrainRouteUI:
         
     def correct_station_name(self, station_name):
         """Auto-correct station names using fuzzy matching"""
-        all_stations = set(train["source"] for train in get_all_trains()) | set(train["destination"] for train in get_all_trains())
-        match, score = process.extractOne(station_name, all_stations)
-        return match if score > 80 else station_name  # Adjust threshold as needed
+        return get_station_index().correct(station_name, threshold=80)  # Adjust threshold as needed
+
+    def suggest_stations(self, query, limit=5):
+        """Top station suggestions for a partially typed name"""
+        index = get_station_index()
+        completions = index.complete(query, limit)
+        return completions or [name for name, _ in index.suggest(query, limit)]
+
+    def show_station_suggestions(self, station_name):
+        """Show suggestions when a typed name is not a known station"""
+        if station_name not in get_station_index():
+            suggestions = self.suggest_stations(station_name)
+            if suggestions:
+                st.caption("Did you mean: " + ", ".join(suggestions))
 
     def fetch_trains(self, params):
-        """Fetch train data from the API with travel date filtering"""
+        """Fetch train data from the API; travel_date filtering happens on the server"""
+        import requests
+        from http_client import ResponseMemo
+        if "api_memo" not in st.session_state:
+            st.session_state.api_memo = ResponseMemo(ttl_seconds=30)
         try:
-            response = requests.get(f"{API_BASE_URL}/trains", params=params)
-            response.raise_for_status()
-            trains = response.json()
-            
-            # Filter trains based on travel date if provided
-            if "travel_date" in params:
-                travel_date = datetime.strptime(params["travel_date"], "%Y-%m-%d")
-                day_of_week = travel_date.strftime("%a")
-                trains = [train for train in trains if day_of_week in train["days_available"]]
-            
-            return trains
+            return get_api_client().get_json("/trains", params, memo=st.session_state.api_memo)
         except requests.RequestException as e:
             st.error(f"Error fetching train data: {str(e)}")
             return None
 
     def get_llm_recommendation(self, query, context):
         """Get recommendations from the LLM with user preferences"""
-        prompt = f"""
-        You are a smart travel guide assistant. The user's query is "{query}".
-
-        Context:
-        - Source Station: {context['source']}
-        - Destination Station: {context['destination']}
-        - Available Trains: {context['available_trains']}
-        - Seat Availability: {context['seat_availability']}
-        - Travel Date: {context['travel_date']}
-
-        Provide a detailed response including train options, seat availability, and recommendations.
-        Prioritize faster routes if speed is preferred, cheaper routes if cost is preferred, or less crowded routes if comfort is preferred.
-        """
-        
+        return "".join(self.stream_llm_recommendation(query, context))
+
+    def stream_llm_recommendation(self, query, context):
+        """Stream recommendation text from the LLM as it is generated"""
+        import requests
+        prompt = build_prompt(query, context)
         try:
-            response = requests.post(
-                OLLAMA_API_URL,
-                headers={"Content-Type": "application/json"},
-                json={
-                    "model": "qwen2.5:3b",
-                    "prompt": prompt,
-                    "stream": False
-                }
-            )
-            response.raise_for_status()
-            return response.json().get("response", "Unable to generate recommendation.")
+            yield from get_llm_client().stream(prompt)
         except requests.RequestException as e:
-            return f"Error generating recommendation: {str(e)}"
+            yield f"Error generating recommendation: {str(e)}"
 
-    def display_route_card(self, route, is_alternative=False):
-        """Display a single route in a card format"""
+    def route_card(self, route, trains=None):
+        """Prebuilt text for one route card, so reruns only redraw it.
+
+        trains is the train table of a compact response, whose legs are train IDs.
+        """
+        legs = []
+        for i, leg in enumerate(route['legs'], 1):
+            if trains is not None:
+                wait_time = route['wait_times'][i - 2] if i > 1 else None
+                leg = {"train_id": leg, **trains[leg]}
+            else:
+                wait_time = leg.get('wait_time_at_source')
+            lines = [
+                f"**Train:** {leg['train_name']} ({leg['train_id']})",
+                f"**Departure:** {leg['departure_time']} · **Arrival:** {leg['arrival_time']}",
+                f"**Seats Available:** {leg['seats_available']}"
+            ]
+            if i > 1 and wait_time is not None:
+                lines.append(f"**Wait Time:** {format_duration(wait_time)}")
+            if 'transfer_instructions' in leg:
+                lines.append(f"**Transfer Instructions:** {leg['transfer_instructions']}")
+            legs.append((f"Leg {i}: {leg['source']} → {leg['destination']}", "  \n".join(lines)))
+        return {
+            "duration": format_duration(route['total_duration_minutes']),
+            "transfers": str(route['number_of_transfers']),
+            "fare": route.get('estimated_fare'),
+            "legs": legs
+        }
+
+    def prepare_results(self, data):
+        """Format a /trains response once into route cards for the session"""
+        trains = data.get("trains")
+        return {
+            "message": data.get("message"),
+            "direct_routes": [self.route_card(route, trains) for route in data.get("direct_routes", [])],
+            "alternative_routes": [self.route_card(route, trains) for route in data.get("alternative_routes", [])]
+        }
+
+    def display_route_card(self, card, is_alternative=False):
+        """Display a single route in a card format, legs collapsed"""
         with st.container():
             route_type = "Alternative Route" if is_alternative else "Direct Route"
             
@@ -90,45 +147,52 @@ class TrainRouteUI:
             col1, col2, col3 = st.columns([2,1,1])
             with col1:
                 st.subheader(route_type)
+                if card['fare'] is not None:
+                    st.caption(f"Estimated fare ~{card['fare']:.0f}")
             with col2:
-                st.metric("Duration", format_duration(route['total_duration_minutes']))
+                st.metric("Duration", card['duration'])
             with col3:
                 if is_alternative:
-                    st.metric("Transfers", str(route['number_of_transfers']))
+                    st.metric("Transfers", card['transfers'])
 
             # Display route details
-            for i, leg in enumerate(route['legs'], 1):
-                with st.expander(f"Leg {i}: {leg['source']} → {leg['destination']}", expanded=True):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Train:** {leg['train_name']}")
-                        st.write(f"**Train ID:** {leg['train_id']}")
-                        st.write(f"**Seats Available:** {leg['seats_available']}")
-                    with col2:
-                        st.write(f"**Departure:** {leg['departure_time']}")
-                        st.write(f"**Arrival:** {leg['arrival_time']}")
-                        if i > 1 and 'wait_time_at_source' in leg:
-                            st.write(f"**Wait Time:** {format_duration(leg['wait_time_at_source'])}")
-                        if 'transfer_instructions' in leg:
-                            st.write(f"**Transfer Instructions:** {leg['transfer_instructions']}")
-
-    def display_search_results(self, data):
+            for title, details in card['legs']:
+                with st.expander(title, expanded=False):
+                    st.markdown(details)
+
+    def display_route_page(self, name, cards, is_alternative=False):
+        """Display one page of route cards; only the visible cards are rendered"""
+        pages = max(1, -(-len(cards) // ROUTES_PER_PAGE))
+        page = 1
+        if pages > 1:
+            page = st.number_input(
+                f"Page (of {pages}, {len(cards)} routes)",
+                min_value=1,
+                max_value=pages,
+                value=1,
+                key=f"{name}_page_{st.session_state.search_id}"
+            )
+        start = (page - 1) * ROUTES_PER_PAGE
+        for card in cards[start:start + ROUTES_PER_PAGE]:
+            self.display_route_card(card, is_alternative)
+
+    def display_search_results(self, results):
         """Display search results in an organized manner"""
-        if not data:
-            st.warning("No routes found.")
+        if not results["direct_routes"] and not results["alternative_routes"]:
+            st.warning(results["message"] or "No routes found.")
             return
+        if results["message"]:
+            st.info(results["message"])
 
         # Display direct routes
-        if "direct_routes" in data and data["direct_routes"]:
+        if results["direct_routes"]:
             st.markdown("## 🎯 Direct Routes")
-            for route in data["direct_routes"]:
-                self.display_route_card(route)
+            self.display_route_page("direct", results["direct_routes"])
 
         # Display alternative routes
-        if "alternative_routes" in data and data["alternative_routes"]:
+        if results["alternative_routes"]:
             st.markdown("## 🔄 Alternative Routes")
-            for route in data["alternative_routes"]:
-                self.display_route_card(route, is_alternative=True)
+            self.display_route_page("alternative", results["alternative_routes"], is_alternative=True)
 
     def show_search_filters(self):
         """Display and handle search filters"""
@@ -172,10 +236,12 @@ class TrainRouteUI:
                 source = st.text_input("🚉 From Station", key="source")
                 if source:
                     source = self.correct_station_name(source)
+                    self.show_station_suggestions(source)
             with col2:
                 destination = st.text_input("🏁 To Station", key="destination")
                 if destination:
                     destination = self.correct_station_name(destination)
+                    self.show_station_suggestions(destination)
 
         # Advanced Filters
         max_transfers, max_wait_time, include_overnight, priority = self.show_search_filters()
@@ -191,36 +257,56 @@ class TrainRouteUI:
                         "alternative_routes": "true",
                         "max_transfers": str(max_transfers),
                         "max_wait_time": str(max_wait_time),
-                        "include_overnight": str(include_overnight).lower()
+                        "include_overnight": str(include_overnight).lower(),
+                        "priority": PRIORITY_PARAM[priority],
+                        "format": "compact"
                     }
                     data = self.fetch_trains(params)
                     if data:
-                        self.display_search_results(data)
+                        # Kept across reruns, so paging and other widgets do not search again
+                        st.session_state.search_results = self.prepare_results(data)
+                        st.session_state.search_id = st.session_state.get("search_id", 0) + 1
+                    else:
+                        st.session_state.pop("search_results", None)
                 else:
                     st.warning("Please enter both source and destination stations.")
 
         with col2:
             if st.button("💡 Get Smart Recommendations", use_container_width=True):
                 if source and destination:
-                    # Prepare context for LLM
+                    # Prepare a compact context from the top ranked routes
+                    travel_date = datetime.now().strftime("%Y-%m-%d")
+                    top_routes = self.fetch_trains({
+                        "source": source,
+                        "destination": destination,
+                        "alternative_routes": "true",
+                        "limit": "5",
+                        "priority": PRIORITY_PARAM[priority],
+                        "max_transfers": str(max_transfers),
+                        "max_wait_time": str(max_wait_time),
+                        "include_overnight": str(include_overnight).lower(),
+                        "travel_date": travel_date
+                    })
                     context = {
                         "source": source,
                         "destination": destination,
-                        "available_trains": self.fetch_trains({"source": source}),
-                        "seat_availability": "Available",  # This could be more dynamic
-                        "travel_date": datetime.now().strftime("%Y-%m-%d"),
+                        "available_trains": build_route_context(top_routes, sort_key=PRIORITY_ROUTE_KEY[priority]),
+                        "seat_availability": "Listed per route",
+                        "travel_date": travel_date,
                         "priority": priority
                     }
                     
                     with st.spinner("Generating smart recommendations..."):
-                        recommendation = self.get_llm_recommendation(
+                        st.write_stream(self.stream_llm_recommendation(
                             f"Find me the best route from {source} to {destination}",
                             context
-                        )
-                        st.info(recommendation)
+                        ))
                 else:
                     st.warning("Please enter both source and destination stations.")
 
+        if "search_results" in st.session_state:
+            self.display_search_results(st.session_state.search_results)
+
 if __name__ == "__main__":
     app = TrainRouteUI()
     app.run()
\ No newline at end of file
@@ -0,0 +1,114 @@
+# bench_reservations.py
+#
+# Seat reservation contention benchmark. Parallel bookers hold and then
+# confirm or release seats on multi-leg routes from a synthetic timetable,
+# for a range of lock shard counts (1 shard behaves like a global lock).
+#
+#   python bench_reservations.py --threads 1 8 32 --shards 1 64
+
+import argparse
+import random
+import sys
+import threading
+import time
+from typing import Dict, List
+from synthetic_timetable import generate_timetable
+from timetable import TimetableIndex
+from route_finder import find_alternative_routes
+from reservations import SeatInventory, ReservationError
+
+def sample_routes(trains: List[Dict], count: int, seed: int) -> List[List[str]]:
+    """Train IDs of the legs of up to `count` routes between random station pairs"""
+    timetable = TimetableIndex(trains)
+    stations = sorted(timetable.stations())
+    rng = random.Random(seed)
+    routes = []
+    for _ in range(count * 20):
+        source, destination = rng.sample(stations, 2)
+        for route in find_alternative_routes(timetable, source, destination, max_transfers=2)[:3]:
+            routes.append([leg["train_id"] for leg in route.legs])
+        if len(routes) >= count:
+            break
+    return routes[:count]
+
+def run_case(trains: List[Dict], routes: List[List[str]], threads: int, shards: int, duration: float,
+             confirm_ratio: float, seats_per_train: int, seed: int) -> Dict:
+    seats = {train["train_id"]: seats_per_train for train in trains}
+    initial = dict(seats)
+    inventory = SeatInventory(
+        lambda train_ids: {train_id: seats[train_id] for train_id in train_ids if train_id in seats},
+        seats.__setitem__, shards=shards
+    )
+    counts = {"holds": 0, "confirmed": 0, "released": 0, "sold_out": 0}
+    counts_lock = threading.Lock()
+    booked: Dict[str, int] = {}
+    stop = threading.Event()
+
+    def booker(number: int):
+        rng = random.Random(seed + number)
+        local = dict.fromkeys(counts, 0)
+        local_booked: Dict[str, int] = {}
+        while not stop.is_set():
+            legs = rng.choice(routes)
+            try:
+                hold = inventory.hold(legs, rng.randint(1, 3))
+            except ReservationError:
+                local["sold_out"] += 1
+                continue
+            local["holds"] += 1
+            if rng.random() < confirm_ratio:
+                inventory.confirm(hold.hold_id)
+                local["confirmed"] += 1
+                for train_id in hold.train_ids:
+                    local_booked[train_id] = local_booked.get(train_id, 0) + hold.seats
+            else:
+                inventory.release(hold.hold_id)
+                local["released"] += 1
+        with counts_lock:
+            for key, value in local.items():
+                counts[key] += value
+            for train_id, value in local_booked.items():
+                booked[train_id] = booked.get(train_id, 0) + value
+
+    workers = [threading.Thread(target=booker, args=(number,)) for number in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    time.sleep(duration)
+    stop.set()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    # Every confirmed seat must come out of the initial inventory, and no train may be oversold
+    for train_id, count in initial.items():
+        if seats[train_id] < 0 or seats[train_id] != count - booked.get(train_id, 0):
+            raise AssertionError(f"Inconsistent inventory for {train_id}: "
+                                 f"{count} - {booked.get(train_id, 0)} != {seats[train_id]}")
+    return {**counts, "operations_per_sec": (counts["holds"] + counts["sold_out"]) / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent seat reservations")
+    parser.add_argument("--trains", type=int, default=2000)
+    parser.add_argument("--routes", type=int, default=200, help="distinct routes the bookers pick from")
+    parser.add_argument("--threads", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--shards", nargs="+", type=int, default=[1, 64])
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per case")
+    parser.add_argument("--confirm-ratio", type=float, default=0.3, help="share of holds that are confirmed")
+    parser.add_argument("--seats", type=int, default=5000, help="seats per train at the start of each case")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    trains = generate_timetable("hub", args.trains, seed=args.seed)
+    routes = sample_routes(trains, args.routes, args.seed)
+    print(f"{len(trains)} trains, {len(routes)} routes", file=sys.stderr)
+    for shards in args.shards:
+        for threads in args.threads:
+            case = run_case(trains, routes, threads, shards, args.duration, args.confirm_ratio,
+                            args.seats, args.seed)
+            print(f"  shards {shards:4d}  threads {threads:4d}  {case['operations_per_sec']:10.0f} ops/s  "
+                  f"holds {case['holds']:8d}  confirmed {case['confirmed']:7d}  sold out {case['sold_out']:7d}",
+                  file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
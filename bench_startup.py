@@ -0,0 +1,131 @@
+# bench_startup.py
+#
+# Cold-start benchmark. Each case runs in a fresh interpreter, as a newly
+# scaled-out worker would: loading a timetable file row by row versus as a
+# snapshot, importing the API, and serving its first request. Reports the
+# time inside the process, the whole process lifetime and the process's
+# peak resident memory. The mapped case only reads columns in place, for
+# comparison with the private copy every snapshot-loading worker builds.
+#
+#   python bench_startup.py --trains 10000 100000
+#   python bench_startup.py --snapshot timetable.ttc --runs 10
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+from synthetic_timetable import TOPOLOGIES, generate_timetable
+from columnar_timetable import ColumnarTimetable, write_columnar
+
+# Code timed in the child process for each case
+CASES = {
+    # Interpreter start alone, the baseline for memory
+    "empty": "pass\n",
+    # Looking up departures straight from the mapped columns
+    "mapped": (
+        "from columnar_timetable import ColumnarTimetable\n"
+        "table = ColumnarTimetable(PATH)\n"
+        "for station in table.stations:\n"
+        "    table.from_source(station)\n"
+    ),
+    # Version 1 loading: decode each row, then index each train
+    "rows": (
+        "from columnar_timetable import ColumnarTimetable\n"
+        "from timetable import TimetableIndex\n"
+        "with ColumnarTimetable(PATH) as table:\n"
+        "    trains = [table.train(row) for row in range(len(table))]\n"
+        "TimetableIndex(trains)\n"
+    ),
+    "snapshot": (
+        "from columnar_timetable import load_snapshot\n"
+        "load_snapshot(PATH)\n"
+    ),
+    "api_import": "import main\n",
+    "first_request": (
+        "import main\n"
+        "main.app.test_client().get('/trains', query_string={'source': SOURCE, 'destination': DESTINATION, "
+        "'alternative_routes': 'true'})\n"
+    ),
+}
+
+CHILD = """import json, time
+started = time.perf_counter()
+PATH, SOURCE, DESTINATION = {path!r}, {source!r}, {destination!r}
+{body}
+elapsed = (time.perf_counter() - started) * 1000
+try:
+    # ru_maxrss would include the parent's peak from before exec on Linux
+    with open("/proc/self/status") as status:
+        peak = next(int(line.split()[1]) for line in status if line.startswith("VmHWM:"))
+except OSError:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"ms": elapsed, "rss_kib": peak}}))
+"""
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_case(case: str, path: str, source: str, destination: str, runs: int) -> Dict:
+    """Run one case in fresh interpreters, timing the case code and the whole process"""
+    code = CHILD.format(path=path, source=source, destination=destination, body=CASES[case])
+    env = {**os.environ, "TRAVEL_GUIDE_TIMETABLE": path}
+    env.pop("TRAVEL_GUIDE_DB", None)
+    inside, process, memory = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        process.append((time.perf_counter() - started) * 1000)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        inside.append(result["ms"])
+        memory.append(result["rss_kib"])
+    return {
+        "rss_mib": percentile(memory, 0.50) / 1024,
+        "p50_ms": percentile(inside, 0.50),
+        "max_ms": max(inside),
+        "process_p50_ms": percentile(process, 0.50),
+        "process_max_ms": max(process),
+    }
+
+def run_file(label: str, path: str, args):
+    with ColumnarTimetable(path) as table:
+        print(f"{label}: {len(table)} trains, {len(table.stations)} stations, {table.nbytes / 1024:.0f} KiB", file=sys.stderr)
+        # The first request follows one train out of the least served station, so it
+        # measures the cold request path rather than a large search
+        source = min((station for station in table.stations if table.rows_from(station)),
+                     key=lambda station: len(table.rows_from(station)))
+        destination = table.train(table.rows_from(source)[0])["destination"]
+    for case in args.cases:
+        result = run_case(case, path, source, destination, args.runs)
+        print(f"  {case:<14} p50 {result['p50_ms']:9.1f} ms  max {result['max_ms']:9.1f} ms  "
+              f"process p50 {result['process_p50_ms']:9.1f} ms  max {result['process_max_ms']:9.1f} ms  "
+              f"peak rss {result['rss_mib']:7.1f} MiB",
+              file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker cold start")
+    parser.add_argument("--snapshot", help="benchmark this timetable file instead of synthetic ones")
+    parser.add_argument("--topology", choices=TOPOLOGIES, default="hub")
+    parser.add_argument("--trains", nargs="+", type=int, default=[10000, 100000], help="synthetic timetable sizes")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--runs", type=int, default=5, help="fresh processes per case")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.snapshot:
+        run_file(args.snapshot, args.snapshot, args)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.trains:
+            path = os.path.join(directory, f"{args.topology}-{size}.ttc")
+            write_columnar(generate_timetable(args.topology, size, seed=args.seed), path)
+            run_file(f"{args.topology}/{size}", path, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# bench_suite.py
+#
+# Route finder benchmark suite over synthetic timetables. For each topology,
+# size, search mode and max_transfers it reports latency percentiles,
+# routes/sec and peak memory, and can save or compare JSON baselines.
+#
+#   python bench_suite.py --topology hub grid --trains 1000 10000 --save baseline.json
+#   python bench_suite.py --trains 1000 10000 --compare baseline.json
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+import dummyDB
+from synthetic_timetable import TOPOLOGIES, generate_timetable
+from route_finder import find_alternative_routes
+from connection_scan import find_routes_csa
+from ranked_search import find_top_k_routes
+from pareto_search import find_pareto_routes
+from goal_directed import find_routes_bidirectional
+
+MODES = ("get_trains", "dfs", "csa", "topk", "pareto", "bidirectional", "http")
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def search_function(mode: str, max_transfers: int) -> Callable[[str, str], int]:
+    """Return a callable running one query in the given mode and returning the number of routes"""
+    timetable = dummyDB.get_timetable()
+    if mode == "get_trains":
+        return lambda source, destination: len(dummyDB.get_trains(source, destination))
+    if mode == "dfs":
+        return lambda source, destination: len(find_alternative_routes(timetable, source, destination, max_transfers))
+    if mode == "csa":
+        return lambda source, destination: len(find_routes_csa(timetable, source, destination, max_transfers))
+    if mode == "topk":
+        return lambda source, destination: len(find_top_k_routes(timetable, source, destination, k=10, max_transfers=max_transfers)[0])
+    if mode == "pareto":
+        return lambda source, destination: len(find_pareto_routes(timetable, source, destination, max_transfers))
+    if mode == "bidirectional":
+        return lambda source, destination: len(find_routes_bidirectional(timetable, source, destination, max_transfers))
+    if mode == "http":
+        from main import app, route_cache
+        client = app.test_client()
+
+        def query(source, destination):
+            # Measure searches, not cache hits
+            route_cache.invalidate()
+            data = client.get("/trains", query_string={
+                "source": source, "destination": destination, "alternative_routes": "true",
+                "max_transfers": max_transfers, "max_wait_time": 24 * 60
+            }).get_json()
+            return len(data["direct_routes"]) + len(data["alternative_routes"])
+        return query
+    raise ValueError(f"Unknown mode: {mode}")
+
+def run_case(mode: str, max_transfers: int, pairs: List, budget: float) -> Dict:
+    """Time one mode over the query pairs, stopping early once the time budget is spent"""
+    query = search_function(mode, max_transfers)
+    latencies = []
+    routes = 0
+    started = time.perf_counter()
+    for source, destination in pairs:
+        begin = time.perf_counter()
+        routes += query(source, destination)
+        latencies.append(time.perf_counter() - begin)
+        if time.perf_counter() - started > budget:
+            break
+    elapsed = sum(latencies)
+
+    # Peak memory is measured separately because tracemalloc slows everything down
+    tracemalloc.start()
+    for source, destination in pairs[:max(1, min(len(latencies), 5))]:
+        query(source, destination)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "queries": len(latencies),
+        "truncated": len(latencies) < len(pairs),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "routes": routes,
+        "routes_per_sec": routes / elapsed if elapsed else 0.0,
+        "peak_memory_kb": peak / 1024
+    }
+
+def run_suite(args) -> Dict:
+    results = {}
+    for topology in args.topology:
+        for size in args.trains:
+            trains = generate_timetable(topology, size, args.departures, seed=args.seed)
+            started = time.perf_counter()
+            dummyDB.load_trains(trains)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            rng = random.Random(args.seed)
+            stations = sorted(dummyDB.get_timetable().stations())
+            pairs = [tuple(rng.sample(stations, 2)) for _ in range(args.queries)]
+            print(f"{topology} {size} trains, {len(stations)} stations, index built in {load_ms:.1f} ms", file=sys.stderr)
+
+            for mode in args.modes:
+                for max_transfers in ([0] if mode == "get_trains" else args.max_transfers):
+                    case = run_case(mode, max_transfers, pairs, args.budget)
+                    case["index_build_ms"] = load_ms
+                    name = f"{topology}/{size}/{mode}/t{max_transfers}"
+                    results[name] = case
+                    print(f"  {name:<28} p50 {case['p50_ms']:9.3f} ms  p95 {case['p95_ms']:9.3f} ms  "
+                          f"p99 {case['p99_ms']:9.3f} ms  {case['routes_per_sec']:11.1f} routes/s  "
+                          f"peak {case['peak_memory_kb']:9.1f} KiB{'  (truncated)' if case['truncated'] else ''}",
+                          file=sys.stderr)
+    return results
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Return regressions where latency grew by more than threshold over the baseline"""
+    regressions = []
+    for name, case in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            if previous[metric] > 0 and case[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name} {metric}: {previous[metric]:.3f} -> {case[metric]:.3f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark route search over synthetic timetables")
+    parser.add_argument("--topology", nargs="+", choices=TOPOLOGIES, default=list(TOPOLOGIES))
+    parser.add_argument("--trains", nargs="+", type=int, default=[1000, 10000], help="timetable sizes (1k-500k)")
+    parser.add_argument("--departures", type=int, default=4, help="departures per day on each link")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--max-transfers", nargs="+", type=int, default=[0, 1, 2])
+    parser.add_argument("--queries", type=int, default=100, help="random origin/destination pairs per case")
+    parser.add_argument("--budget", type=float, default=30.0, help="seconds per case before truncating")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write results to this baseline JSON file")
+    parser.add_argument("--compare", help="compare against this baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed latency growth before a regression")
+    args = parser.parse_args()
+
+    results = run_suite(args)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results
+            }, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
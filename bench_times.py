@@ -0,0 +1,73 @@
+# bench_times.py
+#
+# Compares the old strptime-based time arithmetic with the compiled
+# integer-minute train records used by the route finder.
+#
+#   python bench_times.py [--repeat N]
+
+import argparse
+import timeit
+from datetime import datetime, timedelta
+from dummyDB import get_all_trains, get_timetable
+from route_finder import find_alternative_routes, format_route_details
+
+def strptime_duration(departure: str, arrival: str) -> int:
+    """Reference implementation: duration via datetime.strptime"""
+    dep = datetime.strptime(departure, "%H:%M")
+    arr = datetime.strptime(arrival, "%H:%M")
+    duration = arr - dep
+    if duration.days < 0:
+        duration += timedelta(days=1)
+    return int(duration.total_seconds() / 60)
+
+def strptime_legs(trains):
+    """Duration and wait for every consecutive pair of trains, parsing strings"""
+    total = 0
+    for previous, train in zip(trains, trains[1:]):
+        total += strptime_duration(train["departure_time"], train["arrival_time"])
+        total += strptime_duration(previous["arrival_time"], train["departure_time"])
+    return total
+
+def compiled_legs(records):
+    """Duration and wait for every consecutive pair of trains, using compiled minutes"""
+    total = 0
+    for previous, train in zip(records, records[1:]):
+        total += train.duration
+        total += previous.wait_until(train)
+    return total
+
+def route_search(timetable, stations, max_transfers):
+    """Search and format routes between every pair of stations"""
+    for source in stations:
+        for destination in stations:
+            if source != destination:
+                for route in find_alternative_routes(timetable, source, destination, max_transfers):
+                    format_route_details(route)
+
+def report(name, seconds, number, baseline=None):
+    per_call = seconds / number * 1e6
+    speedup = f"  ({baseline / seconds:.1f}x faster)" if baseline else ""
+    print(f"{name:<32} {per_call:10.2f} us/call{speedup}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compiled train times against strptime")
+    parser.add_argument("--repeat", type=int, default=2000, help="iterations per measurement")
+    args = parser.parse_args()
+
+    trains = get_all_trains()
+    timetable = get_timetable()
+    records = [timetable.record(train["train_id"]) for train in trains]
+    assert strptime_legs(trains) == compiled_legs(records)
+
+    strptime_time = timeit.timeit(lambda: strptime_legs(trains), number=args.repeat)
+    compiled_time = timeit.timeit(lambda: compiled_legs(records), number=args.repeat)
+    report("leg arithmetic (strptime)", strptime_time, args.repeat)
+    report("leg arithmetic (compiled)", compiled_time, args.repeat, strptime_time)
+
+    stations = sorted(timetable.stations())
+    number = max(1, args.repeat // 100)
+    search_time = timeit.timeit(lambda: route_search(timetable, stations, 3), number=number)
+    report("all-pairs search + format", search_time, number)
+
+if __name__ == "__main__":
+    main()
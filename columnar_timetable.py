@@ -0,0 +1,323 @@
+# columnar_timetable.py
+#
+# Compact binary timetable: one column per field, interned station IDs,
+# uint16 minute times, uint8 day bitmasks and uint16 seat counts. Files are
+# opened with mmap, and a ColumnarTimetable reads its columns in place,
+# building train dicts only for the rows asked for. Version 2 files also
+# store the timetable's station indexes, so a file doubles as a startup
+# snapshot: load_snapshot() rebuilds the train list and TimetableIndex in
+# bulk, without parsing times or rehashing trains one by one. That decoded
+# timetable is an ordinary per-process copy, as searches and live updates
+# need, so serving from a snapshot saves startup time and disk space but
+# does not share memory between worker processes.
+#
+#   python columnar_timetable.py timetable.ttc              # convert dummyDB's trains
+#   python columnar_timetable.py timetable.ttc trains.json  # convert a JSON list of trains
+
+import gc
+import json
+import mmap
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Tuple
+from timetable import ALL_DAYS, DAY_NAMES, MINUTES_PER_DAY, CompiledTrain, TimetableIndex, days_mask, parse_time
+
+MAGIC = b"TTCOL\x00\x00\x01"
+FORMAT_VERSION = 2
+
+# Section name and array typecode, in file order
+SECTIONS = (
+    ("station_offsets", "I"),
+    ("station_names", "B"),
+    ("source_rows", "I"),
+    ("source", "I"),
+    ("destination", "I"),
+    ("departure", "H"),
+    ("arrival", "H"),
+    ("days", "B"),
+    ("seats", "H"),
+    ("popularity", "f"),
+    ("id_offsets", "I"),
+    ("ids", "B"),
+    ("name_offsets", "I"),
+    ("names", "B"),
+    ("pair_rows", "I"),
+    ("arrival_rows", "I"),
+    ("destination_rows", "I"),
+)
+
+# magic, format version, byte order, train count, station count
+HEADER = struct.Struct("<8sHBxII")
+# offset and length in bytes of each section
+SECTION_ENTRY = struct.Struct("<QQ")
+ALIGNMENT = 8
+
+def _format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _days_list(mask: int) -> List[str]:
+    if mask == ALL_DAYS:
+        return ["Daily"]
+    return [day for bit, day in enumerate(DAY_NAMES) if mask >> bit & 1]
+
+# Time strings and running-day lists by minute and bitmask, for bulk decoding
+TIMES = [_format_time(minutes) for minutes in range(MINUTES_PER_DAY)]
+DAY_LISTS = [tuple(_days_list(mask)) for mask in range(ALL_DAYS + 1)]
+
+@contextmanager
+def _collection_paused():
+    # Bulk loads allocate objects that all survive; collecting them midway only costs time
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+def _string_table(values: Iterable[str]):
+    offsets = array("I", [0])
+    blob = bytearray()
+    for value in values:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    return offsets, array("B", blob)
+
+def write_columnar(trains: Iterable[Dict], path: str):
+    """Convert trains in dummyDB's dict format to a columnar timetable file"""
+    # Rows are grouped by source station so departures are one contiguous range,
+    # and by destination within it so each station pair is one too
+    trains = sorted(trains, key=lambda train: (train["source"], train["destination"]))
+    stations = sorted({train["source"] for train in trains} | {train["destination"] for train in trains})
+    station_ids = {station: number for number, station in enumerate(stations)}
+
+    columns = {name: array(typecode) for name, typecode in SECTIONS}
+    columns["station_offsets"], columns["station_names"] = _string_table(stations)
+    columns["id_offsets"], columns["ids"] = _string_table(train["train_id"] for train in trains)
+    columns["name_offsets"], columns["names"] = _string_table(train.get("train_name", "") for train in trains)
+    for train in trains:
+        columns["source"].append(station_ids[train["source"]])
+        columns["destination"].append(station_ids[train["destination"]])
+        columns["departure"].append(parse_time(train["departure_time"]))
+        columns["arrival"].append(parse_time(train["arrival_time"]))
+        columns["days"].append(days_mask(train["days_available"]))
+        columns["seats"].append(min(train.get("seats_available", 0), 0xFFFF))
+        columns["popularity"].append(train.get("popularity", 0.0))
+
+    # source_rows[s]:source_rows[s + 1] are the rows departing from station s
+    source_rows = columns["source_rows"]
+    row = 0
+    for station in range(len(stations)):
+        source_rows.append(row)
+        while row < len(trains) and columns["source"][row] == station:
+            row += 1
+    source_rows.append(row)
+
+    # pair_rows holds the first row of each station pair, then the row count
+    source, destination = columns["source"], columns["destination"]
+    columns["pair_rows"].extend(
+        row for row in range(len(trains))
+        if row == 0 or source[row] != source[row - 1] or destination[row] != destination[row - 1]
+    )
+    columns["pair_rows"].append(len(trains))
+    # arrival_rows lists rows by destination; destination_rows[s]:destination_rows[s + 1] arrive at station s
+    columns["arrival_rows"].extend(sorted(range(len(trains)), key=destination.__getitem__))
+    arrivals = [0] * (len(stations) + 1)
+    for station in destination:
+        arrivals[station + 1] += 1
+    for station in range(len(stations)):
+        arrivals[station + 1] += arrivals[station]
+    columns["destination_rows"].extend(arrivals)
+
+    table_size = HEADER.size + SECTION_ENTRY.size * len(SECTIONS)
+    offset = -table_size % ALIGNMENT + table_size
+    entries = []
+    for name, _ in SECTIONS:
+        length = len(columns[name]) * columns[name].itemsize
+        entries.append((offset, length))
+        offset += length + (-length % ALIGNMENT)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == "little", len(trains), len(stations)))
+        for entry in entries:
+            f.write(SECTION_ENTRY.pack(*entry))
+        for (name, _), (offset, length) in zip(SECTIONS, entries):
+            f.write(b"\x00" * (offset - f.tell()))
+            columns[name].tofile(f)
+        f.write(b"\x00" * (-f.tell() % ALIGNMENT))
+
+class ColumnarTimetable:
+    """Read-only, memory-mapped view of a columnar timetable file.
+
+    Columns are memoryviews over the mapping; train dicts are only built
+    for the rows a caller asks for.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, little_endian, self.train_count, self.station_count = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} columnar timetable")
+        if bool(little_endian) != (sys.byteorder == "little"):
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+
+        self.columns: Dict[str, memoryview] = {}
+        for number, (name, typecode) in enumerate(SECTIONS):
+            offset, length = SECTION_ENTRY.unpack_from(buffer, HEADER.size + number * SECTION_ENTRY.size)
+            self.columns[name] = buffer[offset:offset + length].cast(typecode)
+        self.stations = self.strings("station_offsets", "station_names")
+        self.station_ids = {station: number for number, station in enumerate(self.stations)}
+
+    def __len__(self) -> int:
+        return self.train_count
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self.train(row) for row in range(self.train_count))
+
+    def close(self):
+        """Release the column views and unmap the file"""
+        for column in self.columns.values():
+            column.release()
+        self.columns.clear()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mapped file"""
+        return len(self._mmap)
+
+    def _string(self, offsets: str, blob: str, row: int) -> str:
+        start, end = self.columns[offsets][row], self.columns[offsets][row + 1]
+        return bytes(self.columns[blob][start:end]).decode("utf-8")
+
+    def strings(self, offsets: str, blob: str) -> List[str]:
+        """Decode a whole string table at once"""
+        data = bytes(self.columns[blob])
+        bounds = self.columns[offsets].tolist()
+        if data.isascii():
+            # Byte offsets are character offsets, so one decode serves every string
+            text = data.decode("ascii")
+            return [text[start:end] for start, end in zip(bounds, bounds[1:])]
+        return [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+    def trains(self) -> List[Dict]:
+        """Build the dummyDB-format dicts for every row, a column at a time"""
+        columns = self.columns
+        stations = self.stations
+        popularity = columns["popularity"].tolist()
+        # Popularities usually take few distinct values, so each is rounded once
+        rounded = {value: round(value, 4) for value in set(popularity)}
+        with _collection_paused():
+            return [
+                {
+                    "train_id": train_id,
+                    "train_name": name,
+                    "source": stations[source],
+                    "destination": stations[destination],
+                    "departure_time": TIMES[departure],
+                    "arrival_time": TIMES[arrival],
+                    "days_available": list(DAY_LISTS[days]),
+                    "seats_available": seats,
+                    "popularity": rounded[popularity]
+                }
+                for train_id, name, source, destination, departure, arrival, days, seats, popularity in zip(
+                    self.strings("id_offsets", "ids"), self.strings("name_offsets", "names"),
+                    columns["source"].tolist(), columns["destination"].tolist(),
+                    columns["departure"].tolist(), columns["arrival"].tolist(), columns["days"].tolist(),
+                    columns["seats"].tolist(), popularity
+                )
+            ]
+
+    def index(self, trains: List[Dict]) -> TimetableIndex:
+        """Build the TimetableIndex for trains() from the stored station indexes"""
+        columns = self.columns
+        pair_rows = columns["pair_rows"].tolist()
+        arrival_rows = columns["arrival_rows"].tolist()
+        destination_rows = columns["destination_rows"].tolist()
+        arrivals = {
+            station: arrival_rows[start:end]
+            for station, start, end in zip(self.stations, destination_rows, destination_rows[1:])
+            if start < end
+        }
+        with _collection_paused():
+            records = [
+                CompiledTrain.from_columns(train, departure, arrival, days)
+                for train, departure, arrival, days in zip(
+                    trains, columns["departure"].tolist(), columns["arrival"].tolist(), columns["days"].tolist()
+                )
+            ]
+            return TimetableIndex.from_groups(trains, records, zip(pair_rows, pair_rows[1:]), arrivals)
+
+    def train(self, row: int) -> Dict:
+        """Build the dummyDB-format dict for one row"""
+        columns = self.columns
+        return {
+            "train_id": self._string("id_offsets", "ids", row),
+            "train_name": self._string("name_offsets", "names", row),
+            "source": self.stations[columns["source"][row]],
+            "destination": self.stations[columns["destination"][row]],
+            "departure_time": _format_time(columns["departure"][row]),
+            "arrival_time": _format_time(columns["arrival"][row]),
+            "days_available": _days_list(columns["days"][row]),
+            "seats_available": columns["seats"][row],
+            "popularity": round(columns["popularity"][row], 4)
+        }
+
+    def rows_from(self, station: str) -> range:
+        """Rows of trains departing from a station"""
+        number = self.station_ids.get(station)
+        if number is None:
+            return range(0)
+        rows = self.columns["source_rows"]
+        return range(rows[number], rows[number + 1])
+
+    def from_source(self, station: str) -> List[Dict]:
+        """Trains departing from a station"""
+        return [self.train(row) for row in self.rows_from(station)]
+
+    def between(self, source: str, destination: str) -> List[Dict]:
+        """Direct trains from source to destination"""
+        target = self.station_ids.get(destination)
+        column = self.columns["destination"]
+        return [self.train(row) for row in self.rows_from(source) if column[row] == target]
+
+def load_columnar(path: str) -> List[Dict]:
+    """Read a columnar timetable file into a list of train dicts"""
+    with ColumnarTimetable(path) as timetable:
+        return timetable.trains()
+
+def load_snapshot(path: str) -> Tuple[List[Dict], TimetableIndex]:
+    """Read a columnar timetable file into train dicts and their TimetableIndex.
+
+    Everything is decoded, so the file is unmapped before this returns.
+    """
+    with ColumnarTimetable(path) as timetable:
+        trains = timetable.trains()
+        return trains, timetable.index(trains)
+
+def main():
+    if len(sys.argv) not in (2, 3):
+        sys.exit("usage: python columnar_timetable.py OUTPUT [TRAINS_JSON]")
+    if len(sys.argv) == 3:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            trains = json.load(f)
+    else:
+        from dummyDB import get_all_trains
+        trains = get_all_trains()
+    write_columnar(trains, sys.argv[1])
+    with ColumnarTimetable(sys.argv[1]) as timetable:
+        print(f"Wrote {len(timetable)} trains and {timetable.station_count} stations "
+              f"to {sys.argv[1]} ({timetable.nbytes} bytes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# connection_scan.py
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import date
+from typing import List, Dict, Optional, Tuple
+from metrics import record_search
+from timetable import TimetableIndex, CompiledTrain, parse_time, MINUTES_PER_DAY
+from route_finder import Route, as_timetable
+
+INFINITY = float("inf")
+
+class ConnectionScanner:
+    """Connection Scan Algorithm over a departure-time-sorted connection array.
+
+    Each train is one connection in a single service day. Queries unroll the
+    day over as many days as the transfer limit needs, so overnight legs and
+    waits are handled without duplicating the array.
+    """
+
+    def __init__(self, timetable: TimetableIndex):
+        self.version = timetable.version
+        connections = [self._connection(train) for train in timetable.records.values()]
+        connections.sort(key=lambda c: (c[0], c[1]))
+        self.connections: List[Tuple[int, int, str, str, Dict, int]] = connections
+        self.departures = [c[0] for c in connections]
+
+    @staticmethod
+    def _connection(train: CompiledTrain) -> Tuple:
+        return (train.departure, train.departure + train.duration, train.source, train.destination, train.train, train.days)
+
+    def insert(self, train: CompiledTrain):
+        """Add one train's connection in departure order.
+
+        The arrays are replaced rather than edited in place, so scans already
+        running keep a consistent snapshot.
+        """
+        connection = self._connection(train)
+        connections = list(self.connections)
+        insort(connections, connection, key=lambda c: (c[0], c[1]))
+        self.connections, self.departures = connections, [c[0] for c in connections]
+
+    def remove(self, train: Dict):
+        """Drop a train's connection"""
+        connections = [c for c in self.connections if c[4] is not train]
+        self.connections, self.departures = connections, [c[0] for c in connections]
+
+    def scan(self, source: str, destination: str, max_transfers: int = 2, departure_time: str = "00:00",
+             max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+             include_overnight: bool = True) -> List[Route]:
+        """Return the Pareto set of (arrival time, transfers) journeys in one pass.
+
+        As in find_alternative_routes, the first train leaves on day 0, which
+        is travel_date, later trains are boarded within a day of arriving,
+        and connections are skipped when their train does not run that day.
+        With a wait limit or a travel date an earlier arrival can miss a
+        connection a later one catches, so every arrival is kept.
+        """
+        max_legs = max_transfers + 1
+        start = parse_time(departure_time)
+        weekday = travel_date.weekday() if travel_date else None
+        # Each leg plus the wait before it spans less than two days
+        horizon_days = 2 * max_legs + 1 if include_overnight else 1
+        if max_wait_time is not None or weekday is not None:
+            # Waits are taken modulo a day, as in CompiledTrain.wait_until
+            max_wait_time = MINUTES_PER_DAY - 1 if max_wait_time is None else min(max_wait_time, MINUTES_PER_DAY - 1)
+            return self._scan_labels(source, destination, max_legs, start, max_wait_time, weekday,
+                                     horizon_days, include_overnight)
+
+        # arrival[k][station]: earliest arrival using at most k legs
+        arrival: List[Dict[str, int]] = [{source: start} for _ in range(max_legs + 1)]
+        # parent[k][station]: (connection, legs used before boarding it)
+        parent: List[Dict[str, Tuple]] = [{} for _ in range(max_legs + 1)]
+
+        # Live updates swap in new arrays; keep the ones this scan started with
+        connections = self.connections
+        first = bisect_left(self.departures, start)
+        scanned = pruned = 0
+        for day in range(horizon_days):
+            offset = day * MINUTES_PER_DAY
+            for index in range(first if day == 0 else 0, len(connections)):
+                connection = connections[index]
+                departure = connection[0] + offset
+                # Nothing departing after the one-leg arrival, the latest of
+                # every leg count, can improve any of them
+                if departure >= arrival[1].get(destination, INFINITY):
+                    return self._finish(arrival, parent, destination, max_legs, scanned, pruned)
+                scanned += 1
+                _, arrives, from_station, to_station, _, _ = connection
+                arrives += offset
+                if not include_overnight and arrives >= MINUTES_PER_DAY:
+                    pruned += 1
+                    continue
+                for legs in range(1, max_legs + 1):
+                    reached = arrival[legs - 1].get(from_station, INFINITY)
+                    # The first train leaves on day 0
+                    if reached > departure or (legs == 1 and offset):
+                        continue
+                    if arrives >= arrival[legs].get(to_station, INFINITY):
+                        continue
+                    for level in range(legs, max_legs + 1):
+                        if arrives < arrival[level].get(to_station, INFINITY):
+                            arrival[level][to_station] = arrives
+                            parent[level][to_station] = (connection, offset, legs - 1)
+                    break
+        return self._finish(arrival, parent, destination, max_legs, scanned, pruned)
+
+    @staticmethod
+    def _parents(candidates: List[Tuple], to_station: str, max_legs: int) -> List[Tuple]:
+        """Labels worth extending to to_station, for each number of legs.
+
+        A label is dropped when another with as many legs left no earlier and
+        passed through no station it did not, since that one can go anywhere
+        it can.
+        """
+        kept: Dict[int, List[Tuple]] = {}
+        for label in candidates:
+            legs, first_departure, visited = label[1], label[2], label[6]
+            if legs >= max_legs or to_station in visited:
+                continue
+            others = kept.setdefault(legs, [])
+            if any(other[2] >= first_departure and other[6] <= visited for other in others):
+                continue
+            others[:] = [other for other in others if not (first_departure >= other[2] and visited <= other[6])]
+            others.append(label)
+        return [label for labels in kept.values() for label in labels]
+
+    def _scan_labels(self, source: str, destination: str, max_legs: int, start: int, max_wait_time: int,
+                     weekday: Optional[int], horizon_days: int, include_overnight: bool) -> List[Route]:
+        """Scan keeping every arrival at each station, for searches with a wait limit or a travel date.
+
+        Labels are (arrival, legs, first departure, connection, day offset,
+        parent label, stations visited). A connection is boarded from the
+        labels within max_wait_time before it, as given by _parents, and never
+        leads back to a station its journey has passed.
+        """
+        # station -> arrival times, and the labels in the same order
+        times: Dict[str, List[int]] = {}
+        labels: Dict[str, List[Tuple]] = {}
+        # legs -> earliest label at the destination
+        best: Dict[int, Tuple] = {}
+
+        connections = self.connections
+        first = bisect_left(self.departures, start)
+        scanned = pruned = 0
+        for day in range(horizon_days):
+            offset = day * MINUTES_PER_DAY
+            day_bit = 1 << ((weekday + day) % 7) if weekday is not None else None
+            for index in range(first if day == 0 else 0, len(connections)):
+                connection = connections[index]
+                departure = connection[0] + offset
+                # Once every leg count has a route arriving before this departure, nothing can improve
+                if len(best) == max_legs and departure >= max(label[0] for label in best.values()):
+                    return self._finish_labels(best, scanned, pruned)
+                scanned += 1
+                _, arrives, from_station, to_station, _, days = connection
+                # Routes neither return to the source nor continue past the destination
+                if to_station == source or from_station == destination:
+                    continue
+                if day_bit is not None and not days & day_bit:
+                    pruned += 1
+                    continue
+                arrives += offset
+                if not include_overnight and arrives >= MINUTES_PER_DAY:
+                    pruned += 1
+                    continue
+                if from_station == source:
+                    # The first train leaves on day 0
+                    if offset:
+                        continue
+                    extended = [(arrives, 1, departure, connection, offset, None, frozenset((source, to_station)))]
+                else:
+                    arrived = times.get(from_station)
+                    if not arrived:
+                        continue
+                    window = labels[from_station][bisect_left(arrived, departure - max_wait_time):bisect_right(arrived, departure)]
+                    extended = [
+                        (arrives, parent[1] + 1, parent[2], connection, offset, parent, parent[6] | {to_station})
+                        for parent in self._parents(window, to_station, max_legs)
+                    ]
+                    if not extended:
+                        pruned += 1
+                        continue
+
+                if to_station == destination:
+                    for label in extended:
+                        known = best.get(label[1])
+                        if known is None or (label[0], -label[2]) < (known[0], -known[2]):
+                            best[label[1]] = label
+                    continue
+                position = bisect_right(times.setdefault(to_station, []), arrives)
+                times[to_station][position:position] = [arrives] * len(extended)
+                labels.setdefault(to_station, [])[position:position] = extended
+        return self._finish_labels(best, scanned, pruned)
+
+    def _finish_labels(self, best: Dict[int, Tuple], scanned: int, pruned: int) -> List[Route]:
+        routes = []
+        earliest = INFINITY
+        for legs in sorted(best):
+            label = best[legs]
+            if label[0] >= earliest:
+                continue
+            earliest = label[0]
+            path = []
+            while label is not None:
+                path.append((label[3], label[4]))
+                label = label[5]
+            path.reverse()
+            routes.append(self._route(path, earliest))
+        routes.sort(key=lambda x: x.total_duration)
+        record_search("csa", scanned, pruned, len(routes))
+        return routes
+
+    def _finish(self, arrival, parent, destination: str, max_legs: int, scanned: int, pruned: int) -> List[Route]:
+        routes = self._journeys(arrival, parent, destination, max_legs)
+        record_search("csa", scanned, pruned, len(routes))
+        return routes
+
+    @staticmethod
+    def _journeys(arrival, parent, destination: str, max_legs: int) -> List[Route]:
+        routes = []
+        best = INFINITY
+        for legs in range(1, max_legs + 1):
+            arrives = arrival[legs].get(destination, INFINITY)
+            if arrives >= best:
+                continue
+            best = arrives
+            # Walk the parent pointers back to the source
+            path = []
+            station, level = destination, legs
+            while station in parent[level] and level > 0:
+                connection, offset, level = parent[level][station]
+                path.append((connection, offset))
+                station = connection[2]
+            path.reverse()
+            routes.append(ConnectionScanner._route(path, arrives))
+        return sorted(routes, key=lambda x: x.total_duration)
+
+    @staticmethod
+    def _route(path: List[Tuple], arrives: int) -> Route:
+        """Route for a list of (connection, day offset) legs arriving at arrives"""
+        total_wait_time = 0
+        for (previous, previous_offset), (current, current_offset) in zip(path, path[1:]):
+            total_wait_time += (current[0] + current_offset) - (previous[1] + previous_offset)
+        first_departure = path[0][0][0] + path[0][1]
+        return Route(
+            legs=[connection[4] for connection, _ in path],
+            total_duration=int(arrives - first_departure),
+            total_wait_time=total_wait_time,
+            transfers=len(path) - 1
+        )
+
+_scanner: Optional[ConnectionScanner] = None
+_scanner_source: Optional[TimetableIndex] = None
+
+def get_scanner(timetable: TimetableIndex) -> ConnectionScanner:
+    """Return a scanner for the timetable, rebuilding it when the timetable is replaced or reloaded"""
+    global _scanner, _scanner_source
+    if _scanner is None or _scanner_source is not timetable or _scanner.version != timetable.version:
+        if _scanner_source is not timetable:
+            timetable.subscribe(lambda change, train: _patch_scanner(timetable, change, train))
+        _scanner = ConnectionScanner(timetable)
+        _scanner_source = timetable
+    return _scanner
+
+def _patch_scanner(timetable: TimetableIndex, change: str, train: Optional[Dict]):
+    """Apply a single added or removed train to the scanner instead of rebuilding it"""
+    scanner = _scanner
+    # A reload, or a scanner that already missed a change, is rebuilt on next use
+    if scanner is None or _scanner_source is not timetable or change == "reload" or scanner.version != timetable.version - 1:
+        return
+    if change == "add":
+        scanner.insert(timetable.record(train["train_id"]))
+    elif change == "remove":
+        scanner.remove(train)
+    scanner.version = timetable.version
+
+def find_routes_csa(trains, source: str, destination: str, max_transfers: int = 2, departure_time: str = "00:00",
+                    max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                    include_overnight: bool = True) -> List[Route]:
+    """Find earliest-arrival, Pareto-optimal routes with the Connection Scan Algorithm"""
+    if source == destination:
+        return []
+    return get_scanner(as_timetable(trains)).scan(
+        source, destination, max_transfers, departure_time,
+        max_wait_time=max_wait_time, travel_date=travel_date, include_overnight=include_overnight
+    )
@@ -1,5 +1,11 @@
 # dummyDB.py
 
+import os
+import threading
+from timetable import TimetableIndex, DAY_NAMES, days_mask, parse_time
+from columnar_timetable import load_snapshot
+from storage import TrainStore
+
 # Expanded dummy train data with more interconnected routes
 trains = [
     # Delhi Hub Routes
@@ -208,24 +214,155 @@ NEARBY_STATIONS = {
     "Lucknow": ["Kanpur", "Barabanki"]
 }
 
-def get_trains(source, destination=None):
-    """Fetch trains by source and optional destination"""
+# Optional columnar timetable file replacing the built-in trains; its stored
+# indexes are loaded as they are instead of being rebuilt. Each process
+# decodes its own copy, so this speeds up startup rather than sharing memory.
+TIMETABLE_PATH = os.environ.get("TRAVEL_GUIDE_TIMETABLE")
+timetable = None
+if TIMETABLE_PATH:
+    trains, timetable = load_snapshot(TIMETABLE_PATH)
+
+# Optional SQLite database shared by every worker process as the source of truth
+DATABASE_PATH = os.environ.get("TRAVEL_GUIDE_DB")
+store = TrainStore(DATABASE_PATH) if DATABASE_PATH else None
+if store is not None:
+    if store.is_empty():
+        store.upsert_trains(trains)
+        store.add_nearby_stations(NEARBY_STATIONS)
+    store_version = store.version()
+    trains = store.all_trains()
+    timetable = None
+
+if timetable is None:
+    timetable = TimetableIndex(trains)
+_sync_lock = threading.Lock()
+
+# Walking/local transfer time between a station and each of its nearby stations
+NEARBY_TRANSFER_MINUTES = 30
+
+def get_trains(source, destination=None, travel_date=None):
+    """Fetch trains by source and optional destination, running on an optional travel date"""
+    weekday = travel_date.weekday() if travel_date else None
+
+    if store is not None:
+        found = store.get_trains(source, destination, weekday)
+        if destination:
+            return found
+        destinations = {}
+        for train in found:
+            destinations.setdefault(train["destination"], []).append(train)
+        return destinations
+
+    def runs(train):
+        return weekday is None or timetable.record(train["train_id"]).runs_on(weekday)
+
     if destination:
-        return [train for train in trains if train["source"] == source and train["destination"] == destination]
+        return [train for train in timetable.between(source, destination) if runs(train)]
     else:
         # Group trains by destination if no destination is provided
         destinations = {}
-        for train in trains:
-            if train["source"] == source:
-                if train["destination"] not in destinations:
-                    destinations[train["destination"]] = []
-                destinations[train["destination"]].append(train)
+        for train in timetable.from_source(source):
+            if runs(train):
+                destinations.setdefault(train["destination"], []).append(train)
         return destinations
 
 def get_all_trains():
     """Fetch all trains"""
+    if store is not None:
+        return store.all_trains()
     return trains
 
+def get_timetable():
+    """Fetch the indexed timetable, reloading it if another process changed the database"""
+    global store_version
+    if store is not None:
+        version = store.version()
+        if version != store_version:
+            # Request threads that notice the change together reload once
+            with _sync_lock:
+                if version != store_version:
+                    store_version = version
+                    trains[:] = store.all_trains()
+                    timetable.load(trains)
+    return timetable
+
+def load_trains(new_trains):
+    """Replace the whole timetable and rebuild the indexes"""
+    global store_version
+    trains[:] = list(new_trains)
+    if store is not None:
+        store_version = store.replace_trains(trains)
+    timetable.load(trains)
+
+def add_train(train):
+    """Add or replace a train and update the indexes"""
+    global store_version
+    remove_train(train["train_id"])
+    trains.append(train)
+    if store is not None:
+        store_version = store.upsert_trains([train])
+    timetable.add_train(train)
+
+def remove_train(train_id):
+    """Remove a train by ID and update the indexes"""
+    global store_version
+    removed = timetable.remove_train(train_id)
+    if removed is not None:
+        trains[:] = [train for train in trains if train is not removed]
+        if store is not None:
+            store_version = store.delete_train(train_id) or store_version
+    return removed
+
+def delay_train(train_id, minutes):
+    """Shift a train's departure and arrival by minutes, moving its running days when it crosses midnight"""
+    train = timetable.get(train_id)
+    if train is None:
+        return None
+    departure = parse_time(train["departure_time"]) + minutes
+    arrival = parse_time(train["arrival_time"]) + minutes
+    days = train["days_available"]
+    shift = departure // (24 * 60)
+    if shift and days != ["Daily"]:
+        mask = days_mask(days)
+        days = [day for number, day in enumerate(DAY_NAMES) if mask >> ((number - shift) % 7) & 1]
+    delayed = {
+        **train,
+        "departure_time": f"{departure % (24 * 60) // 60:02d}:{departure % 60:02d}",
+        "arrival_time": f"{arrival % (24 * 60) // 60:02d}:{arrival % 60:02d}",
+        "days_available": days
+    }
+    add_train(delayed)
+    return delayed
+
+def update_seats(train_id, seats_available):
+    """Update the seat count of a train without touching the timetable indexes"""
+    train = timetable.get(train_id)
+    if train is None:
+        return None
+    train["seats_available"] = seats_available
+    if store is not None:
+        store.update_seats(train_id, seats_available)
+    return train
+
+def get_seat_availability(train_ids):
+    """Fetch current seat counts for the given train IDs"""
+    if store is not None:
+        return store.seat_availability(train_ids)
+    seats = {}
+    for train_id in train_ids:
+        train = timetable.get(train_id)
+        if train is not None:
+            seats[train_id] = train["seats_available"]
+    return seats
+
+def get_nearby_transfer_time(station, nearby):
+    """Minutes needed to walk or transfer between a station and a nearby one"""
+    return NEARBY_TRANSFER_MINUTES
+
 def get_nearby_stations(station):
-    """Get nearby stations for a given station"""
-    return NEARBY_STATIONS.get(station, [])
\ No newline at end of file
+    """Get nearby stations for a given station that are served by at least one train"""
+    candidates = store.nearby_stations(station) if store is not None else NEARBY_STATIONS.get(station, [])
+    return [
+        nearby for nearby in candidates
+        if timetable.from_source(nearby) or timetable.to_destination(nearby)
+    ]
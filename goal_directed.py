@@ -0,0 +1,234 @@
+# goal_directed.py
+#
+# Searches that use what lies between a query's ends. The bidirectional
+# engine enumerates the same routes as find_alternative_routes, but meets
+# in the middle: a backward search collects the last trains into the
+# destination, a forward search builds the first trains out of the source,
+# and the two are joined at the station where they meet. Both halves skip
+# stations that cannot reach the other end with the trains left.
+# TravelTimeBounds gives lower bounds on the riding time and the number of
+# trains to a destination for goal-directed best-first search.
+
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+from metrics import record_search
+from route_finder import Route, as_timetable, make_leg_filter, next_departure
+from timetable import TimetableIndex, CompiledTrain, MINUTES_PER_DAY
+from transfer_patterns import hop_distances
+
+# Destination sets whose bounds are kept per timetable version
+MAX_BOUND_TARGETS = 256
+
+class TravelTimeBounds:
+    """Lower bounds on the minutes needed to reach a destination, for one timetable version.
+
+    The fastest train between each linked pair is precomputed; bounds to a
+    destination are shortest paths over those riding times, ignoring waits.
+    """
+
+    def __init__(self, timetable: TimetableIndex):
+        self.version = timetable.version
+        # destination -> {source: fastest train between them}
+        self.incoming: Dict[str, Dict[str, int]] = {}
+        for (source, destination), trains in timetable.by_pair.items():
+            self.incoming.setdefault(destination, {})[source] = min(
+                timetable.record(train["train_id"]).duration for train in trains
+            )
+        self._bounds: "OrderedDict[Tuple, Dict[str, int]]" = OrderedDict()
+
+    def to(self, destinations: Dict[str, int]) -> Dict[str, int]:
+        """Minutes from each station to the nearest destination plus its egress; unlisted stations cannot reach one"""
+        key = tuple(sorted(destinations.items()))
+        bounds = self._bounds.get(key)
+        if bounds is not None:
+            self._bounds.move_to_end(key)
+            return bounds
+
+        bounds = {}
+        queue = [(egress, station) for station, egress in destinations.items()]
+        heapq.heapify(queue)
+        while queue:
+            minutes, station = heapq.heappop(queue)
+            if station in bounds:
+                continue
+            bounds[station] = minutes
+            for source, duration in self.incoming.get(station, {}).items():
+                if source not in bounds:
+                    heapq.heappush(queue, (minutes + duration, source))
+
+        self._bounds[key] = bounds
+        if len(self._bounds) > MAX_BOUND_TARGETS:
+            self._bounds.popitem(last=False)
+        return bounds
+
+    def legs_to(self, destinations, max_legs: int) -> Dict[str, int]:
+        """Fewest trains from each station to the nearest destination, for stations within max_legs"""
+        legs = dict.fromkeys(destinations, 0)
+        frontier = list(legs)
+        for count in range(1, max_legs + 1):
+            following = []
+            for station in frontier:
+                for source in self.incoming.get(station, ()):
+                    if source not in legs:
+                        legs[source] = count
+                        following.append(source)
+            frontier = following
+        return legs
+
+_bounds: Optional[TravelTimeBounds] = None
+_bounds_source: Optional[TimetableIndex] = None
+
+def get_bounds(timetable: TimetableIndex) -> TravelTimeBounds:
+    """Return the lower bounds for the timetable, rebuilding them when it changes"""
+    global _bounds, _bounds_source
+    if _bounds is None or _bounds_source is not timetable or _bounds.version != timetable.version:
+        _bounds = TravelTimeBounds(timetable)
+        _bounds_source = timetable
+    return _bounds
+
+class _Suffix:
+    """The last trains of a route, from a meeting station to the destination"""
+
+    __slots__ = ("legs", "stations", "span", "wait")
+
+    def __init__(self, legs: Tuple[CompiledTrain, ...], span: int, wait: int):
+        self.legs = legs
+        # Stations after the meeting station, which the rest of the route must avoid
+        self.stations = frozenset(leg.destination for leg in legs)
+        self.span = span
+        self.wait = wait
+
+def _window(departures: List[int], arrival: int, max_wait_time: Optional[int]) -> Iterator[int]:
+    """Positions in sorted departure times that can be caught within max_wait_time of arrival"""
+    if max_wait_time is None or max_wait_time >= MINUTES_PER_DAY - 1:
+        return iter(range(len(departures)))
+    start = arrival % MINUTES_PER_DAY
+    end = start + max_wait_time
+    if end < MINUTES_PER_DAY:
+        return iter(range(bisect_left(departures, start), bisect_right(departures, end)))
+    return iter([*range(bisect_left(departures, start), len(departures)),
+                 *range(0, bisect_right(departures, end - MINUTES_PER_DAY))])
+
+def find_routes_bidirectional(trains, source: str, destination: str, max_transfers: int = 2,
+                              max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                              include_overnight: bool = True) -> List[Route]:
+    """Find the routes of find_alternative_routes by meeting in the middle.
+
+    Routes with more legs than the forward half are split after its last
+    train; the backward half indexes the remaining trains by the station they
+    leave from and the time they leave, so a join only visits the suffixes
+    catchable within max_wait_time.
+    """
+    timetable: TimetableIndex = as_timetable(trains)
+    if source == destination:
+        return []
+    allowed = make_leg_filter(travel_date, include_overnight)
+    max_legs = max_transfers + 1
+    forward_legs = (max_legs + 1) // 2
+    backward_legs = max_legs - forward_legs
+    # Fewest trains to the destination, and from the source, for each station
+    to_destination = hop_distances(timetable, destination, max_legs, reverse=True)
+    # Suffix trains can start up to max_legs - 1 trains from the source
+    from_source = hop_distances(timetable, source, max_legs - 1)
+    unreachable = max_legs + 1
+    routes: List[Route] = []
+    stats = {"expanded": 0, "pruned": 0}
+
+    # Backward: suffixes of up to backward_legs trains, by meeting station and first departure
+    suffixes: Dict[str, List[Tuple[int, _Suffix]]] = {}
+
+    def collect_suffixes(legs: Tuple[CompiledTrain, ...], span: int, wait: int):
+        first = legs[0]
+        suffixes.setdefault(first.source, []).append((first.departure, _Suffix(legs, span, wait)))
+        if len(legs) == backward_legs:
+            return
+        stats["expanded"] += 1
+        # Trains left to reach one prepended here: the forward half and any trains prepended later
+        before = max_legs - len(legs) - 1
+        for train in timetable.arrivals(first.source):
+            if train.source in (source, destination) or from_source.get(train.source, unreachable) > before:
+                continue
+            if any(train.source == leg.destination for leg in legs):
+                continue
+            # Suffixes are timed from their own first departure
+            boarding = next_departure(train, first, 0, max_wait_time)
+            if boarding is None:
+                stats["pruned"] += 1
+                continue
+            wait_time = boarding[0]
+            collect_suffixes((train, *legs), train.duration + wait_time + span, wait + wait_time)
+
+    if backward_legs and source in to_destination:
+        for train in timetable.arrivals(destination):
+            if train.source != source and from_source.get(train.source, unreachable) <= max_legs - 1:
+                collect_suffixes((train,), train.duration, 0)
+    index: Dict[str, Tuple[List[int], List[_Suffix]]] = {}
+    for station, found in suffixes.items():
+        found.sort(key=lambda item: item[0])
+        index[station] = ([departs for departs, _ in found], [suffix for _, suffix in found])
+
+    def join(prefix: List[CompiledTrain], visited: set, arrives: int, duration: int, wait: int):
+        departures, candidates = index.get(prefix[-1].destination, ((), ()))
+        last = prefix[-1]
+        for position in _window(departures, last.arrival, max_wait_time):
+            suffix = candidates[position]
+            if not visited.isdisjoint(suffix.stations):
+                continue
+            wait_time = last.wait_until(suffix.legs[0])
+            # Day and overnight checks need each suffix train's time in the journey
+            departs = arrives + wait_time
+            previous = None
+            for leg in suffix.legs:
+                if previous is not None:
+                    departs += previous.duration + previous.wait_until(leg)
+                if not allowed(leg, departs):
+                    stats["pruned"] += 1
+                    break
+                previous = leg
+            else:
+                routes.append(Route(
+                    legs=[leg.train for leg in prefix] + [leg.train for leg in suffix.legs],
+                    total_duration=duration + wait_time + suffix.span,
+                    total_wait_time=wait + wait_time + suffix.wait,
+                    transfers=len(prefix) + len(suffix.legs) - 1
+                ))
+
+    def extend(station: str, visited: set, prefix: List[CompiledTrain], arrives: int, duration: int, wait: int):
+        stats["expanded"] += 1
+        previous = prefix[-1] if prefix else None
+        # Trains left after the next one
+        remaining = max_legs - len(prefix) - 1
+        for train in timetable.departures(station):
+            if train.destination in visited:
+                continue
+            if to_destination.get(train.destination, unreachable) > remaining:
+                stats["pruned"] += 1
+                continue
+            boarding = next_departure(previous, train, arrives, max_wait_time)
+            if boarding is None or not allowed(train, boarding[1]):
+                stats["pruned"] += 1
+                continue
+            wait_time, departs = boarding
+            next_duration = duration + wait_time + train.duration
+            next_wait = wait + wait_time
+
+            if train.destination == destination:
+                routes.append(Route(
+                    legs=[leg.train for leg in prefix] + [train.train],
+                    total_duration=next_duration,
+                    total_wait_time=next_wait,
+                    transfers=len(prefix)
+                ))
+            elif len(prefix) + 1 < forward_legs:
+                extend(train.destination, visited | {train.destination}, prefix + [train],
+                       departs + train.duration, next_duration, next_wait)
+            else:
+                join(prefix + [train], visited | {train.destination}, departs + train.duration, next_duration, next_wait)
+
+    if source in to_destination:
+        extend(source, {source}, [], 0, 0, 0)
+    record_search("bidirectional", stats["expanded"], stats["pruned"], len(routes))
+    return sorted(routes, key=lambda x: (x.total_duration, x.transfers))
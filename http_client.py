@@ -0,0 +1,89 @@
+# http_client.py
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class ResponseMemo:
+    """Short-lived response cache, kept per Streamlit session"""
+
+    def __init__(self, ttl_seconds: float = 30, max_entries: int = 128):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Tuple, Tuple[float, Any]] = {}
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl_seconds:
+            self._entries.pop(key, None)
+            return None
+        return entry[1]
+
+    def put(self, key: Tuple, value: Any):
+        if len(self._entries) >= self.max_entries:
+            # Drop the oldest entry
+            del self._entries[min(self._entries, key=lambda k: self._entries[k][0])]
+        self._entries[key] = (time.monotonic(), value)
+
+class ApiClient:
+    """Pooled keep-alive HTTP client with retries and request coalescing.
+
+    Identical GET requests issued while one is already in flight wait for
+    its result instead of opening another connection.
+    """
+
+    def __init__(self, base_url: str, pool_size: int = 10, retries: int = 3, backoff_factor: float = 0.3,
+                 timeout: Tuple[float, float] = (3.05, 30)):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._in_flight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def request_key(path: str, params: Optional[Dict] = None) -> Tuple:
+        return (path, tuple(sorted((params or {}).items())))
+
+    def get_json(self, path: str, params: Optional[Dict] = None, memo: Optional[ResponseMemo] = None) -> Any:
+        """GET a JSON document, reusing a memoized or in-flight identical request"""
+        key = self.request_key(path, params)
+        if memo is not None:
+            cached = memo.get(key)
+            if cached is not None:
+                return cached
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[key] = Future()
+
+        if leader:
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+                response.raise_for_status()
+                future.set_result(response.json())
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+
+        data = future.result()
+        if memo is not None:
+            memo.put(key, data)
+        return data
@@ -0,0 +1,137 @@
+# live_updates.py
+
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from dummyDB import add_train, delay_train, remove_train, get_timetable
+from route_cache import RouteCache
+from timetable import DAY_NAMES, TimetableIndex, parse_time
+from transfer_patterns import hop_distances
+
+EVENT_TYPES = ("delay", "cancel", "add")
+TRAIN_FIELDS = ("train_id", "source", "destination", "departure_time", "arrival_time", "days_available")
+
+# Largest number of events accepted in one update batch
+MAX_EVENTS = 1000
+
+def _check_time(value, name: str):
+    try:
+        minutes = parse_time(value)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError(f"{name} must be in HH:MM format")
+    if not 0 <= minutes < 24 * 60:
+        raise ValueError(f"{name} must be in HH:MM format")
+
+def parse_events(payload) -> List[Dict]:
+    """Validate a batch of update events against the current timetable.
+
+    Events are checked in order, so a batch may delay or cancel a train it
+    added earlier. Raises ValueError with a message for the client.
+    """
+    events = payload.get("events") if isinstance(payload, dict) else None
+    if not isinstance(events, list) or not events:
+        raise ValueError("Request body must be a JSON object with a non-empty \"events\" list")
+    if len(events) > MAX_EVENTS:
+        raise ValueError(f"At most {MAX_EVENTS} events are allowed per batch")
+
+    known = set(get_timetable().by_id)
+    for index, event in enumerate(events):
+        kind = event.get("type") if isinstance(event, dict) else None
+        if kind not in EVENT_TYPES:
+            raise ValueError(f"Event {index}: type must be one of {', '.join(EVENT_TYPES)}")
+        if kind == "add":
+            train = event.get("train")
+            if not isinstance(train, dict) or any(not train.get(field) for field in TRAIN_FIELDS):
+                raise ValueError(f"Event {index}: train needs {', '.join(TRAIN_FIELDS)}")
+            _check_time(train["departure_time"], f"Event {index}: departure_time")
+            _check_time(train["arrival_time"], f"Event {index}: arrival_time")
+            days = train["days_available"]
+            if not isinstance(days, list) or any(day != "Daily" and day not in DAY_NAMES for day in days):
+                raise ValueError(f"Event {index}: days_available must list Daily or {', '.join(DAY_NAMES)}")
+            known.add(train["train_id"])
+            continue
+
+        if event.get("train_id") not in known:
+            raise ValueError(f"Event {index}: unknown train {event.get('train_id')}")
+        if kind == "delay":
+            minutes = event.get("minutes")
+            if not isinstance(minutes, int) or isinstance(minutes, bool) or not -24 * 60 < minutes < 24 * 60:
+                raise ValueError(f"Event {index}: minutes must be an integer under a day")
+        else:
+            known.discard(event["train_id"])
+    return events
+
+def apply_events(events: List[Dict]) -> Dict[str, int]:
+    """Apply validated events in order and count them by type"""
+    counts = dict.fromkeys(EVENT_TYPES, 0)
+    for event in events:
+        if event["type"] == "add":
+            train = {"train_name": event["train"]["train_id"], "seats_available": 0, "popularity": 0.5, **event["train"]}
+            add_train(train)
+        elif event["type"] == "delay":
+            delay_train(event["train_id"], event["minutes"])
+        else:
+            remove_train(event["train_id"])
+        counts[event["type"]] += 1
+    return counts
+
+class RouteInvalidator:
+    """Timetable listener dropping only the cached searches a changed train can affect.
+
+    A train from a to b can only appear in, or open, a route from s to d with
+    at most t transfers when s reaches a and b reaches d in t trains between
+    them. Searches also count the nearby stations of both ends, since the
+    fallback searches from and to them. Within batch(), nearby stations are
+    looked up once for all the batch's changes.
+    """
+
+    def __init__(self, timetable: TimetableIndex, cache: RouteCache, nearby_stations: Callable[[str], List[str]]):
+        self.timetable = timetable
+        self.cache = cache
+        self.nearby_stations = nearby_stations
+        self._batch = threading.local()
+
+    @contextmanager
+    def batch(self):
+        """Share nearby station lookups between the changes made in this thread until the block exits"""
+        outer = getattr(self._batch, "nearby", None)
+        if outer is None:
+            self._batch.nearby = {}
+        try:
+            yield
+        finally:
+            if outer is None:
+                self._batch.nearby = None
+
+    def _ends(self, station: str, nearby: Dict[str, List[str]]) -> List[str]:
+        if station not in nearby:
+            nearby[station] = [station, *self.nearby_stations(station)]
+        return nearby[station]
+
+    def __call__(self, change: str, train: Optional[Dict]):
+        if change == "reload":
+            self.cache.invalidate()
+            return
+        keys = self.cache.keys()
+        if not keys:
+            return
+        hops = max(dict(key[2]).get("max_transfers", 0) for key in keys)
+        to_origin = hop_distances(self.timetable, train["source"], hops, reverse=True)
+        from_destination = hop_distances(self.timetable, train["destination"], hops)
+        infinity = hops + 1
+        nearby = getattr(self._batch, "nearby", None)
+        if nearby is None:
+            nearby = {}
+
+        def affected(key) -> bool:
+            source, destination, params = key
+            reach = min(to_origin.get(station, infinity) for station in self._ends(source, nearby))
+            reach += min(from_destination.get(station, infinity) for station in self._ends(destination, nearby))
+            return reach <= dict(params).get("max_transfers", 0)
+
+        self.cache.invalidate_where(affected)
+
+def route_invalidator(timetable: TimetableIndex, cache: RouteCache,
+                      nearby_stations: Callable[[str], List[str]]) -> RouteInvalidator:
+    """Build the listener that keeps a route cache in step with the timetable"""
+    return RouteInvalidator(timetable, cache, nearby_stations)
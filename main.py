@@ -1,67 +1,615 @@
 # main.py
 
-from flask import Flask, jsonify, request
-from dummyDB import get_trains, get_all_trains, get_nearby_stations
-from route_finder import find_alternative_routes, format_route_details
+import io
+import os
+import uuid
+from datetime import datetime
+from functools import wraps
+from flask import Flask, Response, jsonify, request, stream_with_context
+from dummyDB import (
+    get_trains, get_all_trains, get_timetable, get_nearby_stations, get_nearby_transfer_time, get_seat_availability,
+    update_seats, store
+)
+from route_finder import find_alternative_routes, find_routes_to_many, format_route_details, format_route_compact
+from connection_scan import find_routes_csa
+from goal_directed import find_routes_bidirectional
+from pareto_search import PRIORITIES, find_pareto_routes, route_crowding, route_fare
+from route_cache import RouteCache
+from metrics import timed, render as render_metrics
+from responses import dumps, json_body_response, not_modified
+from ranked_search import CRITERIA, find_top_k_routes, find_top_k_routes_multi, encode_cursor, decode_cursor
+from transfer_patterns import TransferPatternIndex
+from live_updates import parse_events, apply_events, route_invalidator
+from reservations import SeatInventory, StoredSeatInventory, ReservationError, InsufficientSeats, HoldNotFound
 
 app = Flask(__name__)
 
+# Route search engines selectable through the "engine" query parameter
+ROUTE_ENGINES = {
+    "dfs": find_alternative_routes,
+    "csa": find_routes_csa,
+    "pareto": find_pareto_routes,
+    "bidirectional": find_routes_bidirectional,
+}
+
+# Most transfers a route search may ask for; the search space grows
+# exponentially with it
+MAX_TRANSFERS = 4
+
+# Largest page size accepted by the "limit" query parameter
+MAX_PAGE_SIZE = 100
+
+# Most routes returned by the nearby-station fallback
+MAX_NEARBY_ROUTES = 100
+
+# Functions listed in a ?profile=1 summary
+PROFILE_LINES = 30
+
+# Largest number of queries accepted by /trains/batch
+MAX_BATCH_SIZE = 1000
+
+# Output formats of /matrix
+MATRIX_FORMATS = ("csv", "npz")
+
+# What /matrix times are, sent as its X-Travel-Times header; parse_search_options
+# always sets a wait limit, so they are lower bounds (see travel_matrix.one_to_all)
+MATRIX_TIMES = "lower-bound"
+
+# Route topology cache; seat counts are overlaid from the live timetable.
+# Timetable changes drop only the cached searches they can affect.
+route_cache = RouteCache(max_entries=1024, ttl_seconds=300)
+route_invalidation = route_invalidator(get_timetable(), route_cache, get_nearby_stations)
+get_timetable().subscribe(route_invalidation)
+
+# Precomputed transfer patterns answer default-engine searches while the trains are unchanged
+PATTERNS_PATH = os.environ.get("TRAVEL_GUIDE_PATTERNS")
+pattern_index = TransferPatternIndex.load(PATTERNS_PATH) if PATTERNS_PATH and os.path.exists(PATTERNS_PATH) else None
+if pattern_index is not None:
+    pattern_index.follow(get_timetable())
+
+# Seat holds and bookings, written through to the timetable's seat counts. With a
+# database they live there, so every process shares them and they survive restarts.
+if store is not None:
+    seat_inventory = StoredSeatInventory(store)
+else:
+    seat_inventory = SeatInventory(get_seat_availability, update_seats)
+
+# Tells apart in-memory data versions of different server processes
+BOOT_ID = uuid.uuid4().hex[:8]
+
+# Runs route searches elsewhere when set; serve.py sets it to its RouteServer,
+# which has run_search and map_searches methods running them on a process pool
+search_runner = None
+
+def run_search(function, *args):
+    """Run a search function here, or through search_runner when one is attached.
+
+    Search functions read the timetable themselves and return plain route
+    lists, so they can run in a process holding its own copy of the timetable.
+    """
+    if search_runner is None:
+        return function(*args)
+    return search_runner.run_search(function, *args)
+
+def route_key(source, destination, engine, max_transfers, constraints, nearby_destinations=False):
+    """Route cache key for a /trains search"""
+    return RouteCache.make_key(source, destination, engine=engine, max_transfers=max_transfers,
+                               nearby_destinations=nearby_destinations, **constraints)
+
+def search_nearby_routes(source, destination, max_transfers, constraints, nearby_destinations=False,
+                         source_exhausted=False):
+    """Ranked routes from the source's nearby stations, in a single multi-source search.
+
+    source_exhausted is True when a complete search already found no route
+    from the source to the destination, so the source itself is only
+    searched towards nearby destinations.
+    """
+    nearby_sources = get_nearby_stations(source)
+    nearby_targets = get_nearby_stations(destination) if nearby_destinations else []
+    if not nearby_sources and not nearby_targets:
+        return []
+    sources = {} if source_exhausted and not nearby_targets else {source: 0}
+    for station in nearby_sources:
+        sources[station] = get_nearby_transfer_time(source, station)
+    destinations = {destination: 0}
+    for station in nearby_targets:
+        destinations[station] = get_nearby_transfer_time(destination, station)
+
+    routes, _ = find_top_k_routes_multi(
+        get_timetable(), sources, destinations, k=MAX_NEARBY_ROUTES, max_transfers=max_transfers,
+        goal_directed=True, **constraints
+    )
+    # Keep the best route for each sequence of trains
+    unique = {}
+    for route in routes:
+        unique.setdefault(tuple(leg["train_id"] for leg in route.legs), route)
+    return list(unique.values())
+
+def find_routes(source, destination, engine, max_transfers, constraints, nearby_destinations=False):
+    """Run one /trains search, falling back to nearby stations.
+
+    Returns (routes, from_nearby) where from_nearby is True when no route
+    was found from the source itself.
+    """
+    timetable = get_timetable()
+    routes = []
+    if (engine == "dfs" and pattern_index is not None and pattern_index.covers(source, destination, max_transfers)
+            and not pattern_index.is_stale(timetable)):
+        routes = pattern_index.find_routes(timetable, source, destination, max_transfers, **constraints)
+    # Optimal patterns can all break the wait or day limits when other routes do not
+    if not routes:
+        routes = ROUTE_ENGINES[engine](timetable, source, destination, max_transfers, **constraints)
+    if routes:
+        return routes, False
+    # Search from every nearby station, and optionally to nearby destinations, in one run.
+    # The depth-first engines list every route, so the source has none left to offer.
+    return search_nearby_routes(source, destination, max_transfers, constraints, nearby_destinations,
+                                source_exhausted=engine == "dfs"), True
+
+def find_ranked_routes(source, destination, criterion, max_transfers, constraints, k):
+    """The k best routes by criterion, and whether no more exist"""
+    return find_top_k_routes(
+        get_timetable(), source, destination, k=k, criterion=criterion,
+        max_transfers=max_transfers, goal_directed=True, **constraints
+    )
+
+def find_batch_routes(source, destinations, max_transfers, constraints):
+    """Routes from one source to each destination, from a single search tree"""
+    return find_routes_to_many(get_timetable(), source, destinations, max_transfers, **constraints)
+
+def find_matrix_rows(sources, max_transfers, constraints):
+    """Travel-time matrix rows for a few sources, computed in this process"""
+    from travel_matrix import iter_matrix_rows
+    return [row for _, row in iter_matrix_rows(get_timetable(), sources, max_transfers, workers=1, **constraints)]
+
+def matrix_rows(sources, max_transfers, constraints):
+    """Yield (source, minutes to every station) in source order.
+
+    With a search_runner attached, chunks of sources run side by side on its
+    pool; otherwise travel_matrix starts a process pool of its own.
+    """
+    from travel_matrix import CHUNK_SIZE, iter_matrix_rows
+    if search_runner is None:
+        yield from iter_matrix_rows(get_timetable(), sources, max_transfers, **constraints)
+        return
+    chunks = [sources[i:i + CHUNK_SIZE] for i in range(0, len(sources), CHUNK_SIZE)]
+    found = search_runner.map_searches(find_matrix_rows, [(chunk, max_transfers, constraints) for chunk in chunks])
+    try:
+        for chunk, rows in zip(chunks, found):
+            yield from zip(chunk, rows)
+    finally:
+        found.close()
+
+def search_routes(source, destination, engine, max_transfers, constraints, nearby_destinations=False):
+    """find_routes through the route cache"""
+    # Syncing with the store first drops cached routes another process made stale
+    with timed("db_lookup"):
+        timetable = get_timetable()
+    key = route_key(source, destination, engine, max_transfers, constraints, nearby_destinations)
+    cached = route_cache.get(key)
+    if cached is not None:
+        return cached
+
+    version = timetable.version
+    with timed("route_search"):
+        result = run_search(find_routes, source, destination, engine, max_transfers, constraints, nearby_destinations)
+    # A live update made during the search may already have outdated it
+    if timetable.version == version:
+        route_cache.put(key, result)
+    return result
+
+def ranked_routes(source, destination, criterion, max_transfers, constraints, offset, limit):
+    """Return one page of best-first ranked routes and whether more remain.
+
+    The cache keeps the longest ranked prefix computed so far, so later pages
+    only search again when they reach past it. Those searches go twice as
+    deep as the page, so paging through n routes searches O(log n) times.
+    """
+    with timed("db_lookup"):
+        timetable = get_timetable()
+    key = RouteCache.make_key(source, destination, ranking=criterion, max_transfers=max_transfers, **constraints)
+    cached = route_cache.get(key)
+    if cached is None or (not cached[1] and len(cached[0]) < offset + limit):
+        version = timetable.version
+        depth = offset + limit if offset == 0 else 2 * (offset + limit)
+        with timed("route_search"):
+            cached = run_search(find_ranked_routes, source, destination, criterion, max_transfers, constraints, depth)
+        if timetable.version == version:
+            route_cache.put(key, cached)
+    routes, exhausted = cached
+    has_more = len(routes) > offset + limit or not exhausted
+    return routes[offset:offset + limit], has_more
+
+def format_routes(routes, train_table=None, priced=False):
+    """Format routes with current seat counts overlaid on the cached legs.
+
+    With a train_table, legs reference train IDs and each train is added to
+    the table once. priced adds each route's estimated fare and crowding.
+    """
+    with timed("format"):
+        seats = seat_inventory.seats({leg["train_id"] for route in routes for leg in route.legs})
+        if train_table is not None:
+            formatted = [format_route_compact(route, train_table, seats) for route in routes]
+        else:
+            formatted = [format_route_details(route, seats) for route in routes]
+        if priced:
+            for route, details in zip(routes, formatted):
+                details["estimated_fare"] = route_fare(route)
+                details["crowding"] = route_crowding(route)
+        return formatted
+
+def json_response(payload, etag=False):
+    """Serialize and compress a successful response, timing the encoding"""
+    with timed("serialize"):
+        return json_body_response(dumps(payload), etag)
+
+def profile_request(view):
+    """Return a cProfile summary instead of the response when called with ?profile=1"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.args.get("profile") != "1":
+            return view(*args, **kwargs)
+        # Only profiled requests load the profiler
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.runcall(view, *args, **kwargs)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        return Response(summary.getvalue(), mimetype="text/plain")
+    return wrapper
+
+def parse_search_options(values):
+    """Parse route search options from query arguments or a JSON query object.
+
+    Returns (engine, max_transfers, constraints) and raises ValueError with a
+    message for the client when an option is invalid.
+    """
+    try:
+        max_transfers = int(values.get("max_transfers", 2))
+        max_wait_time = int(values.get("max_wait_time", 120))
+    except (TypeError, ValueError):
+        raise ValueError("max_transfers and max_wait_time must be integers")
+    if not 0 <= max_transfers <= MAX_TRANSFERS:
+        raise ValueError(f"max_transfers must be between 0 and {MAX_TRANSFERS}")
+    include_overnight = str(values.get("include_overnight", "true")).lower() == "true"
+    engine = str(values.get("engine", "dfs")).lower()
+    if engine not in ROUTE_ENGINES:
+        raise ValueError(f"Unknown route engine: {engine}")
+
+    travel_date = values.get("travel_date") or None
+    if travel_date:
+        try:
+            travel_date = datetime.strptime(travel_date, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            raise ValueError("travel_date must be in YYYY-MM-DD format")
+    constraints = {
+        "max_wait_time": max_wait_time,
+        "travel_date": travel_date,
+        "include_overnight": include_overnight,
+    }
+    return engine, max_transfers, constraints
+
+def route_results(routes, from_nearby, compact=False, priced=False):
+    """Build the /trains response body for a route search result"""
+    train_table = {} if compact else None
+    if from_nearby:
+        if not routes:
+            body = {
+                "direct_routes": [],
+                "alternative_routes": [],
+                "message": "No routes found between the specified stations"
+            }
+        else:
+            # Format routes from nearby stations
+            body = {
+                "direct_routes": [],
+                "alternative_routes": format_routes(routes, train_table, priced),
+                "message": "No direct routes found. Showing routes from nearby stations."
+            }
+    else:
+        # Separate direct and alternative routes
+        direct_routes = [route for route in routes if route.transfers == 0]
+        alternative_routes = [route for route in routes if route.transfers > 0]
+        body = {
+            "direct_routes": format_routes(direct_routes, train_table, priced),
+            "alternative_routes": format_routes(alternative_routes, train_table, priced)
+        }
+    if compact:
+        body["trains"] = train_table
+    return body
+
 @app.route("/trains", methods=["GET"])
+@profile_request
 def trains():
     source = request.args.get("source")
     destination = request.args.get("destination")
     include_alternative_routes = request.args.get("alternative_routes", "false").lower() == "true"
-    max_transfers = int(request.args.get("max_transfers", "2"))
-    max_wait_time = int(request.args.get("max_wait_time", "120"))
     
     if not source:
         return jsonify({"error": "Source station is required"}), 400
+
+    try:
+        engine, max_transfers, constraints = parse_search_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    travel_date = constraints["travel_date"]
+    # Compact responses list each train once and have route legs reference train IDs
+    compact = request.args.get("format", "full").lower() == "compact"
+
+    limit = request.args.get("limit")
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"}), 400
+
+    priority = request.args.get("priority")
+    if destination and include_alternative_routes and priority:
+        # One Pareto search serves every priority; only the ranking differs
+        priority = priority.lower()
+        if priority not in PRIORITIES:
+            return jsonify({"error": f"Unknown priority: {priority}"}), 400
+        routes, from_nearby = search_routes(source, destination, "pareto", max_transfers, constraints)
+        routes = sorted(routes, key=PRIORITIES[priority])[:limit]
+        body = route_results(routes, from_nearby, compact, priced=True)
+        body["priority"] = priority
+        return json_response(body)
+
+    if destination and include_alternative_routes and limit is not None:
+        criterion = request.args.get("sort", "duration").lower()
+        if criterion not in CRITERIA:
+            return jsonify({"error": f"Unknown sort criterion: {criterion}"}), 400
+        cursor_key = (source, destination, criterion, max_transfers, sorted(constraints.items()))
+        offset = 0
+        if request.args.get("cursor"):
+            try:
+                offset = decode_cursor(request.args["cursor"], cursor_key)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+        routes, has_more = ranked_routes(source, destination, criterion, max_transfers, constraints, offset, limit)
+        train_table = {} if compact else None
+        body = {
+            "direct_routes": format_routes([route for route in routes if route.transfers == 0], train_table),
+            "alternative_routes": format_routes([route for route in routes if route.transfers > 0], train_table),
+            "next_cursor": encode_cursor(offset + limit, cursor_key) if has_more else None
+        }
+        if compact:
+            body["trains"] = train_table
+        return json_response(body)
         
     if destination and include_alternative_routes:
-        # Get all trains to find possible routes
-        all_trains = get_all_trains()
-        routes = find_alternative_routes(all_trains, source, destination, max_transfers,)
-        
-        if not routes:
-            # Check for nearby stations if no routes are found
-            nearby_stations = get_nearby_stations(source)
-            alternative_routes = []
-            for station in nearby_stations:
-                routes_from_nearby = find_alternative_routes(all_trains, station, destination, max_transfers)
-                if routes_from_nearby:
-                    alternative_routes.extend(routes_from_nearby)
-            
-            if not alternative_routes:
-                return jsonify({
-                    "direct_routes": [],
-                    "alternative_routes": [],
-                    "message": "No routes found between the specified stations"
-                })
-            else:
-                # Format routes from nearby stations
-                return jsonify({
-                    "direct_routes": [],
-                    "alternative_routes": [format_route_details(route) for route in alternative_routes],
-                    "message": "No direct routes found. Showing routes from nearby stations."
-                })
-            
-        # Separate direct and alternative routes
-        direct_routes = [route for route in routes if route.transfers == 0]
-        alternative_routes = [route for route in routes if route.transfers > 0]
-        
-        return jsonify({
-            "direct_routes": [format_route_details(route) for route in direct_routes],
-            "alternative_routes": [format_route_details(route) for route in alternative_routes]
-        })
+        nearby_destinations = request.args.get("nearby_destinations", "false").lower() == "true"
+        routes, from_nearby = search_routes(source, destination, engine, max_transfers, constraints, nearby_destinations)
+        return json_response(route_results(routes, from_nearby, compact))
     else:
         # Original functionality for direct trains only
-        trains = get_trains(source, destination)
-        return jsonify(trains)
+        with timed("db_lookup"):
+            trains = get_trains(source, destination, travel_date)
+        return json_response(trains)
+
+def batch_results(groups):
+    """Yield (index, result) for each batch query, one source group at a time.
+
+    Queries sharing a source and search options are answered from a single
+    search tree; only destinations missing from the route cache are searched.
+    """
+    for (source, engine, max_transfers, constraints), queries in groups.items():
+        # Results stream for a while, so each group syncs with the store before reading the cache
+        timetable = get_timetable()
+        constraints = dict(constraints)
+        pending = {}
+        for index, destination in queries:
+            key = route_key(source, destination, engine, max_transfers, constraints)
+            cached = route_cache.get(key)
+            if cached is not None:
+                yield index, route_results(*cached)
+            else:
+                pending.setdefault(destination, []).append(index)
+
+        if not pending:
+            continue
+        version = timetable.version
+        if engine == "dfs":
+            with timed("route_search"):
+                found = run_search(find_batch_routes, source, list(pending), max_transfers, constraints)
+        else:
+            found = {destination: [] for destination in pending}
+        for destination, indexes in pending.items():
+            if found[destination]:
+                result = (found[destination], False)
+                if timetable.version == version:
+                    route_cache.put(route_key(source, destination, engine, max_transfers, constraints), result)
+            else:
+                # Other engines, and the nearby-station fallback, use the single query path
+                result = search_routes(source, destination, engine, max_transfers, constraints)
+            body = route_results(*result)
+            for index in indexes:
+                yield index, body
+
+@app.route("/trains/batch", methods=["POST"])
+def trains_batch():
+    payload = request.get_json(silent=True)
+    queries = payload.get("queries") if isinstance(payload, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Request body must be a JSON object with a non-empty \"queries\" list"}), 400
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} queries are allowed per batch"}), 400
+
+    # Group queries by source and search options so they share one search
+    defaults = payload.get("defaults", {})
+    if not isinstance(defaults, dict):
+        return jsonify({"error": "\"defaults\" must be a JSON object"}), 400
+    groups = {}
+    for index, query in enumerate(queries):
+        if not isinstance(query, dict) or not query.get("source") or not query.get("destination"):
+            return jsonify({"error": f"Query {index} needs a source and a destination"}), 400
+        try:
+            engine, max_transfers, constraints = parse_search_options({**defaults, **query})
+        except ValueError as e:
+            return jsonify({"error": f"Query {index}: {e}"}), 400
+        group = (query["source"], engine, max_transfers, tuple(sorted(constraints.items())))
+        groups.setdefault(group, []).append((index, query["destination"]))
+
+    def stream():
+        # One JSON document per line, written as soon as each result is ready
+        for index, result in batch_results(groups):
+            query = queries[index]
+            yield dumps({"index": index, "source": query["source"], "destination": query["destination"], **result}) + b"\n"
+
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+def hold_response(hold, status=200):
+    return jsonify({
+        "hold_id": hold.hold_id,
+        "train_ids": hold.train_ids,
+        "seats": hold.seats,
+        "confirmed": hold.confirmed,
+        "expires_in_seconds": None if hold.confirmed else max(0, round(hold.expires_at - seat_inventory.clock()))
+    }), status
+
+@app.route("/reservations", methods=["POST"])
+def create_reservation():
+    """Hold seats on every leg of a route: {"legs": [{"train_id": ...}, ...], "seats": 1}"""
+    payload = request.get_json(silent=True)
+    legs = payload.get("legs") if isinstance(payload, dict) else None
+    if not isinstance(legs, list) or not legs or not all(isinstance(leg, dict) and leg.get("train_id") for leg in legs):
+        return jsonify({"error": "Request body must be a JSON object with a non-empty \"legs\" list of train IDs"}), 400
+    seats = payload.get("seats", 1)
+    if not isinstance(seats, int) or isinstance(seats, bool):
+        return jsonify({"error": "seats must be an integer"}), 400
+    try:
+        hold = seat_inventory.hold_route(payload, seats)
+    except InsufficientSeats as e:
+        return jsonify({"error": str(e), "train_id": e.train_id, "seats_available": e.available}), 409
+    except ReservationError as e:
+        return jsonify({"error": str(e)}), 400
+    return hold_response(hold, 201)
+
+@app.route("/reservations/<hold_id>/confirm", methods=["POST"])
+def confirm_reservation(hold_id):
+    try:
+        return hold_response(seat_inventory.confirm(hold_id))
+    except HoldNotFound:
+        return jsonify({"error": "Hold not found or expired"}), 404
+
+@app.route("/reservations/<hold_id>", methods=["DELETE"])
+def release_reservation(hold_id):
+    try:
+        seat_inventory.release(hold_id)
+    except HoldNotFound:
+        return jsonify({"error": "Hold not found or expired"}), 404
+    return "", 204
+
+@app.route("/timetable/updates", methods=["POST"])
+def timetable_updates():
+    """Apply a batch of delay, cancel and add events to the live timetable"""
+    try:
+        events = parse_events(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    invalidated = route_cache.invalidated_entries
+    with route_invalidation.batch():
+        applied = apply_events(events)
+    return jsonify({
+        "applied": applied,
+        "invalidated_routes": route_cache.invalidated_entries - invalidated,
+        "cached_routes": route_cache.stats()["entries"]
+    })
+
+@app.route("/matrix", methods=["GET"])
+def matrix():
+    """Shortest journey minutes between stations, -1 where there is no route.
+
+    sources and targets are comma-separated station lists, all stations by
+    default; the search options are those of /trains. format=csv streams a
+    row per source as it is computed, format=npz returns int32 "minutes"
+    with "sources" and "targets" arrays.
+
+    Times are lower bounds on what /trains finds: the matrix search lets a
+    journey pass a station twice, which /trains never does. Responses say so
+    in an X-Travel-Times: lower-bound header.
+    """
+    # NumPy is only loaded by processes that serve a matrix
+    import numpy as np
+    from travel_matrix import get_matrix_timetable
+
+    try:
+        _, max_transfers, constraints = parse_search_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    output = request.args.get("format", "csv").lower()
+    if output not in MATRIX_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(MATRIX_FORMATS)}"}), 400
+
+    timetable = get_timetable()
+    stations = get_matrix_timetable(timetable).index
+    sources = [station for station in request.args.get("sources", "").split(",") if station] or list(stations)
+    targets = [station for station in request.args.get("targets", "").split(",") if station] or list(stations)
+    unknown = [station for station in sources + targets if station not in stations]
+    if unknown:
+        return jsonify({"error": f"Unknown stations: {', '.join(sorted(set(unknown)))}"}), 400
+
+    columns = np.array([stations[target] for target in targets])
+    if output == "npz":
+        minutes = np.empty((len(sources), len(targets)), dtype=np.int32)
+        with timed("route_search"):
+            for number, (_, row) in enumerate(matrix_rows(sources, max_transfers, constraints)):
+                minutes[number] = row[columns]
+        body = io.BytesIO()
+        np.savez(body, minutes=minutes, sources=np.array(sources), targets=np.array(targets))
+        return Response(body.getvalue(), mimetype="application/octet-stream",
+                        headers={"Content-Disposition": "attachment; filename=travel_times.npz",
+                                 "X-Travel-Times": MATRIX_TIMES})
+
+    def stream():
+        rows = matrix_rows(sources, max_transfers, constraints)
+        yield ",".join(["source", *targets]) + "\n"
+        while True:
+            with timed("route_search"):
+                row = next(rows, None)
+            if row is None:
+                return
+            source, minutes = row
+            yield source + "," + ",".join(map(str, minutes[columns].tolist())) + "\n"
+
+    return Response(stream_with_context(stream()), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=travel_times.csv",
+                             "X-Travel-Times": MATRIX_TIMES})
+
+def data_version() -> str:
+    """Version of the timetable and seat counts, for tagging responses built from them"""
+    seat_inventory.expire()
+    if store is not None:
+        return f"t{store.version()}.s{seat_inventory.version()}"
+    # Counters in memory start again with each process
+    return f"{BOOT_ID}.t{get_timetable().version}.s{seat_inventory.version()}"
 
 @app.route("/all_trains", methods=["GET"])
 def all_trains():
-    trains = get_all_trains()
-    return jsonify(trains)
+    with timed("db_lookup"):
+        version = data_version()
+    response = not_modified(version)
+    if response is not None:
+        return response
+    with timed("db_lookup"):
+        trains = get_all_trains()
+    with timed("serialize"):
+        return json_body_response(dumps(trains), etag=version)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    stats = route_cache.stats()
+    if pattern_index is not None:
+        stats["transfer_patterns"] = pattern_index.status(get_timetable())
+    return jsonify(stats)
 
 if __name__ == "__main__":
     app.run(port=5000, debug=True)
\ No newline at end of file
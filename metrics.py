@@ -0,0 +1,142 @@
+# metrics.py
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Latency buckets in seconds, from 100us to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _labels(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def drain(self) -> Dict[Tuple, float]:
+        """Return the values and reset them"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple, float]):
+        """Add values drained from another process"""
+        with self._lock:
+            for key, amount in values.items():
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(labels)} {value:g}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def drain(self) -> Dict[Tuple, List[float]]:
+        """Return the values and reset them"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple, List[float]]):
+        """Add values drained from another process"""
+        with self._lock:
+            for key, counts in values.items():
+                current = self._values.get(key)
+                if current is None:
+                    self._values[key] = list(counts)
+                else:
+                    self._values[key] = [a + b for a, b in zip(current, counts)]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, values in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, values):
+                    cumulative += count
+                    bucket = _labels(labels, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{bucket} {cumulative:g}")
+                bucket = _labels(labels, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{bucket} {values[-1]:g}")
+                lines.append(f"{self.name}_sum{_labels(labels)} {values[-2]:g}")
+                lines.append(f"{self.name}_count{_labels(labels)} {values[-1]:g}")
+        return lines
+
+STAGE_SECONDS = Histogram("travel_guide_stage_seconds", "Time spent in each stage of a request")
+SEARCH_NODES_EXPANDED = Counter("travel_guide_search_nodes_expanded_total", "Search nodes expanded by route engines")
+SEARCH_BRANCHES_PRUNED = Counter("travel_guide_search_branches_pruned_total", "Search branches pruned by route constraints")
+ROUTES_FOUND = Counter("travel_guide_routes_found_total", "Routes returned by route engines")
+
+REGISTRY = [STAGE_SECONDS, SEARCH_NODES_EXPANDED, SEARCH_BRANCHES_PRUNED, ROUTES_FOUND]
+
+@contextmanager
+def timed(stage: str):
+    """Record the time spent in a block under the given stage label"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+def record_search(engine: str, expanded: int, pruned: int, routes: int):
+    """Add the counters from one route search"""
+    SEARCH_NODES_EXPANDED.inc(expanded, engine=engine)
+    SEARCH_BRANCHES_PRUNED.inc(pruned, engine=engine)
+    ROUTES_FOUND.inc(routes, engine=engine)
+
+def drain() -> Dict[str, Dict]:
+    """Take every metric's values, resetting them, so a worker process can report them"""
+    return {metric.name: metric.drain() for metric in REGISTRY}
+
+def merge(values: Dict[str, Dict]):
+    """Add the values a worker process drained"""
+    for metric in REGISTRY:
+        if metric.name in values:
+            metric.merge(values[metric.name])
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,205 @@
+# pareto_search.py
+
+from datetime import date
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from metrics import record_search
+from timetable import TimetableIndex, CompiledTrain
+from route_finder import Route, as_timetable, make_leg_filter, next_departure
+from transfer_patterns import hop_distances
+
+# Fare estimate for trains without a "fare" field
+FARE_BASE = 50.0
+FARE_PER_MINUTE = 1.5
+
+def estimate_fare(train: Dict) -> float:
+    """Fare of one leg, estimated from its duration when the train has no fare"""
+    fare = train.get("fare")
+    if fare is not None:
+        return float(fare)
+    record = CompiledTrain(train)
+    return round(FARE_BASE + FARE_PER_MINUTE * record.duration, 2)
+
+def route_fare(route: Route) -> float:
+    return round(sum(estimate_fare(leg) for leg in route.legs), 2)
+
+def route_crowding(route: Route) -> float:
+    """Summed popularity of the legs; lower is more comfortable"""
+    return round(sum(leg.get("popularity", 0) for leg in route.legs), 4)
+
+# Ranking of a Pareto set for each UI priority
+PRIORITIES: Dict[str, Callable[[Route], Tuple]] = {
+    "speed": lambda route: (route.total_duration, route.transfers),
+    "cost": lambda route: (route_fare(route), route.total_duration),
+    "comfort": lambda route: (route_crowding(route), route.total_duration),
+}
+
+class Label:
+    """A partial journey reaching a station"""
+
+    __slots__ = ("departs", "arrives", "legs", "crowding", "fare", "wait", "record", "parent", "alive", "onward")
+
+    def __init__(self, departs: int, arrives: int, legs: int, crowding: float, fare: float, wait: int,
+                 record: CompiledTrain, parent: Optional["Label"]):
+        self.departs = departs
+        self.arrives = arrives
+        self.legs = legs
+        self.crowding = crowding
+        self.fare = fare
+        self.wait = wait
+        self.record = record
+        self.parent = parent
+        self.alive = True
+        # Boardings the label can extend with, keyed by Boarding.key; None at the destination
+        self.onward: Optional[Dict[Tuple, Tuple[CompiledTrain, int, int]]] = None
+
+    def stations(self) -> Set[str]:
+        """Every station the journey has been through, including its source"""
+        stations = set()
+        label = self
+        while label is not None:
+            stations.add(label.record.destination)
+            stations.add(label.record.source)
+            label = label.parent
+        return stations
+
+    def trains(self) -> List[Dict]:
+        legs = []
+        label = self
+        while label is not None:
+            legs.append(label.record.train)
+            label = label.parent
+        legs.reverse()
+        return legs
+
+def _covers(label: Label, other: Label) -> bool:
+    """Whether label can board every onward train other can, so it loses no extension"""
+    return label.onward is None or other.onward is None or label.onward.keys() >= other.onward.keys()
+
+def _dominated(bag: List[Label], label: Label, extra_legs: int = 0) -> bool:
+    """Whether a label in the bag is at least as good as label on every criterion.
+
+    A later first departure and an earlier arrival are both better, and the
+    bag label must also be able to board every onward train label can. With
+    extra_legs, bag labels may use that many more legs than label.
+    """
+    departs, arrives, legs, crowding, fare = label.departs, label.arrives, label.legs + extra_legs, label.crowding, label.fare
+    for other in bag:
+        if (other.arrives <= arrives and other.departs >= departs and other.legs <= legs
+                and other.crowding <= crowding and other.fare <= fare and _covers(other, label)):
+            return True
+    return False
+
+def _insert(bag: List[Label], label: Label) -> bool:
+    """Add a label to a Pareto bag unless it is dominated, dropping labels it dominates"""
+    if _dominated(bag, label):
+        return False
+    departs, arrives, legs, crowding, fare = label.departs, label.arrives, label.legs, label.crowding, label.fare
+    kept = []
+    for other in bag:
+        if (arrives <= other.arrives and departs >= other.departs and legs <= other.legs
+                and crowding <= other.crowding and fare <= other.fare and _covers(label, other)):
+            other.alive = False
+        else:
+            kept.append(other)
+    kept.append(label)
+    bag[:] = kept
+    return True
+
+def find_pareto_routes(trains, source: str, destination: str, max_transfers: int = 2,
+                       max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                       include_overnight: bool = True) -> List[Route]:
+    """Multi-criteria search keeping Pareto bags of labels per station.
+
+    Labels are compared on first departure, arrival, transfers, crowding
+    (summed popularity) and fare, so the returned set holds the best route
+    for each PRIORITIES ranking; it is sorted by duration.
+
+    Bags are kept per station. An earlier arrival can miss onward trains
+    when max_wait_time runs out before they leave, so a label only dominates
+    another that is no better on any criterion and can board nothing it
+    cannot board.
+    """
+    timetable: TimetableIndex = as_timetable(trains)
+    if source == destination:
+        return []
+    allowed = make_leg_filter(travel_date, include_overnight)
+    bags: Dict[str, List[Label]] = {}
+    max_legs = max_transfers + 1
+    # Fewest trains from each station to the destination; stations that cannot
+    # reach it with the legs left are never labelled
+    to_destination = hop_distances(timetable, destination, max_legs, reverse=True)
+    targets: List[Label] = []
+    fares: Dict[str, float] = {}
+    expanded = pruned = 0
+
+    def fare_of(record: CompiledTrain) -> float:
+        if record.train_id not in fares:
+            fares[record.train_id] = estimate_fare(record.train)
+        return fares[record.train_id]
+
+    def onward(label: Optional[Label]) -> Dict[Tuple, Tuple[CompiledTrain, int, int]]:
+        """Trains label can board next, as (train, wait_time, departs) by key.
+
+        Without a travel date, catching an earlier run of the same train only
+        moves the rest of the journey earlier by whole days, so the train alone
+        is the key; with one, the service day matters and so does departs.
+        """
+        nonlocal pruned
+        legs = label.legs + 1 if label else 1
+        visited = label.stations() if label else {source}
+        boardings = {}
+        for train in timetable.departures(label.record.destination if label else source):
+            if train.destination in visited or to_destination.get(train.destination, max_legs) > max_legs - legs:
+                continue
+            boarding = next_departure(label.record if label else None, train, label.arrives if label else 0,
+                                      max_wait_time)
+            if boarding is None or not allowed(train, boarding[1]):
+                pruned += 1
+                continue
+            key = (train.train_id,) if travel_date is None else (train.train_id, boarding[1])
+            boardings[key] = (train, *boarding)
+        return boardings
+
+    frontier: List[Optional[Label]] = [None]
+    for legs in range(1, max_legs + 1):
+        following = []
+        for label in frontier:
+            if label is not None and not label.alive:
+                continue
+            expanded += 1
+            for train, wait_time, departs in (label.onward if label else onward(None)).values():
+                extended = Label(
+                    label.departs if label else departs, departs + train.duration, legs,
+                    (label.crowding if label else 0.0) + train.train.get("popularity", 0),
+                    (label.fare if label else 0.0) + fare_of(train), (label.wait if label else 0) + wait_time,
+                    train, label
+                )
+                # Routes end at the destination, as in find_alternative_routes. Nothing
+                # follows an arrival there, so an earlier arrival always dominates.
+                if train.destination == destination:
+                    if not _insert(targets, extended):
+                        pruned += 1
+                    continue
+                # Every extension departs as early, arrives later, takes another leg
+                # and costs more, so a label a found route beats leads nowhere useful
+                if _dominated(targets, extended, extra_legs=1):
+                    pruned += 1
+                    continue
+                extended.onward = onward(extended) if legs < max_legs else {}
+                if not _insert(bags.setdefault(train.destination, []), extended):
+                    pruned += 1
+                    continue
+                following.append(extended)
+        frontier = following
+
+    routes = [
+        Route(
+            legs=label.trains(),
+            total_duration=label.arrives - label.departs,
+            total_wait_time=label.wait,
+            transfers=label.legs - 1
+        )
+        for label in targets
+    ]
+    record_search("pareto", expanded, pruned, len(routes))
+    return sorted(routes, key=lambda x: (x.total_duration, x.transfers))
@@ -0,0 +1,169 @@
+# ranked_search.py
+
+import base64
+import heapq
+import json
+import zlib
+from datetime import date
+from itertools import count
+from typing import Dict, List, Optional, Tuple
+from metrics import record_search
+from timetable import TimetableIndex, CompiledTrain
+from route_finder import Route, as_timetable, make_leg_filter, next_departure
+from goal_directed import get_bounds
+
+# Ranking criteria. Every cost only grows as a route is extended, so the
+# first complete route popped from the queue is the best one remaining.
+# Goal-directed searches rank partial routes by their duration plus a lower
+# bound on the minutes still to ride, which also never decreases. crowding is
+# the popularity of the busiest leg, so routes with a quieter worst leg come
+# first whatever their number of legs.
+CRITERIA = {
+    "duration": lambda duration, wait, legs, crowding: (duration,),
+    "transfers": lambda duration, wait, legs, crowding: (legs, duration),
+    "wait_time": lambda duration, wait, legs, crowding: (wait, duration),
+    "crowding": lambda duration, wait, legs, crowding: (crowding, duration),
+}
+
+def _path_legs(node) -> List[CompiledTrain]:
+    legs = []
+    while node is not None:
+        legs.append(node[0])
+        node = node[1]
+    legs.reverse()
+    return legs
+
+def _visits(node, station: str) -> bool:
+    while node is not None:
+        if node[0].destination == station:
+            return True
+        node = node[1]
+    return False
+
+def find_top_k_routes(trains, source: str, destination: str, k: int = 10, criterion: str = "duration",
+                      max_transfers: int = 2, max_wait_time: Optional[int] = None,
+                      travel_date: Optional[date] = None, include_overnight: bool = True,
+                      offset: int = 0, goal_directed: bool = False) -> Tuple[List[Route], bool]:
+    """Best-first search for the k best routes after skipping the first offset.
+
+    Returns (routes, exhausted) where exhausted is True when no further
+    routes exist beyond the ones returned; the search looks one route ahead
+    to tell.
+    """
+    return find_top_k_routes_multi(
+        trains, {source: 0}, {destination: 0}, k=k, criterion=criterion, max_transfers=max_transfers,
+        max_wait_time=max_wait_time, travel_date=travel_date, include_overnight=include_overnight, offset=offset,
+        goal_directed=goal_directed
+    )
+
+def find_top_k_routes_multi(trains, sources: Dict[str, int], destinations: Dict[str, int], k: int = 10,
+                            criterion: str = "duration", max_transfers: int = 2, max_wait_time: Optional[int] = None,
+                            travel_date: Optional[date] = None, include_overnight: bool = True,
+                            offset: int = 0, goal_directed: bool = False) -> Tuple[List[Route], bool]:
+    """Best-first search seeded with several origins and targets in a single run.
+
+    sources and destinations map stations to the walking/transfer minutes
+    needed to reach them from the requested origin or to get from them to
+    the requested destination. Those minutes count towards total_duration,
+    so routes from every origin are ranked together. With goal_directed,
+    the search is guided by lower bounds on the riding time to a target and
+    skips stations that cannot reach one; the routes found are the same.
+    """
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown ranking criterion: {criterion}")
+    cost_of = CRITERIA[criterion]
+    timetable: TimetableIndex = as_timetable(trains)
+    allowed = make_leg_filter(travel_date, include_overnight)
+    max_legs = max_transfers + 1
+    # One route past the page shows whether another page exists
+    wanted = offset + k + 1
+    # Paths may run on past a target only when another target lies beyond it
+    expand_targets = len(destinations) > 1
+    # Minutes still to ride, and trains still needed, from each station to a target
+    bounds = legs_left = None
+    if goal_directed:
+        bounds = get_bounds(timetable).to(destinations)
+        legs_left = get_bounds(timetable).legs_to(destinations, max_legs)
+
+    # Queue entries: (cost, tiebreak, complete, node, origin, arrives, duration, wait, crowding, legs)
+    # where node is a (record, parent node) linked list of the legs so far.
+    tiebreak = count()
+    queue = [
+        (cost_of(access + (bounds[origin] if bounds else 0), 0, 0, 0.0), next(tiebreak), False, None, origin, 0, access, 0, 0.0, 0)
+        for origin, access in sources.items()
+        if legs_left is None or origin in legs_left
+    ]
+    heapq.heapify(queue)
+    found: List[Route] = []
+    expanded = pruned = 0
+
+    while queue:
+        _, _, complete, node, origin, arrives, duration, wait, crowding, legs = heapq.heappop(queue)
+        if complete:
+            found.append(Route(
+                legs=[leg.train for leg in _path_legs(node)],
+                total_duration=duration,
+                total_wait_time=wait,
+                transfers=legs - 1,
+                access_time=sources[origin],
+                egress_time=destinations[node[0].destination]
+            ))
+            if len(found) == wanted:
+                record_search("topk", expanded, pruned, len(found))
+                return found[offset:wanted - 1], False
+            continue
+
+        expanded += 1
+        station = node[0].destination if node else origin
+        previous = node[0] if node else None
+        for train in timetable.departures(station):
+            if train.destination in sources or _visits(node, train.destination):
+                continue
+            if legs_left is not None and legs_left.get(train.destination, max_legs + 1) > max_legs - legs - 1:
+                pruned += 1
+                continue
+            boarding = next_departure(previous, train, arrives, max_wait_time)
+            if boarding is None or not allowed(train, boarding[1]):
+                pruned += 1
+                continue
+            wait_time, departs = boarding
+
+            next_duration = duration + wait_time + train.duration
+            next_wait = wait + wait_time
+            next_crowding = max(crowding, train.train.get("popularity", 0))
+            next_legs = legs + 1
+            next_node = (train, node)
+            reached = train.destination in destinations
+            if reached:
+                total_duration = next_duration + destinations[train.destination]
+                heapq.heappush(queue, (
+                    cost_of(total_duration, next_wait, next_legs, next_crowding), next(tiebreak), True,
+                    next_node, origin, departs + train.duration, total_duration, next_wait, next_crowding, next_legs
+                ))
+            if (reached and not expand_targets) or next_legs >= max_legs:
+                continue
+            remaining = bounds[train.destination] if bounds else 0
+            heapq.heappush(queue, (
+                cost_of(next_duration + remaining, next_wait, next_legs, next_crowding), next(tiebreak), False,
+                next_node, origin, departs + train.duration, next_duration, next_wait, next_crowding, next_legs
+            ))
+
+    record_search("topk", expanded, pruned, len(found))
+    return found[offset:], True
+
+def encode_cursor(offset: int, query_key) -> str:
+    """Opaque continuation token for the page starting at offset"""
+    payload = json.dumps({"offset": offset, "query": zlib.crc32(repr(query_key).encode())})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_cursor(cursor: str, query_key) -> int:
+    """Return the offset stored in a cursor, checking it belongs to the same query"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        offset = int(payload["offset"])
+        query = payload["query"]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Malformed cursor")
+    if query != zlib.crc32(repr(query_key).encode()) or offset < 0:
+        raise ValueError("Cursor does not match this query")
+    return offset
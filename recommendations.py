@@ -0,0 +1,161 @@
+# recommendations.py
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Optional
+from route_finder import format_duration
+
+OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "qwen2.5:3b")
+CACHE_DIR = os.environ.get("TRAVEL_GUIDE_LLM_CACHE", ".llm_cache")
+
+# /trains priority for each UI priority
+PRIORITY_PARAM = {
+    "Speed": "speed",
+    "Cost": "cost",
+    "Comfort": "comfort",
+}
+
+# Route field that ranks the combined direct and alternative routes for each UI priority
+PRIORITY_ROUTE_KEY = {
+    "Speed": "total_duration_minutes",
+    "Cost": "estimated_fare",
+    "Comfort": "crowding",
+}
+
+def summarize_route(route: Dict) -> str:
+    """One-line summary of a formatted route"""
+    legs = ", ".join(
+        f"{leg['train_id']} {leg['source']} {leg['departure_time']} -> {leg['destination']} {leg['arrival_time']}"
+        for leg in route["legs"]
+    )
+    seats = min(leg["seats_available"] for leg in route["legs"])
+    fare = f", fare ~{route['estimated_fare']:.0f}" if "estimated_fare" in route else ""
+    return (f"{legs} | total {format_duration(route['total_duration_minutes'])}, "
+            f"{route['number_of_transfers']} transfers, {seats} seats{fare}")
+
+def build_route_context(data: Optional[Dict], limit: int = 5, max_chars: int = 1500,
+                        sort_key: str = "total_duration_minutes") -> str:
+    """Compact, size-capped summary of the top ranked routes from a /trains response"""
+    if not data:
+        return "No routes found."
+    routes = (data.get("direct_routes") or []) + (data.get("alternative_routes") or [])
+    routes.sort(key=lambda route: (route.get(sort_key, 0), route["total_duration_minutes"]))
+    lines = []
+    length = 0
+    for number, route in enumerate(routes[:limit], 1):
+        line = f"{number}. {summarize_route(route)}"
+        if length + len(line) > max_chars:
+            break
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines) if lines else "No routes found."
+
+def build_prompt(query: str, context: Dict) -> str:
+    """Prompt for the travel recommendation model"""
+    return f"""
+        You are a smart travel guide assistant. The user's query is "{query}".
+
+        Context:
+        - Source Station: {context['source']}
+        - Destination Station: {context['destination']}
+        - Top Routes:
+        {context['available_trains']}
+        - Seat Availability: {context['seat_availability']}
+        - Travel Date: {context['travel_date']}
+        - Priority: {context.get('priority', 'Speed')}
+
+        Provide a detailed response including train options, seat availability, and recommendations.
+        Prioritize faster routes if speed is preferred, cheaper routes if cost is preferred, or less crowded routes if comfort is preferred.
+        """
+
+class ResponseCache:
+    """Disk-backed cache of model responses keyed on a normalized prompt hash"""
+
+    def __init__(self, directory: str = CACHE_DIR, max_age_seconds: Optional[float] = 24 * 60 * 60):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+
+    @staticmethod
+    def key(model: str, prompt: str) -> str:
+        normalized = " ".join(prompt.split())
+        return hashlib.sha256(f"{model}\n{normalized}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        """Cached response, or None when missing or older than max_age_seconds"""
+        try:
+            with open(self._path(self.key(model, prompt)), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.max_age_seconds is not None and time.time() - entry.get("created", 0) > self.max_age_seconds:
+            return None
+        return entry.get("response")
+
+    def put(self, model: str, prompt: str, response: str):
+        """Store a response, writing atomically so readers never see partial files"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(self.key(model, prompt))
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "response": response}, f)
+        os.replace(temporary, path)
+
+class OllamaClient:
+    """Ollama /api/generate client with streaming and a response cache"""
+
+    def __init__(self, url: str = OLLAMA_API_URL, model: str = OLLAMA_MODEL,
+                 cache: Optional[ResponseCache] = None, session=None, timeout: float = 120):
+        self.url = url
+        self.model = model
+        self.cache = cache
+        if session is None:
+            # requests is imported on first use, keeping it off the UI's startup path
+            import requests
+            session = requests
+        self.session = session
+        self.timeout = timeout
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield response text as the model generates it; cached answers arrive in one chunk"""
+        if self.cache:
+            cached = self.cache.get(self.model, prompt)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks: List[str] = []
+        with self.session.post(
+            self.url,
+            headers={"Content-Type": "application/json"},
+            json={"model": self.model, "prompt": prompt, "stream": True},
+            stream=True,
+            timeout=self.timeout
+        ) as response:
+            response.raise_for_status()
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                message = json.loads(line)
+                if message.get("error"):
+                    import requests
+                    raise requests.RequestException(message["error"])
+                text = message.get("response", "")
+                if text:
+                    chunks.append(text)
+                    yield text
+                if message.get("done"):
+                    break
+
+        if self.cache and chunks:
+            self.cache.put(self.model, prompt, "".join(chunks))
+
+    def generate(self, prompt: str) -> str:
+        """Complete response text"""
+        return "".join(self.stream(prompt))
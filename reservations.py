@@ -0,0 +1,267 @@
+# reservations.py
+
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Seconds a hold keeps its seats before it expires
+DEFAULT_HOLD_SECONDS = 10 * 60
+
+class ReservationError(Exception):
+    """A hold could not be placed, confirmed or released"""
+
+class InsufficientSeats(ReservationError):
+    def __init__(self, train_id: str, requested: int, available: int):
+        super().__init__(f"Train {train_id} has {available} seats available, {requested} requested")
+        self.train_id = train_id
+        self.requested = requested
+        self.available = available
+
+class HoldNotFound(ReservationError):
+    """The hold does not exist, has expired or was already released"""
+
+def _validate(train_ids: List[str], seats: int) -> List[str]:
+    """Check a hold request and return its trains without repeats"""
+    if seats < 1:
+        raise ReservationError("seats must be at least 1")
+    if not train_ids:
+        raise ReservationError("A hold needs at least one train")
+    # A train visited twice on one route needs the seats only once
+    return list(dict.fromkeys(train_ids))
+
+def route_train_ids(route) -> List[str]:
+    """Train IDs of every leg of a Route or formatted route"""
+    legs = route["legs"] if isinstance(route, dict) else route.legs
+    return [leg["train_id"] for leg in legs]
+
+@dataclass
+class Hold:
+    hold_id: str
+    train_ids: List[str]
+    seats: int
+    expires_at: float
+    confirmed: bool = False
+
+class SeatInventory:
+    """Seat holds and confirmations with one lock per shard of trains.
+
+    A hold across several legs locks only the shards of its own trains, in
+    shard order so concurrent bookers never deadlock, and either reserves
+    seats on every leg or on none. Unconfirmed holds give their seats back
+    once they expire, which every read checks for. Holds live in this
+    process; StoredSeatInventory shares them through the database.
+    """
+
+    def __init__(self, get_seats: Callable[[Iterable[str]], Dict[str, int]],
+                 set_seats: Callable[[str, int], object], shards: int = 64,
+                 hold_seconds: float = DEFAULT_HOLD_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.get_seats = get_seats
+        self.set_seats = set_seats
+        self.hold_seconds = hold_seconds
+        self.clock = clock
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._holds: Dict[str, Hold] = {}
+        self._expiry: List = []
+        self._expiry_lock = threading.Lock()
+        self._counter = itertools.count()
+        self._version = 0
+
+    def _shards(self, train_ids: Iterable[str]) -> List[threading.Lock]:
+        return [self._locks[shard] for shard in sorted({hash(train_id) % len(self._locks) for train_id in train_ids})]
+
+    def _locked(self, train_ids: Iterable[str]):
+        locks = self._shards(train_ids)
+        for lock in locks:
+            lock.acquire()
+        return locks
+
+    @staticmethod
+    def _unlock(locks: List[threading.Lock]):
+        for lock in reversed(locks):
+            lock.release()
+
+    def hold(self, train_ids: List[str], seats: int = 1) -> Hold:
+        """Reserve seats on every train, or raise without reserving any"""
+        train_ids = _validate(train_ids, seats)
+        self.expire()
+
+        locks = self._locked(train_ids)
+        try:
+            available = self.get_seats(train_ids)
+            for train_id in train_ids:
+                if train_id not in available:
+                    raise ReservationError(f"Unknown train: {train_id}")
+                if available[train_id] < seats:
+                    raise InsufficientSeats(train_id, seats, available[train_id])
+            taken = []
+            try:
+                for train_id in train_ids:
+                    self.set_seats(train_id, available[train_id] - seats)
+                    taken.append(train_id)
+            except Exception:
+                # Put back the legs already taken so a failed hold reserves nothing
+                for train_id in taken:
+                    self.set_seats(train_id, available[train_id])
+                raise
+            hold = Hold(uuid.uuid4().hex, train_ids, seats, self.clock() + self.hold_seconds)
+            self._holds[hold.hold_id] = hold
+        finally:
+            self._unlock(locks)
+
+        with self._expiry_lock:
+            heapq.heappush(self._expiry, (hold.expires_at, next(self._counter), hold.hold_id))
+            self._version += 1
+        return hold
+
+    def hold_route(self, route, seats: int = 1) -> Hold:
+        """Hold seats on every leg of a Route or formatted route"""
+        return self.hold(route_train_ids(route), seats)
+
+    def confirm(self, hold_id: str) -> Hold:
+        """Turn a live hold into a confirmed booking that never expires"""
+        self.expire()
+        hold = self._holds.get(hold_id)
+        if hold is None:
+            raise HoldNotFound(hold_id)
+        locks = self._locked(hold.train_ids)
+        try:
+            if self._holds.get(hold_id) is not hold:
+                raise HoldNotFound(hold_id)
+            del self._holds[hold_id]
+            # The hold may have expired while we waited for the locks
+            if hold.expires_at <= self.clock():
+                self._return_seats(hold)
+                raise HoldNotFound(hold_id)
+            hold.confirmed = True
+        finally:
+            self._unlock(locks)
+        return hold
+
+    def release(self, hold_id: str) -> Hold:
+        """Cancel an unconfirmed hold and give its seats back"""
+        self.expire()
+        hold = self._holds.get(hold_id)
+        if hold is None or not self._release(hold):
+            raise HoldNotFound(hold_id)
+        return hold
+
+    def _release(self, hold: Hold) -> bool:
+        locks = self._locked(hold.train_ids)
+        try:
+            if self._holds.get(hold.hold_id) is not hold:
+                return False
+            del self._holds[hold.hold_id]
+            self._return_seats(hold)
+            return True
+        finally:
+            self._unlock(locks)
+
+    def _return_seats(self, hold: Hold):
+        """Give a hold's seats back; the caller holds its trains' locks"""
+        available = self.get_seats(hold.train_ids)
+        for train_id in hold.train_ids:
+            if train_id in available:
+                self.set_seats(train_id, available[train_id] + hold.seats)
+        with self._expiry_lock:
+            self._version += 1
+
+    def get(self, hold_id: str) -> Optional[Hold]:
+        self.expire()
+        return self._holds.get(hold_id)
+
+    def seats(self, train_ids: Iterable[str]) -> Dict[str, int]:
+        """Current seat counts, with expired holds given back first"""
+        self.expire()
+        return self.get_seats(train_ids)
+
+    def version(self) -> int:
+        """Counter bumped whenever a hold takes or gives back seats"""
+        return self._version
+
+    def expire(self) -> int:
+        """Release every hold past its expiry and return how many were released"""
+        now = self.clock()
+        expired = []
+        with self._expiry_lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                expired.append(heapq.heappop(self._expiry)[2])
+        released = 0
+        for hold_id in expired:
+            hold = self._holds.get(hold_id)
+            # Confirmed holds have already left _holds
+            if hold is not None and self._release(hold):
+                released += 1
+        return released
+
+    def __len__(self) -> int:
+        self.expire()
+        return len(self._holds)
+
+class StoredSeatInventory:
+    """Seat holds kept in a TrainStore, shared by every process using the database.
+
+    A hold takes its seats with one conditional update per leg in a single
+    transaction, so bookers in any process never oversell, and holds left
+    behind by a restarted process still expire. Expiry times are wall-clock.
+    """
+
+    def __init__(self, store, hold_seconds: float = DEFAULT_HOLD_SECONDS, clock: Callable[[], float] = time.time):
+        self.store = store
+        self.hold_seconds = hold_seconds
+        self.clock = clock
+
+    def hold(self, train_ids: List[str], seats: int = 1) -> Hold:
+        """Reserve seats on every train, or raise without reserving any"""
+        train_ids = _validate(train_ids, seats)
+        self.expire()
+        hold = Hold(uuid.uuid4().hex, train_ids, seats, self.clock() + self.hold_seconds)
+        failed = self.store.hold_seats(hold.hold_id, train_ids, seats, hold.expires_at)
+        if failed is not None:
+            train_id, available = failed
+            if available is None:
+                raise ReservationError(f"Unknown train: {train_id}")
+            raise InsufficientSeats(train_id, seats, available)
+        return hold
+
+    def hold_route(self, route, seats: int = 1) -> Hold:
+        """Hold seats on every leg of a Route or formatted route"""
+        return self.hold(route_train_ids(route), seats)
+
+    def confirm(self, hold_id: str) -> Hold:
+        """Turn a live hold into a confirmed booking that never expires"""
+        stored = self.store.confirm_hold(hold_id, self.clock())
+        if stored is None:
+            raise HoldNotFound(hold_id)
+        return Hold(**stored, confirmed=True)
+
+    def release(self, hold_id: str) -> Hold:
+        """Cancel an unconfirmed hold and give its seats back"""
+        self.expire()
+        stored = self.store.release_hold(hold_id)
+        if stored is None:
+            raise HoldNotFound(hold_id)
+        return Hold(**stored)
+
+    def get(self, hold_id: str) -> Optional[Hold]:
+        stored = self.store.get_hold(hold_id, self.clock())
+        return Hold(**stored) if stored is not None else None
+
+    def seats(self, train_ids: Iterable[str]) -> Dict[str, int]:
+        """Current seat counts, with expired holds given back first"""
+        self.expire()
+        return self.store.seat_availability(train_ids)
+
+    def version(self) -> int:
+        """Counter bumped whenever seats are taken or given back, by any process"""
+        return self.store.seat_version()
+
+    def expire(self) -> int:
+        """Release every hold past its expiry and return how many were released"""
+        return self.store.expire_holds(self.clock())
+
+    def __len__(self) -> int:
+        return self.store.count_holds(self.clock())
@@ -0,0 +1,116 @@
+# responses.py
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Union
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+# Compressed bodies kept for repeated ETag-tagged responses
+MAX_COMPRESSED_ENTRIES = 16
+
+_compressed: "OrderedDict[tuple, bytes]" = OrderedDict()
+_compressed_lock = threading.Lock()
+
+def dumps(payload: Any) -> bytes:
+    """Encode JSON with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring br"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+def _cached_compress(etag: str, body: bytes, encoding: str) -> bytes:
+    key = (etag, encoding)
+    with _compressed_lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+    data = compress(body, encoding)
+    with _compressed_lock:
+        _compressed[key] = data
+        if len(_compressed) > MAX_COMPRESSED_ENTRIES:
+            _compressed.popitem(last=False)
+    return data
+
+def _not_modified_response(tag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(tag)
+    response.vary.add("Accept-Encoding")
+    return response
+
+def not_modified(version: str) -> Optional[Response]:
+    """An empty 304 when If-None-Match holds a tag for this version of the data, checked
+    before the body is built; the body then goes to json_body_response with etag=version"""
+    encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+    # Small bodies are sent uncompressed, so either tag may be the client's
+    for tag in (f"{version}-{encoding}" if encoding else None, version):
+        if tag and tag in request.if_none_match:
+            return _not_modified_response(tag)
+    return None
+
+def json_body_response(body: bytes, etag: Union[bool, str] = False, status: int = 200) -> Response:
+    """Send an encoded JSON body, compressed when the client accepts it.
+
+    With etag=True the response carries an ETag of the body and a matching
+    If-None-Match gets an empty 304. A string etag is a version of the data
+    the body was built from, used as the tag instead of hashing the body.
+    """
+    encoding = None
+    if len(body) >= MIN_COMPRESS_BYTES:
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+
+    tag = None
+    if etag:
+        tag = etag if isinstance(etag, str) else hashlib.blake2b(body, digest_size=16).hexdigest()
+        # Each encoding is a different representation with its own tag
+        tag = f"{tag}-{encoding}" if encoding else tag
+        if tag in request.if_none_match:
+            return _not_modified_response(tag)
+
+    if encoding:
+        body = _cached_compress(tag, body, encoding) if tag else compress(body, encoding)
+    response = Response(body, status=status, mimetype="application/json")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    if tag:
+        response.set_etag(tag)
+    return response
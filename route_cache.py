@@ -0,0 +1,99 @@
+# route_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+class RouteCache:
+    """Bounded LRU cache of route search results with a time-to-live.
+
+    Only route topology is cached. Seat counts change far more often, so they
+    are overlaid from the live timetable when a cached result is formatted.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.invalidated_entries = 0
+
+    @staticmethod
+    def make_key(source: str, destination: str, **params) -> Tuple:
+        """Normalize query parameters into a hashable cache key"""
+        normalized = []
+        for name, value in sorted(params.items()):
+            if isinstance(value, str):
+                value = value.strip().lower()
+            elif hasattr(value, "isoformat"):
+                value = value.isoformat()
+            normalized.append((name, value))
+        return (source.strip(), destination.strip(), tuple(normalized))
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return the cached value for a key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        with self._lock:
+            self._entries[key] = (self.clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *_):
+        """Drop every cached entry"""
+        with self._lock:
+            self.invalidated_entries += len(self._entries)
+            self._entries.clear()
+            self.invalidations += 1
+
+    def keys(self):
+        """Snapshot of the cached keys"""
+        with self._lock:
+            return list(self._entries)
+
+    def invalidate_where(self, affected: Callable[[Tuple], bool]) -> int:
+        """Drop the entries whose key is affected and return how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if affected(key)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += 1
+            self.invalidated_entries += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "invalidated_entries": self.invalidated_entries
+            }
@@ -1,8 +1,10 @@
 # route_finder.py
 
-from typing import List, Dict, Optional
+from typing import Callable, Iterable, List, Dict, Optional, Tuple, Union
 from dataclasses import dataclass
-from datetime import datetime, timedelta
+from datetime import date
+from metrics import record_search
+from timetable import TimetableIndex, CompiledTrain, parse_time, MINUTES_PER_DAY
 
 @dataclass
 class Route:
@@ -10,100 +12,139 @@ class Route:
     total_duration: int
     total_wait_time: int
     transfers: int
+    access_time: int = 0  # Minutes to reach the first leg's station from the requested origin
+    egress_time: int = 0  # Minutes from the last leg's station to the requested destination
 
 def calculate_duration(departure: str, arrival: str) -> int:
     """Calculate duration in minutes between departure and arrival times."""
-    dep = datetime.strptime(departure, "%H:%M")
-    arr = datetime.strptime(arrival, "%H:%M")
-    duration = arr - dep
-    if duration.days < 0:  # Handle overnight journeys
-        duration += timedelta(days=1)
-    return int(duration.total_seconds() / 60)
+    # Handle overnight journeys by wrapping past midnight
+    return (parse_time(arrival) - parse_time(departure)) % MINUTES_PER_DAY
 
 def calculate_wait_time(arrival: str, next_departure: str) -> int:
     """Calculate waiting time in minutes between arrival and next departure."""
-    arr = datetime.strptime(arrival, "%H:%M")
-    dep = datetime.strptime(next_departure, "%H:%M")
-    wait = dep - arr
-    if wait.days < 0:  # Handle overnight waits
-        wait += timedelta(days=1)
-    return int(wait.total_seconds() / 60)
+    # Handle overnight waits by wrapping past midnight
+    return (parse_time(next_departure) - parse_time(arrival)) % MINUTES_PER_DAY
 
 def format_duration(minutes: int) -> str:
     """Format duration from minutes to hours and minutes."""
     hours, minutes = divmod(minutes, 60)
     return f"{hours}h {minutes}m" if hours else f"{minutes}m"
 
-def find_alternative_routes(trains: List[Dict], source: str, destination: str, max_transfers: int = 2) -> List[Route]:
-    """Find all possible routes between source and destination with up to max_transfers"""
-    routes = []
+def as_timetable(trains: Union[List[Dict], TimetableIndex]) -> TimetableIndex:
+    """Return an indexed timetable, building one if given a plain train list"""
+    return trains if isinstance(trains, TimetableIndex) else TimetableIndex(trains)
+
+def make_leg_filter(travel_date: Optional[date] = None, include_overnight: bool = True) -> Callable[[CompiledTrain, int], bool]:
+    """Build a check for whether a train may be boarded at a journey time.
+
+    The check takes the train and its departure in minutes since midnight of
+    the first departure day (travel_date when given).
+    """
+    weekday = travel_date.weekday() if travel_date else None
     
-    # First check for direct routes
-    direct_routes = [train for train in trains if train["source"] == source and train["destination"] == destination]
-    for train in direct_routes:
-        duration = calculate_duration(train["departure_time"], train["arrival_time"])
-        routes.append(Route(
-            legs=[train],
-            total_duration=duration,
-            total_wait_time=0,
-            transfers=0
-        ))
+    def allowed(train: CompiledTrain, departs: int) -> bool:
+        if weekday is not None and not train.runs_on(weekday + departs // MINUTES_PER_DAY):
+            return False
+        if not include_overnight and departs + train.duration >= MINUTES_PER_DAY:
+            return False
+        return True
     
-    # If no direct routes or we want to find alternatives, look for multi-leg journeys
-    def find_connecting_routes(current_station: str, target: str, visited: set, current_route: List[Dict], transfers: int):
-        if transfers > max_transfers:
-            return
-            
-        possible_next_legs = [
-            train for train in trains 
-            if train["source"] == current_station 
-            and train["source"] not in visited
-        ]
+    return allowed
+
+def next_departure(previous: Optional[CompiledTrain], train: CompiledTrain, arrives: int,
+                   max_wait_time: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """Board train after previous, which reaches the station at arrives in journey minutes.
+
+    Returns (wait_time, departs), with the train taken at its own departure
+    time when it is the first leg, or None when the wait exceeds max_wait_time.
+    """
+    if previous is None:
+        return 0, train.departure
+    wait_time = previous.wait_until(train)
+    if max_wait_time is not None and wait_time > max_wait_time:
+        return None
+    return wait_time, arrives + wait_time
+
+def find_alternative_routes(trains: Union[List[Dict], TimetableIndex], source: str, destination: str, max_transfers: int = 2,
+                            max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                            include_overnight: bool = True) -> List[Route]:
+    """Find all possible routes between source and destination with up to max_transfers.
+
+    Branches are pruned as soon as they wait longer than max_wait_time at a
+    transfer, board a train that does not run on that day of the journey
+    starting at travel_date, or cross midnight when include_overnight is False.
+    """
+    return find_routes_to_many(
+        trains, source, [destination], max_transfers,
+        max_wait_time=max_wait_time, travel_date=travel_date, include_overnight=include_overnight
+    )[destination]
+
+def find_routes_to_many(trains: Union[List[Dict], TimetableIndex], source: str, destinations: Iterable[str], max_transfers: int = 2,
+                        max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                        include_overnight: bool = True) -> Dict[str, List[Route]]:
+    """Find routes from one source to several destinations with a single search tree.
+
+    Returns the routes to each destination, sorted by total duration. Routes
+    to one destination are identical to a find_alternative_routes call.
+    """
+    timetable = as_timetable(trains)
+    allowed = make_leg_filter(travel_date, include_overnight)
+    targets = set(destinations)
+    # A path only needs to continue past a target when other targets remain
+    expand_targets = len(targets) > 1
+    routes: Dict[str, List[Route]] = {target: [] for target in targets}
+    stats = {"expanded": 0, "pruned": 0}
+    
+    def find_connecting_routes(current_station: str, visited: set, current_route: List[CompiledTrain],
+                               transfers: int, arrives: int, total_duration: int, total_wait_time: int):
+        stats["expanded"] += 1
+        previous = current_route[-1] if current_route else None
         
-        for next_leg in possible_next_legs:
-            if next_leg["destination"] == target:
-                # Found a complete route
-                total_duration = 0
-                total_wait_time = 0
-                
-                # Calculate total duration and wait times
-                for i, leg in enumerate(current_route + [next_leg]):
-                    duration = calculate_duration(leg["departure_time"], leg["arrival_time"])
-                    total_duration += duration
-                    
-                    if i > 0:  # Calculate wait time between legs
-                        wait_time = calculate_wait_time(
-                            current_route[i-1]["arrival_time"],
-                            leg["departure_time"]
-                        )
-                        total_wait_time += wait_time
-                        total_duration += wait_time
-                
-                routes.append(Route(
-                    legs=current_route + [next_leg],
-                    total_duration=total_duration,
-                    total_wait_time=total_wait_time,
+        for next_leg in timetable.departures(current_station):
+            if next_leg.destination in visited:
+                continue
+            # Running totals in integer minutes, including the wait before this leg
+            boarding = next_departure(previous, next_leg, arrives, max_wait_time)
+            if boarding is None or not allowed(next_leg, boarding[1]):
+                stats["pruned"] += 1
+                continue
+            wait_time, departs = boarding
+            duration = total_duration + wait_time + next_leg.duration
+            wait = total_wait_time + wait_time
+            
+            if next_leg.destination in targets:
+                routes[next_leg.destination].append(Route(
+                    legs=[leg.train for leg in current_route] + [next_leg.train],
+                    total_duration=duration,
+                    total_wait_time=wait,
                     transfers=len(current_route)
                 ))
-            else:
+                if not expand_targets:
+                    continue
+            if transfers < max_transfers:
                 # Continue searching for routes through this leg
-                new_visited = visited | {next_leg["source"]}
                 find_connecting_routes(
-                    next_leg["destination"],
-                    target,
-                    new_visited,
+                    next_leg.destination,
+                    visited | {next_leg.destination},
                     current_route + [next_leg],
-                    transfers + 1
+                    transfers + 1,
+                    departs + next_leg.duration,
+                    duration,
+                    wait
                 )
     
-    if len(routes) == 0 or max_transfers > 0:
-        find_connecting_routes(source, destination, {source}, [], 0)
+    targets.discard(source)
+    find_connecting_routes(source, {source}, [], 0, 0, 0, 0)
+    record_search("dfs", stats["expanded"], stats["pruned"], sum(len(found) for found in routes.values()))
     
-    # Sort routes by total duration
-    return sorted(routes, key=lambda x: x.total_duration)
+    # Sort routes by total duration, direct routes first on ties
+    return {
+        target: sorted(found, key=lambda x: (x.total_duration, x.transfers))
+        for target, found in routes.items()
+    }
 
-def format_route_details(route: Route) -> Dict:
-    """Format route details for API response"""
+def format_route_details(route: Route, seats: Optional[Dict[str, int]] = None) -> Dict:
+    """Format route details for API response, overlaying current seat counts if given"""
     legs = []
     for i, leg in enumerate(route.legs):
         leg_info = {
@@ -113,7 +154,7 @@ def format_route_details(route: Route) -> Dict:
             "destination": leg["destination"],
             "departure_time": leg["departure_time"],
             "arrival_time": leg["arrival_time"],
-            "seats_available": leg["seats_available"]
+            "seats_available": seats.get(leg["train_id"], leg["seats_available"]) if seats else leg["seats_available"]
         }
         if i > 0:
             leg_info["wait_time_at_source"] = calculate_wait_time(
@@ -122,9 +163,42 @@ def format_route_details(route: Route) -> Dict:
             )
         legs.append(leg_info)
     
-    return {
+    details = {
         "legs": legs,
         "total_duration_minutes": route.total_duration,
         "total_wait_time_minutes": route.total_wait_time,
         "number_of_transfers": route.transfers
     }
+    if route.access_time:
+        details["access_time_minutes"] = route.access_time
+    if route.egress_time:
+        details["egress_time_minutes"] = route.egress_time
+    return details
+
+def format_route_compact(route: Route, train_table: Dict[str, Dict], seats: Optional[Dict[str, int]] = None) -> Dict:
+    """Format a route whose legs reference trains by ID, adding each train to a shared train table once"""
+    for leg in route.legs:
+        if leg["train_id"] not in train_table:
+            train_table[leg["train_id"]] = {
+                "train_name": leg["train_name"],
+                "source": leg["source"],
+                "destination": leg["destination"],
+                "departure_time": leg["departure_time"],
+                "arrival_time": leg["arrival_time"],
+                "seats_available": seats.get(leg["train_id"], leg["seats_available"]) if seats else leg["seats_available"]
+            }
+    details = {
+        "legs": [leg["train_id"] for leg in route.legs],
+        "wait_times": [
+            calculate_wait_time(previous["arrival_time"], leg["departure_time"])
+            for previous, leg in zip(route.legs, route.legs[1:])
+        ],
+        "total_duration_minutes": route.total_duration,
+        "total_wait_time_minutes": route.total_wait_time,
+        "number_of_transfers": route.transfers
+    }
+    if route.access_time:
+        details["access_time_minutes"] = route.access_time
+    if route.egress_time:
+        details["egress_time_minutes"] = route.egress_time
+    return details
@@ -0,0 +1,357 @@
+# serve.py
+#
+# Production serving mode. Every request is handled by the Flask app in this
+# process, called as a WSGI application, which owns the route cache, seat
+# holds, live updates and metrics. Apart from /metrics and /cache/stats,
+# requests run on request threads so the event loop never waits on the
+# database or a search. Route search requests hand the search itself to a
+# process pool, so searches use every core. Pool workers are stateless
+# apart from their copy of the timetable: they run one search function and
+# return its routes along with the metrics it recorded, while caching, the
+# seat overlay and /metrics stay here. Live timetable updates reach the
+# workers with their next search: every task carries the changes made since
+# the pool started, and a worker applies the ones it has not seen. With a
+# shared database, workers reload from it instead. Streamed responses, such
+# as /matrix CSV rows, are sent chunk by chunk as they are computed. Run with:
+#
+#   uvicorn serve:app --port 5000
+#
+# Configuration (environment variables):
+#   TRAVEL_GUIDE_WORKERS          route search processes (default: CPU count)
+#   TRAVEL_GUIDE_REQUEST_TIMEOUT  seconds before a search returns 504 (default: 10)
+#   TRAVEL_GUIDE_MAX_QUEUE        searches in flight before returning 503 (default: 4 per worker)
+
+import asyncio
+import contextvars
+import io
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import parse_qs
+import metrics
+
+WORKERS = int(os.environ.get("TRAVEL_GUIDE_WORKERS", os.cpu_count() or 1))
+REQUEST_TIMEOUT = float(os.environ.get("TRAVEL_GUIDE_REQUEST_TIMEOUT", "10"))
+MAX_QUEUE = int(os.environ.get("TRAVEL_GUIDE_MAX_QUEUE", str(WORKERS * 4)))
+
+# Timetable changes sent along with each search before the pool is restarted
+# with a fresh copy of the timetable instead
+MAX_PENDING_CHANGES = 512
+
+def is_route_search(method: str, path: str, query_string: bytes) -> bool:
+    """Whether a request runs a CPU-heavy route search"""
+    if path == "/trains":
+        query = parse_qs(query_string.decode("latin-1"))
+        return query.get("alternative_routes", ["false"])[0].lower() == "true"
+    return path == "/matrix" or (method == "POST" and path == "/trains/batch")
+
+# Endpoints cheap enough to answer on the event loop; every other request
+# runs on a request thread, as it may touch the database or the timetable
+INLINE_PATHS = {"/metrics", "/cache/stats"}
+
+def wsgi_environ(scope: Dict, body: bytes) -> Dict:
+    """Build the WSGI environ for an ASGI http scope and its request body"""
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if scope.get("client"):
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = scope["client"][0], str(scope["client"][1])
+    for name, value in scope["headers"]:
+        name, value = name.decode("latin-1").upper().replace("-", "_"), value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = "HTTP_" + name
+        # Repeated headers are joined, as a WSGI server would
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    environ.setdefault("CONTENT_LENGTH", str(len(body)))
+    return environ
+
+def dispatch(scope: Dict, body: bytes) -> Tuple[int, List[Tuple[str, str]], Union[bytes, Iterator[bytes]]]:
+    """Run one request through the Flask app as a WSGI call and return (status, headers, body).
+
+    A response without a Content-Length is streamed: its body is an iterator
+    of chunks, computed as it is read.
+    """
+    from main import app as flask_app
+
+    started: List = []
+
+    def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+
+    chunks = flask_app(wsgi_environ(scope, body), start_response)
+    status, headers = started
+    if any(name.lower() == "content-length" for name, _ in headers):
+        try:
+            return status, headers, b"".join(chunks)
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+    return status, headers, _chunks(chunks)
+
+def _chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield chunk
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+# Changes from the serving process this worker has applied to its timetable
+_applied_changes = 0
+
+def _init_worker(trains: Optional[List[Dict]]):
+    """Load the timetable before the first search arrives, replacing it when the server sends one"""
+    import main
+    if trains is not None:
+        main.get_timetable().load(trains)
+
+def _run_search(changes: Tuple, function, args: Tuple):
+    """Pool worker entry point: catch up with the timetable changes, then run one search function.
+
+    Returns the result and the metrics the search recorded, which the
+    serving process adds to its own.
+    """
+    global _applied_changes
+    if len(changes) > _applied_changes:
+        from dummyDB import get_timetable
+        timetable = get_timetable()
+        for change, train in changes[_applied_changes:]:
+            if change == "add":
+                timetable.add_train(train)
+            else:
+                timetable.remove_train(train["train_id"])
+        _applied_changes = len(changes)
+    return function(*args), metrics.drain()
+
+class RouteServer:
+    """ASGI application that offloads route searches to a bounded process pool"""
+
+    def __init__(self, workers: int = WORKERS, request_timeout: float = REQUEST_TIMEOUT, max_queue: int = MAX_QUEUE):
+        self.workers = workers
+        self.request_timeout = request_timeout
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.threads: Optional[ThreadPoolExecutor] = None
+        # Timetable changes since the pool started, as (change, train)
+        self.changes: List[Tuple[str, Dict]] = []
+        self.restart_pool = False
+        self._subscribed = False
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self.pool is None:
+            import main
+            self._start_pool()
+            # One thread per search in flight, each waiting on the pool; other
+            # requests share them, as they block on the database or timetable lock
+            self.threads = ThreadPoolExecutor(max_workers=self.max_queue, thread_name_prefix="request")
+            main.search_runner = self
+            if not self._subscribed:
+                main.get_timetable().subscribe(self._timetable_changed)
+                self._subscribed = True
+
+    def _start_pool(self):
+        import dummyDB
+        timetable = dummyDB.get_timetable()
+        # Workers load the same timetable as this process did at import, so it
+        # is only sent when it has changed since; database workers reload it themselves
+        trains = list(timetable) if dummyDB.store is None and timetable.version else None
+        # Workers are spawned rather than forked, so they never inherit this
+        # process's locks, threads or database connections
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(trains,))
+        self.changes = []
+        self.restart_pool = False
+
+    def _timetable_changed(self, change: str, train: Optional[Dict]):
+        import dummyDB
+        if dummyDB.store is not None:
+            return
+        with self._lock:
+            if change == "reload" or len(self.changes) >= MAX_PENDING_CHANGES:
+                self.restart_pool = True
+            else:
+                self.changes.append((change, train))
+
+    def stop(self):
+        if self.pool is not None:
+            import main
+            main.search_runner = None
+            self.pool.shutdown(cancel_futures=True)
+            self.threads.shutdown(cancel_futures=True)
+            self.pool = self.threads = None
+
+    def _current_pool(self) -> Tuple[ProcessPoolExecutor, Tuple]:
+        """The pool to submit to and the timetable changes its workers need"""
+        with self._lock:
+            if self.restart_pool:
+                # Searches already running on the old pool finish there
+                previous = self.pool
+                self._start_pool()
+                previous.shutdown(wait=False)
+            return self.pool, tuple(self.changes)
+
+    @staticmethod
+    def _result(future: Future):
+        result, recorded = future.result()
+        metrics.merge(recorded)
+        return result
+
+    def run_search(self, function, *args):
+        """Run a search function on the process pool and wait for its result; called from request threads"""
+        pool, changes = self._current_pool()
+        return self._result(pool.submit(_run_search, changes, function, args))
+
+    def map_searches(self, function, argument_lists: Iterable[Tuple]) -> Iterator:
+        """Run a search function over several argument tuples on the pool, yielding results in order.
+
+        At most one task per worker is queued ahead of the one being read,
+        so a long run of them leaves room for other searches.
+        """
+        pool, changes = self._current_pool()
+        pending = deque()
+        try:
+            for args in argument_lists:
+                pending.append(pool.submit(_run_search, changes, function, args))
+                if len(pending) > self.workers:
+                    yield self._result(pending.popleft())
+            while pending:
+                yield self._result(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def __call__(self, scope: Dict, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        method, path, query_string = scope["method"], scope["path"], scope["query_string"]
+
+        if path in INLINE_PATHS:
+            await self._respond(send, *dispatch(scope, body))
+            return
+        self.start()
+        # A streamed body is read in the same context the request ran in, as Flask expects
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        if not is_route_search(method, path, query_string):
+            result = await loop.run_in_executor(self.threads, context.run, dispatch, scope, body)
+            await self._send_result(send, result, context)
+            return
+
+        if self.in_flight >= self.max_queue:
+            await self._error(send, 503, "Server busy, try again later", [("Retry-After", "1")])
+            return
+        self.in_flight += 1
+        future = loop.run_in_executor(self.threads, context.run, dispatch, scope, body)
+        # A timed-out search keeps its slot until the worker actually finishes
+        future.add_done_callback(self._finished)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.request_timeout)
+        except asyncio.TimeoutError:
+            await self._error(send, 504, "Route search timed out")
+            return
+        if isinstance(result[2], bytes):
+            await self._send_result(send, result, context)
+            return
+        # A streamed body is computed while it is sent, so it holds a slot until the last chunk
+        self.in_flight += 1
+        try:
+            await self._send_result(send, result, context)
+        finally:
+            self.in_flight -= 1
+
+    async def _send_result(self, send, result: Tuple, context: contextvars.Context):
+        status, headers, body = result
+        if isinstance(body, bytes):
+            await self._respond(send, status, headers, body)
+        else:
+            await self._stream(send, status, headers, body, context)
+
+    def _finished(self, future):
+        self.in_flight -= 1
+
+    async def _stream(self, send, status: int, headers: List[Tuple[str, str]], chunks: Iterator[bytes],
+                      context: contextvars.Context):
+        """Send a streamed body, reading each chunk on a request thread within context"""
+        reading: Optional[Future] = None
+        try:
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            })
+            while True:
+                reading = self.threads.submit(context.run, next, chunks, None)
+                chunk = await asyncio.wrap_future(reading)
+                if chunk is None:
+                    break
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            # Stops the computation when the client goes away mid-stream, once
+            # any chunk still being read is done
+            if reading is None:
+                self.threads.submit(context.run, chunks.close)
+            else:
+                reading.add_done_callback(lambda _: self.threads.submit(context.run, chunks.close))
+
+    @staticmethod
+    async def _respond(send, status: int, headers: List[Tuple[str, str]], body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _error(self, send, status: int, message: str, headers: Optional[List[Tuple[str, str]]] = None):
+        body = json.dumps({"error": message}).encode()
+        await self._respond(send, status, [("Content-Type", "application/json")] + (headers or []), body)
+
+app = RouteServer()
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run("serve:app", port=5000)
@@ -0,0 +1,95 @@
+# station_index.py
+
+import heapq
+import threading
+from collections import Counter, OrderedDict
+from itertools import chain
+from typing import Dict, Iterable, List, Set, Tuple
+from fuzzywuzzy import fuzz
+
+def _normalize(name: str) -> str:
+    return " ".join(name.lower().split())
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class StationIndex:
+    """Station name index for fuzzy correction and autocomplete.
+
+    Trigram postings narrow a query down to a few candidates before they are
+    scored with fuzzywuzzy's WRatio, the scorer process.extractOne uses, and
+    a prefix trie serves autocomplete. Recent lookups are memoized.
+    """
+
+    def __init__(self, stations: Iterable[str], max_candidates: int = 8, memo_size: int = 1024):
+        self._names: Set[str] = set(stations)
+        self.stations: List[str] = sorted(self._names)
+        self.max_candidates = max_candidates
+        self.memo_size = memo_size
+        self._memo: "OrderedDict[Tuple[str, int], List[Tuple[str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._postings: Dict[str, List[int]] = {}
+        self._trigram_counts: List[int] = []
+        self._trie: Dict = {}
+        for station_id, station in enumerate(self.stations):
+            normalized = _normalize(station)
+            trigrams = _trigrams(normalized)
+            self._trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                self._postings.setdefault(trigram, []).append(station_id)
+            node = self._trie
+            for char in normalized:
+                node = node.setdefault(char, {})
+                node.setdefault("$", []).append(station_id)
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def __contains__(self, station: str) -> bool:
+        return station in self._names
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """Stations whose name starts with prefix, alphabetically"""
+        node = self._trie
+        for char in _normalize(prefix):
+            node = node.get(char)
+            if node is None:
+                return []
+        return [self.stations[station_id] for station_id in node.get("$", [])[:limit]]
+
+    def _candidates(self, normalized: str) -> List[int]:
+        trigrams = _trigrams(normalized)
+        shared = Counter(chain.from_iterable(self._postings.get(trigram, ()) for trigram in trigrams))
+        # Rank by Dice similarity of trigram sets so long names are not favoured
+        size = len(trigrams)
+        counts = self._trigram_counts
+        return heapq.nlargest(self.max_candidates, shared, key=lambda station_id: shared[station_id] / (size + counts[station_id]))
+
+    def suggest(self, query: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Top stations for a query as (name, score) pairs, best first"""
+        normalized = _normalize(query)
+        key = (normalized, limit)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+
+        scored = [(self.stations[station_id], fuzz.WRatio(query, self.stations[station_id]))
+                  for station_id in self._candidates(normalized)]
+        scored.sort(key=lambda match: -match[1])
+        suggestions = scored[:limit]
+
+        with self._lock:
+            self._memo[key] = suggestions
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return suggestions
+
+    def correct(self, name: str, threshold: int = 80) -> str:
+        """Best matching station name, or name itself when nothing scores above threshold"""
+        suggestions = self.suggest(name, limit=1)
+        if suggestions and suggestions[0][1] > threshold:
+            return suggestions[0][0]
+        return name
@@ -0,0 +1,310 @@
+# storage.py
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from timetable import ALL_DAYS, DAY_NAMES, days_mask
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trains (
+    train_id TEXT PRIMARY KEY,
+    train_name TEXT NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    arrival_time TEXT NOT NULL,
+    days INTEGER NOT NULL,
+    seats_available INTEGER NOT NULL DEFAULT 0,
+    popularity REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS trains_source ON trains (source, destination);
+CREATE INDEX IF NOT EXISTS trains_destination ON trains (destination);
+CREATE TABLE IF NOT EXISTS nearby_stations (
+    station TEXT NOT NULL,
+    nearby TEXT NOT NULL,
+    PRIMARY KEY (station, nearby)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('timetable_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('seat_version', 0);
+CREATE TABLE IF NOT EXISTS holds (
+    hold_id TEXT PRIMARY KEY,
+    seats INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS holds_expiry ON holds (expires_at);
+CREATE TABLE IF NOT EXISTS hold_legs (
+    hold_id TEXT NOT NULL,
+    train_id TEXT NOT NULL,
+    PRIMARY KEY (hold_id, train_id)
+);
+"""
+
+# Statements are module constants so every pooled connection reuses its prepared copy
+TRAIN_COLUMNS = "train_id, train_name, source, destination, departure_time, arrival_time, days, seats_available, popularity"
+SELECT_BETWEEN = f"SELECT {TRAIN_COLUMNS} FROM trains WHERE source = ? AND destination = ? AND days & ? ORDER BY rowid"
+SELECT_FROM = f"SELECT {TRAIN_COLUMNS} FROM trains WHERE source = ? AND days & ? ORDER BY rowid"
+SELECT_ALL = f"SELECT {TRAIN_COLUMNS} FROM trains ORDER BY rowid"
+SELECT_TRAIN = f"SELECT {TRAIN_COLUMNS} FROM trains WHERE train_id = ?"
+SELECT_SEATS = "SELECT seats_available FROM trains WHERE train_id = ?"
+UPSERT_TRAIN = f"""
+INSERT INTO trains ({TRAIN_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (train_id) DO UPDATE SET
+    train_name = excluded.train_name, source = excluded.source, destination = excluded.destination,
+    departure_time = excluded.departure_time, arrival_time = excluded.arrival_time, days = excluded.days,
+    seats_available = excluded.seats_available, popularity = excluded.popularity
+"""
+DELETE_TRAIN = "DELETE FROM trains WHERE train_id = ?"
+UPDATE_SEATS = "UPDATE trains SET seats_available = ? WHERE train_id = ?"
+# Seats are taken only while enough remain, so concurrent holds from any process never oversell
+TAKE_SEATS = "UPDATE trains SET seats_available = seats_available - ? WHERE train_id = ? AND seats_available >= ?"
+RETURN_SEATS = "UPDATE trains SET seats_available = seats_available + ? WHERE train_id = ?"
+INSERT_HOLD = "INSERT INTO holds (hold_id, seats, expires_at) VALUES (?, ?, ?)"
+INSERT_HOLD_LEG = "INSERT INTO hold_legs (hold_id, train_id) VALUES (?, ?)"
+SELECT_HOLD = "SELECT seats, expires_at FROM holds WHERE hold_id = ?"
+SELECT_HOLD_LEGS = "SELECT train_id FROM hold_legs WHERE hold_id = ? ORDER BY rowid"
+SELECT_EXPIRED_HOLDS = "SELECT hold_id FROM holds WHERE expires_at <= ?"
+COUNT_HOLDS = "SELECT COUNT(*) FROM holds WHERE expires_at > ?"
+DELETE_HOLD = "DELETE FROM holds WHERE hold_id = ?"
+DELETE_HOLD_LEGS = "DELETE FROM hold_legs WHERE hold_id = ?"
+SELECT_NEARBY = "SELECT nearby FROM nearby_stations WHERE station = ? ORDER BY rowid"
+INSERT_NEARBY = "INSERT OR IGNORE INTO nearby_stations (station, nearby) VALUES (?, ?)"
+SELECT_VERSION = "SELECT value FROM meta WHERE key = 'timetable_version'"
+BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'timetable_version'"
+SELECT_SEAT_VERSION = "SELECT value FROM meta WHERE key = 'seat_version'"
+BUMP_SEAT_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'seat_version'"
+
+def _days_list(mask: int) -> List[str]:
+    if mask == ALL_DAYS:
+        return ["Daily"]
+    return [day for bit, day in enumerate(DAY_NAMES) if mask >> bit & 1]
+
+def _train(row) -> Dict:
+    return {
+        "train_id": row[0],
+        "train_name": row[1],
+        "source": row[2],
+        "destination": row[3],
+        "departure_time": row[4],
+        "arrival_time": row[5],
+        "days_available": _days_list(row[6]),
+        "seats_available": row[7],
+        "popularity": row[8]
+    }
+
+def _row(train: Dict) -> tuple:
+    return (
+        train["train_id"], train.get("train_name", ""), train["source"], train["destination"],
+        train["departure_time"], train["arrival_time"], days_mask(train["days_available"]),
+        train.get("seats_available", 0), train.get("popularity", 0.0)
+    )
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared between threads"""
+
+    def __init__(self, path: str, size: int = 5, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+        for _ in range(size):
+            connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False, cached_statements=64)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self._connections.append(connection)
+            self._idle.put(connection)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; the block runs in one transaction that commits on success"""
+        try:
+            connection = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        try:
+            with connection:
+                yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+
+class TrainStore:
+    """SQLite-backed train timetable, seat counts and nearby stations"""
+
+    def __init__(self, path: str, pool_size: int = 5):
+        # Create the schema before the pool so every connection sees it
+        with sqlite3.connect(path) as connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+        self.pool = ConnectionPool(path, pool_size)
+        self._write_lock = threading.Lock()
+
+    def close(self):
+        self.pool.close()
+
+    def version(self) -> int:
+        """Counter bumped on every timetable change, shared by every process using the database"""
+        with self.pool.connection() as connection:
+            return connection.execute(SELECT_VERSION).fetchone()[0]
+
+    def seat_version(self) -> int:
+        """Counter bumped whenever any train's seat count changes"""
+        with self.pool.connection() as connection:
+            return connection.execute(SELECT_SEAT_VERSION).fetchone()[0]
+
+    def is_empty(self) -> bool:
+        with self.pool.connection() as connection:
+            return connection.execute("SELECT 1 FROM trains LIMIT 1").fetchone() is None
+
+    def get_trains(self, source: str, destination: Optional[str] = None, weekday: Optional[int] = None) -> List[Dict]:
+        """Trains from source, optionally to destination and running on a weekday"""
+        days = ALL_DAYS if weekday is None else 1 << weekday
+        with self.pool.connection() as connection:
+            if destination:
+                rows = connection.execute(SELECT_BETWEEN, (source, destination, days))
+            else:
+                rows = connection.execute(SELECT_FROM, (source, days))
+            return [_train(row) for row in rows]
+
+    def get_train(self, train_id: str) -> Optional[Dict]:
+        with self.pool.connection() as connection:
+            row = connection.execute(SELECT_TRAIN, (train_id,)).fetchone()
+        return _train(row) if row else None
+
+    def all_trains(self) -> List[Dict]:
+        with self.pool.connection() as connection:
+            return [_train(row) for row in connection.execute(SELECT_ALL)]
+
+    def upsert_trains(self, trains: Iterable[Dict]) -> int:
+        """Insert or update a feed of trains in one transaction and return the new version"""
+        with self._write_lock, self.pool.connection() as connection:
+            connection.executemany(UPSERT_TRAIN, (_row(train) for train in trains))
+            connection.execute(BUMP_VERSION)
+            return connection.execute(SELECT_VERSION).fetchone()[0]
+
+    def replace_trains(self, trains: Iterable[Dict]) -> int:
+        """Replace the whole timetable in one transaction and return the new version"""
+        with self._write_lock, self.pool.connection() as connection:
+            connection.execute("DELETE FROM trains")
+            connection.executemany(UPSERT_TRAIN, (_row(train) for train in trains))
+            connection.execute(BUMP_VERSION)
+            return connection.execute(SELECT_VERSION).fetchone()[0]
+
+    def delete_train(self, train_id: str) -> Optional[int]:
+        """Delete a train and return the new version, or None if it did not exist"""
+        with self._write_lock, self.pool.connection() as connection:
+            if connection.execute(DELETE_TRAIN, (train_id,)).rowcount == 0:
+                return None
+            connection.execute(BUMP_VERSION)
+            return connection.execute(SELECT_VERSION).fetchone()[0]
+
+    def update_seats(self, train_id: str, seats_available: int) -> bool:
+        """Set a train's seat count; seat changes do not bump the timetable version"""
+        with self.pool.connection() as connection:
+            if connection.execute(UPDATE_SEATS, (seats_available, train_id)).rowcount == 0:
+                return False
+            connection.execute(BUMP_SEAT_VERSION)
+            return True
+
+    def seat_availability(self, train_ids: Iterable[str]) -> Dict[str, int]:
+        seats = {}
+        with self.pool.connection() as connection:
+            for train_id in train_ids:
+                row = connection.execute(SELECT_SEATS, (train_id,)).fetchone()
+                if row is not None:
+                    seats[train_id] = row[0]
+        return seats
+
+    def hold_seats(self, hold_id: str, train_ids: List[str], seats: int, expires_at: float) -> Optional[Tuple[str, Optional[int]]]:
+        """Take seats on every train and record the hold, all in one transaction.
+
+        Returns None once held. Otherwise nothing is changed and the result is
+        (train_id, seats available) for the first train short of seats, with
+        None as the count for an unknown train.
+        """
+        with self.pool.connection() as connection:
+            for train_id in train_ids:
+                if connection.execute(TAKE_SEATS, (seats, train_id, seats)).rowcount == 0:
+                    row = connection.execute(SELECT_SEATS, (train_id,)).fetchone()
+                    connection.rollback()
+                    return train_id, row[0] if row else None
+            connection.execute(INSERT_HOLD, (hold_id, seats, expires_at))
+            connection.executemany(INSERT_HOLD_LEG, ((hold_id, train_id) for train_id in train_ids))
+            connection.execute(BUMP_SEAT_VERSION)
+        return None
+
+    @staticmethod
+    def _take_hold(connection: sqlite3.Connection, hold_id: str) -> Optional[Dict]:
+        """Delete a hold in the caller's transaction and return it, or None if it is gone"""
+        row = connection.execute(SELECT_HOLD, (hold_id,)).fetchone()
+        if row is None:
+            return None
+        train_ids = [leg[0] for leg in connection.execute(SELECT_HOLD_LEGS, (hold_id,))]
+        # The delete decides which of several processes ending the same hold gets it
+        if connection.execute(DELETE_HOLD, (hold_id,)).rowcount == 0:
+            return None
+        connection.execute(DELETE_HOLD_LEGS, (hold_id,))
+        return {"hold_id": hold_id, "train_ids": train_ids, "seats": row[0], "expires_at": row[1]}
+
+    @staticmethod
+    def _return_seats(connection: sqlite3.Connection, hold: Dict):
+        connection.executemany(RETURN_SEATS, ((hold["seats"], train_id) for train_id in hold["train_ids"]))
+        connection.execute(BUMP_SEAT_VERSION)
+
+    def confirm_hold(self, hold_id: str, now: float) -> Optional[Dict]:
+        """Turn a live hold into a booking and return it; an expired hold gives its seats back instead"""
+        with self.pool.connection() as connection:
+            hold = self._take_hold(connection, hold_id)
+            if hold is not None and hold["expires_at"] <= now:
+                self._return_seats(connection, hold)
+                return None
+            return hold
+
+    def release_hold(self, hold_id: str) -> Optional[Dict]:
+        """Delete a hold, give its seats back and return it"""
+        with self.pool.connection() as connection:
+            hold = self._take_hold(connection, hold_id)
+            if hold is not None:
+                self._return_seats(connection, hold)
+            return hold
+
+    def expire_holds(self, now: float) -> int:
+        """Release every hold past its expiry and return how many were released"""
+        released = 0
+        with self.pool.connection() as connection:
+            for (hold_id,) in connection.execute(SELECT_EXPIRED_HOLDS, (now,)).fetchall():
+                hold = self._take_hold(connection, hold_id)
+                if hold is not None:
+                    self._return_seats(connection, hold)
+                    released += 1
+        return released
+
+    def get_hold(self, hold_id: str, now: float) -> Optional[Dict]:
+        with self.pool.connection() as connection:
+            row = connection.execute(SELECT_HOLD, (hold_id,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            train_ids = [leg[0] for leg in connection.execute(SELECT_HOLD_LEGS, (hold_id,))]
+        return {"hold_id": hold_id, "train_ids": train_ids, "seats": row[0], "expires_at": row[1]}
+
+    def count_holds(self, now: float) -> int:
+        with self.pool.connection() as connection:
+            return connection.execute(COUNT_HOLDS, (now,)).fetchone()[0]
+
+    def nearby_stations(self, station: str) -> List[str]:
+        with self.pool.connection() as connection:
+            return [row[0] for row in connection.execute(SELECT_NEARBY, (station,))]
+
+    def add_nearby_stations(self, nearby: Dict[str, List[str]]):
+        with self.pool.connection() as connection:
+            connection.executemany(INSERT_NEARBY, (
+                (station, other) for station, others in nearby.items() for other in others
+            ))
@@ -0,0 +1,71 @@
+# synthetic_timetable.py
+
+import random
+from typing import Dict, List, Tuple
+from timetable import DAY_NAMES
+
+TOPOLOGIES = ("hub", "grid")
+
+def _format_time(minutes: int) -> str:
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+def _hub_links(pairs: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """Hub-and-spoke network: hubs are linked to each other and serve their own spokes"""
+    hubs = max(2, int(pairs ** 0.5 / 2))
+    spokes_per_hub = max(1, (pairs - hubs * (hubs - 1)) // (2 * hubs))
+    links = []
+    for hub in range(hubs):
+        for other in range(hubs):
+            if hub != other:
+                links.append((f"Hub{hub}", f"Hub{other}"))
+        for spoke in range(spokes_per_hub):
+            links.append((f"Hub{hub}", f"Spoke{hub}_{spoke}"))
+            links.append((f"Spoke{hub}_{spoke}", f"Hub{hub}"))
+    rng.shuffle(links)
+    return links
+
+def _grid_links(pairs: int, rng: random.Random) -> List[Tuple[str, str]]:
+    """Square grid network with trains in both directions between neighbours"""
+    side = max(2, int((pairs / 4) ** 0.5))
+    links = []
+    for row in range(side):
+        for column in range(side):
+            station = f"Grid{row}_{column}"
+            if column + 1 < side:
+                links.append((station, f"Grid{row}_{column + 1}"))
+                links.append((f"Grid{row}_{column + 1}", station))
+            if row + 1 < side:
+                links.append((station, f"Grid{row + 1}_{column}"))
+                links.append((f"Grid{row + 1}_{column}", station))
+    rng.shuffle(links)
+    return links
+
+def generate_timetable(topology: str = "hub", trains: int = 1000, departures_per_day: int = 4, seed: int = 0) -> List[Dict]:
+    """Generate a reproducible timetable of roughly `trains` services in dummyDB's format"""
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {topology}")
+    rng = random.Random(seed)
+    pairs = max(1, trains // departures_per_day)
+    links = (_hub_links if topology == "hub" else _grid_links)(pairs, rng)
+
+    timetable = []
+    for number in range(trains):
+        source, destination = links[number // departures_per_day % len(links)]
+        # Spread departures of the same link over the day
+        slot = number % departures_per_day
+        departure = slot * (24 * 60 // departures_per_day) + rng.randrange(0, 60)
+        duration = rng.randrange(60, 14 * 60, 5)
+        days = ["Daily"] if rng.random() < 0.7 else sorted(rng.sample(DAY_NAMES, rng.randint(2, 5)), key=DAY_NAMES.index)
+        timetable.append({
+            "train_id": f"SYN-{number:06d}",
+            "train_name": f"{source} {destination} Express {slot + 1}",
+            "source": source,
+            "destination": destination,
+            "departure_time": _format_time(departure),
+            "arrival_time": _format_time(departure + duration),
+            "days_available": days,
+            "seats_available": rng.randrange(0, 120),
+            "popularity": round(rng.random(), 2)
+        })
+    return timetable
@@ -0,0 +1,81 @@
+# test_api.py
+#
+# Flask endpoints of main.py against the built-in timetable. Run with:
+# python -m pytest -q test_api.py
+
+import json
+import pytest
+import main
+
+@pytest.fixture
+def client():
+    return main.app.test_client()
+
+def test_all_trains_tag_follows_the_data_version(client, monkeypatch):
+    first = client.get("/all_trains")
+    assert first.status_code == 200
+    tag = first.headers["ETag"]
+
+    # An unchanged timetable is answered without fetching or encoding the trains
+    def fail():
+        raise AssertionError("trains fetched for a 304")
+    monkeypatch.setattr(main, "get_all_trains", fail)
+    assert client.get("/all_trains", headers={"If-None-Match": tag}).status_code == 304
+    monkeypatch.undo()
+
+    train_id = first.get_json()[0]["train_id"]
+    hold = main.seat_inventory.hold([train_id])
+    try:
+        changed = client.get("/all_trains", headers={"If-None-Match": tag})
+        assert changed.status_code == 200
+        assert changed.headers["ETag"] != tag
+    finally:
+        main.seat_inventory.release(hold.hold_id)
+
+def test_max_transfers_is_capped(client):
+    query = {"source": "Mumbai", "destination": "Delhi", "alternative_routes": "true"}
+    assert client.get("/trains", query_string={**query, "max_transfers": main.MAX_TRANSFERS}).status_code == 200
+    for value in (main.MAX_TRANSFERS + 1, -1):
+        response = client.get("/trains", query_string={**query, "max_transfers": value})
+        assert response.status_code == 400
+        assert "max_transfers" in response.get_json()["error"]
+
+def test_matrix_flags_lower_bound_times(client):
+    response = client.get("/matrix", query_string={"sources": "Mumbai", "targets": "Delhi,Chennai"})
+    assert response.status_code == 200
+    assert response.headers["X-Travel-Times"] == main.MATRIX_TIMES
+    assert response.get_data(as_text=True).splitlines()[0] == "source,Delhi,Chennai"
+
+def test_batch_streams_one_line_per_query(client):
+    queries = [{"source": "Mumbai", "destination": "Delhi"}, {"source": "Delhi", "destination": "Mumbai", "max_transfers": 1},
+               {"source": "Mumbai", "destination": "Chennai"}]
+    response = client.post("/trains/batch", json={"queries": queries, "defaults": {"alternative_routes": "true"}})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = sorted((json.loads(line) for line in response.get_data(as_text=True).splitlines()), key=lambda line: line["index"])
+    assert [line["index"] for line in lines] == [0, 1, 2]
+
+    # Each line carries the same result as the single query
+    for query, line in zip(queries, lines):
+        assert (line.pop("source"), line.pop("destination")) == (query["source"], query["destination"])
+        del line["index"]
+        single = client.get("/trains", query_string={"alternative_routes": "true", **query}).get_json()
+        assert line == single
+
+@pytest.mark.parametrize("payload, message", [
+    ({}, "non-empty \"queries\""),
+    ({"queries": []}, "non-empty \"queries\""),
+    ({"queries": [{"source": "Mumbai", "destination": "Delhi"}], "defaults": []}, "\"defaults\""),
+    ({"queries": [{"source": "Mumbai", "destination": "Delhi"}, {"source": "Mumbai"}]}, "Query 1 needs"),
+    ({"queries": [{"source": "Mumbai", "destination": "Delhi", "max_transfers": 99}]}, "Query 0: "),
+])
+def test_batch_rejects_bad_payloads(client, payload, message):
+    response = client.post("/trains/batch", json=payload)
+    assert response.status_code == 400
+    assert message in response.get_json()["error"]
+
+def test_batch_size_is_capped(client):
+    queries = [{"source": "Mumbai", "destination": "Delhi"}] * (main.MAX_BATCH_SIZE + 1)
+    response = client.post("/trains/batch", json={"queries": queries})
+    assert response.status_code == 400
+    assert str(main.MAX_BATCH_SIZE) in response.get_json()["error"]
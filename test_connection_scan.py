@@ -0,0 +1,58 @@
+# test_connection_scan.py
+#
+# Connection Scan Algorithm: in-place scanner patching on timetable changes,
+# overnight journeys and the (arrival, transfers) front. Run with:
+# python -m pytest -q test_connection_scan.py
+
+from datetime import date
+from connection_scan import find_routes_csa, get_scanner
+from timetable import TimetableIndex
+
+def _train(train_id: str, source: str, destination: str, departs: str, arrives: str, days=("Daily",)) -> dict:
+    return {"train_id": train_id, "train_name": train_id, "source": source, "destination": destination,
+            "departure_time": departs, "arrival_time": arrives, "days_available": list(days),
+            "seats_available": 10, "popularity": 0.5}
+
+def _trains(routes):
+    return sorted(tuple(leg["train_id"] for leg in route.legs) for route in routes)
+
+def test_same_station_has_no_routes():
+    timetable = TimetableIndex([_train("AB", "A", "B", "08:00", "09:00")])
+    assert find_routes_csa(timetable, "A", "A") == []
+
+def test_scanner_is_patched_not_rebuilt():
+    timetable = TimetableIndex([_train("AB", "A", "B", "08:00", "09:00")])
+    scanner = get_scanner(timetable)
+    assert find_routes_csa(timetable, "A", "C", max_transfers=1) == []
+
+    timetable.add_train(_train("BC", "B", "C", "10:00", "11:00"))
+    assert get_scanner(timetable) is scanner
+    assert scanner.version == timetable.version
+    assert _trains(find_routes_csa(timetable, "A", "C", max_transfers=1)) == [("AB", "BC")]
+
+    timetable.remove_train("BC")
+    assert get_scanner(timetable) is scanner
+    assert find_routes_csa(timetable, "A", "C", max_transfers=1) == []
+
+    # A reload replaces every train, so the scanner is rebuilt
+    timetable.load([_train("AC", "A", "C", "08:00", "12:00")])
+    assert get_scanner(timetable) is not scanner
+    assert _trains(find_routes_csa(timetable, "A", "C")) == [("AC",)]
+
+def test_overnight_journey():
+    timetable = TimetableIndex([_train("AB", "A", "B", "23:00", "01:00"),
+                                _train("BC", "B", "C", "02:00", "03:00", days=("Sat",))])
+    friday = date(2024, 5, 3)
+    [route] = find_routes_csa(timetable, "A", "C", max_transfers=1, travel_date=friday)
+    assert (route.transfers, route.total_duration, route.total_wait_time) == (1, 240, 60)
+    # The connection runs on Saturday only, so a Thursday start misses it
+    assert find_routes_csa(timetable, "A", "C", max_transfers=1, travel_date=date(2024, 5, 2)) == []
+    assert find_routes_csa(timetable, "A", "C", max_transfers=1, travel_date=friday, include_overnight=False) == []
+
+def test_front_keeps_a_faster_journey_with_more_transfers():
+    timetable = TimetableIndex([_train("AC", "A", "C", "08:00", "14:00"),
+                                _train("AB", "A", "B", "08:00", "09:00"),
+                                _train("BC", "B", "C", "09:30", "11:00"),
+                                _train("AC2", "A", "C", "08:30", "15:00")])
+    assert _trains(find_routes_csa(timetable, "A", "C", max_transfers=1)) == [("AB", "BC"), ("AC",)]
+    assert _trains(find_routes_csa(timetable, "A", "C", max_transfers=0)) == [("AC",)]
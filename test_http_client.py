@@ -0,0 +1,109 @@
+# test_http_client.py
+#
+# ApiClient and ResponseMemo against a stand-in session: memo expiry and
+# eviction, request coalescing and retry settings. Run with:
+# python -m pytest -q test_http_client.py
+
+import threading
+import time
+import pytest
+import requests
+import http_client
+from http_client import ApiClient, ResponseMemo
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        if isinstance(self.data, Exception):
+            raise self.data
+
+    def json(self):
+        return self.data
+
+class Session:
+    """Answers every GET with the next queued value, optionally waiting for a release first"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append((url, params))
+        self.release.wait()
+        return Response(self.answers.pop(0))
+
+@pytest.fixture
+def client():
+    return ApiClient("http://api.test/")
+
+def test_memo_expires_and_evicts_the_oldest(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    memo = ResponseMemo(ttl_seconds=30, max_entries=2)
+    memo.put(("a",), 1)
+    now[0] += 1
+    memo.put(("b",), 2)
+    memo.put(("c",), 3)
+    assert (memo.get(("a",)), memo.get(("b",)), memo.get(("c",))) == (None, 2, 3)
+    now[0] += 31
+    assert memo.get(("c",)) is None
+
+def test_request_key_ignores_parameter_order():
+    assert ApiClient.request_key("/trains", {"a": 1, "b": 2}) == ApiClient.request_key("/trains", {"b": 2, "a": 1})
+    assert ApiClient.request_key("/trains") == ("/trains", ())
+
+def test_memo_answers_repeat_requests(client):
+    client.session = Session({"trains": []})
+    memo = ResponseMemo()
+    assert client.get_json("/trains", {"source": "A"}, memo=memo) == {"trains": []}
+    assert client.get_json("/trains", {"source": "A"}, memo=memo) == {"trains": []}
+    assert client.session.calls == [("http://api.test/trains", {"source": "A"})]
+
+def test_identical_requests_in_flight_share_one_call(client, monkeypatch):
+    waiting = threading.Semaphore(0)
+
+    class CountingFuture(http_client.Future):
+        def result(self, timeout=None):
+            waiting.release()
+            return super().result(timeout)
+
+    monkeypatch.setattr(http_client, "Future", CountingFuture)
+    client.session = session = Session({"ok": True})
+    session.release.clear()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(client.get_json("/trains", {"source": "A"})))
+               for _ in range(4)]
+    threads[0].start()
+    while not session.calls:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    # Every follower is waiting on the leader's future before the answer arrives
+    for _ in threads[1:]:
+        assert waiting.acquire(timeout=5)
+    session.release.set()
+    for thread in threads:
+        thread.join()
+    assert results == [{"ok": True}] * 4
+    assert len(session.calls) == 1
+    assert client._in_flight == {}
+
+def test_errors_are_raised_and_not_kept(client):
+    client.session = Session(requests.HTTPError("503"), {"ok": True})
+    memo = ResponseMemo()
+    with pytest.raises(requests.HTTPError):
+        client.get_json("/trains", memo=memo)
+    assert client._in_flight == {}
+    assert memo.get(ApiClient.request_key("/trains")) is None
+    assert client.get_json("/trains", memo=memo) == {"ok": True}
+
+def test_only_gets_are_retried():
+    client = ApiClient("http://api.test", retries=5)
+    retry = client.session.get_adapter("http://api.test").max_retries
+    assert retry.total == 5
+    assert set(retry.status_forcelist) == {502, 503, 504}
+    assert list(retry.allowed_methods) == ["GET"]
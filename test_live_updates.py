@@ -0,0 +1,96 @@
+# test_live_updates.py
+#
+# Live timetable changes: parsing and applying update batches, and route
+# cache invalidation. Run with:
+# python -m pytest -q test_live_updates.py
+
+import pytest
+from dummyDB import get_timetable, remove_train
+from live_updates import MAX_EVENTS, apply_events, parse_events, route_invalidator
+from route_cache import RouteCache
+from timetable import TimetableIndex
+
+def _train(train_id: str, source: str, destination: str) -> dict:
+    return {"train_id": train_id, "train_name": train_id, "source": source, "destination": destination,
+            "departure_time": "08:00", "arrival_time": "09:00", "days_available": ["Daily"],
+            "seats_available": 10, "popularity": 0.5}
+
+def _setup():
+    timetable = TimetableIndex([_train("AB", "A", "B"), _train("BC", "B", "C"), _train("XY", "X", "Y")])
+    cache = RouteCache()
+    calls = []
+    invalidator = route_invalidator(timetable, cache, lambda station: calls.append(station) or [])
+    timetable.subscribe(invalidator)
+    return timetable, cache, invalidator, calls
+
+def test_only_affected_searches_are_dropped():
+    timetable, cache, _, _ = _setup()
+    affected = RouteCache.make_key("A", "C", max_transfers=1)
+    direct_only = RouteCache.make_key("A", "C", max_transfers=0)
+    elsewhere = RouteCache.make_key("X", "Y", max_transfers=2)
+    for key in (affected, direct_only, elsewhere):
+        cache.put(key, [])
+    timetable.add_train(_train("AB2", "A", "B"))
+    assert cache.get(affected) is None
+    assert cache.get(direct_only) == []
+    assert cache.get(elsewhere) == []
+
+def test_reload_drops_everything():
+    timetable, cache, _, _ = _setup()
+    cache.put(RouteCache.make_key("X", "Y", max_transfers=2), [])
+    timetable.load(list(timetable))
+    assert cache.keys() == []
+
+def test_batch_looks_up_nearby_stations_once():
+    timetable, cache, invalidator, calls = _setup()
+    for source, destination in (("X", "Y"), ("Y", "X"), ("C", "A")):
+        cache.put(RouteCache.make_key(source, destination, max_transfers=2), [])
+    with invalidator.batch():
+        for number in range(3):
+            timetable.add_train(_train(f"AB{number}", "A", "B"))
+    assert sorted(calls) == ["A", "C", "X", "Y"]
+    assert len(cache.keys()) == 3
+
+    calls.clear()
+    for number in range(3):
+        timetable.remove_train(f"AB{number}")
+    # Outside a batch each change looks up the four stations again
+    assert len(calls) == 3 * 4
+
+@pytest.mark.parametrize("payload, message", [
+    ([], "non-empty"),
+    ({"events": []}, "non-empty"),
+    ({"events": [{"type": "move"}]}, "type must be one of"),
+    ({"events": [{"type": "delay", "train_id": "NOPE", "minutes": 5}]}, "unknown train"),
+    ({"events": [{"type": "add", "train": {"train_id": "LIVE1"}}]}, "train needs"),
+    ({"events": [{"type": "add", "train": {**_train("LIVE1", "A", "B"), "arrival_time": "25:00"}}]}, "arrival_time"),
+    ({"events": [{"type": "add", "train": {**_train("LIVE1", "A", "B"), "days_available": ["Monday"]}}]},
+     "days_available"),
+    ({"events": [{"type": "add", "train": _train("LIVE1", "A", "B")},
+                 {"type": "delay", "train_id": "LIVE1", "minutes": True}]}, "Event 1: minutes"),
+    ({"events": [{"type": "add", "train": _train("LIVE1", "A", "B")}, {"type": "cancel", "train_id": "LIVE1"},
+                 {"type": "cancel", "train_id": "LIVE1"}]}, "Event 2: unknown train"),
+])
+def test_parse_events_rejects_bad_batches(payload, message):
+    with pytest.raises(ValueError, match=message):
+        parse_events(payload)
+
+def test_parse_events_limits_the_batch_size():
+    events = [{"type": "cancel", "train_id": "NOPE"}] * (MAX_EVENTS + 1)
+    with pytest.raises(ValueError, match=str(MAX_EVENTS)):
+        parse_events({"events": events})
+
+def test_apply_events_runs_in_order_and_counts():
+    train = {**_train("LIVE1", "A", "B"), "departure_time": "23:30", "arrival_time": "23:50", "days_available": ["Fri"]}
+    events = parse_events({"events": [{"type": "add", "train": train},
+                                      {"type": "delay", "train_id": "LIVE1", "minutes": 60}]})
+    try:
+        assert apply_events(events) == {"delay": 1, "cancel": 0, "add": 1}
+        delayed = get_timetable().get("LIVE1")
+        # Crossing midnight moves the running day along
+        assert (delayed["departure_time"], delayed["arrival_time"]) == ("00:30", "00:50")
+        assert delayed["days_available"] == ["Sat"]
+        assert apply_events(parse_events({"events": [{"type": "cancel", "train_id": "LIVE1"}]}))["cancel"] == 1
+        assert get_timetable().get("LIVE1") is None
+    finally:
+        remove_train("LIVE1")
@@ -0,0 +1,68 @@
+# test_pareto_search.py
+#
+# Pareto search against find_alternative_routes on seeded timetables, and
+# the label count with a wait limit. Run with: python -m pytest -q test_pareto_search.py
+
+import random
+from datetime import date
+import pytest
+import metrics
+from synthetic_timetable import generate_timetable
+from timetable import TimetableIndex
+from route_finder import find_alternative_routes
+from pareto_search import PRIORITIES, find_pareto_routes
+
+SEED = 7
+QUERIES = 12
+
+def _train(train_id: str, source: str, destination: str, departs: str, arrives: str) -> dict:
+    return {"train_id": train_id, "train_name": train_id, "source": source, "destination": destination,
+            "departure_time": departs, "arrival_time": arrives, "days_available": ["Daily"],
+            "seats_available": 10, "popularity": 0.5, "fare": 10.0}
+
+def _expanded() -> float:
+    return metrics.SEARCH_NODES_EXPANDED.drain().get((("engine", "pareto"),), 0)
+
+@pytest.fixture(scope="module", params=["grid", "hub"])
+def timetable(request):
+    return TimetableIndex(generate_timetable(request.param, 300, seed=SEED))
+
+@pytest.mark.parametrize("max_transfers", [1, 2, 3])
+@pytest.mark.parametrize("constraints", [
+    {},
+    {"max_wait_time": 120},
+    {"max_wait_time": 240, "travel_date": date(2024, 5, 1), "include_overnight": False}
+])
+def test_pareto_keeps_the_best_route_for_each_priority(timetable, max_transfers, constraints):
+    stations = sorted(timetable.stations())
+    rng = random.Random(SEED)
+    for source, destination in (tuple(rng.sample(stations, 2)) for _ in range(QUERIES)):
+        expected = find_alternative_routes(timetable, source, destination, max_transfers, **constraints)
+        found = find_pareto_routes(timetable, source, destination, max_transfers, **constraints)
+        legs = {tuple(leg["train_id"] for leg in route.legs) for route in expected}
+        assert {tuple(leg["train_id"] for leg in route.legs) for route in found} <= legs, (source, destination)
+        assert bool(found) == bool(expected), (source, destination)
+        for priority, key in PRIORITIES.items():
+            if expected:
+                assert min(map(key, found)) == min(map(key, expected)), (priority, source, destination)
+
+def test_wait_limited_labels_stay_bounded():
+    # Many trains reach the hub at different times, all in time for the one
+    # onward train; only the earliest arrival needs to be expanded
+    trains = [_train(f"IN{minute:02d}", "A", "Hub", "08:00", f"08:{minute:02d}") for minute in range(10, 60)]
+    trains.append(_train("OUT", "Hub", "B", "09:30", "10:00"))
+    _expanded()
+    routes = find_pareto_routes(TimetableIndex(trains), "A", "B", max_transfers=1, max_wait_time=120)
+    assert [[leg["train_id"] for leg in route.legs] for route in routes] == [["IN10", "OUT"]]
+    # The source, plus a single label at the hub
+    assert _expanded() == 2
+
+def test_earlier_arrival_does_not_hide_a_later_connection():
+    # The early arrival waits too long for the onward train, so the later one must survive
+    trains = [
+        _train("EARLY", "A", "Hub", "08:00", "08:10"),
+        _train("LATE", "A", "Hub", "08:00", "10:00"),
+        _train("OUT", "Hub", "B", "10:30", "11:00"),
+    ]
+    routes = find_pareto_routes(TimetableIndex(trains), "A", "B", max_transfers=1, max_wait_time=60)
+    assert [[leg["train_id"] for leg in route.legs] for route in routes] == [["LATE", "OUT"]]
@@ -0,0 +1,56 @@
+# test_ranked_search.py
+#
+# Best-first ranked routes and their pagination. Run with:
+# python -m pytest -q test_ranked_search.py
+
+import random
+import pytest
+import main
+from synthetic_timetable import generate_timetable
+from timetable import TimetableIndex
+from route_finder import find_alternative_routes
+from route_cache import RouteCache
+from ranked_search import find_top_k_routes
+
+SEED = 7
+
+@pytest.fixture(scope="module")
+def timetable():
+    return TimetableIndex(generate_timetable("hub", 300, seed=SEED))
+
+def _queries(timetable, count=8):
+    stations = sorted(timetable.stations())
+    rng = random.Random(SEED)
+    return [tuple(rng.sample(stations, 2)) for _ in range(count)]
+
+def test_exhausted_is_exact(timetable):
+    for source, destination in _queries(timetable):
+        total = len(find_alternative_routes(timetable, source, destination, 2))
+        routes, exhausted = find_top_k_routes(timetable, source, destination, k=total, max_transfers=2)
+        assert len(routes) == total and exhausted, (source, destination)
+        if total > 1:
+            routes, exhausted = find_top_k_routes(timetable, source, destination, k=total - 1, max_transfers=2)
+            assert len(routes) == total - 1 and not exhausted, (source, destination)
+
+def test_crowding_ranks_by_the_busiest_leg(timetable):
+    for source, destination in _queries(timetable):
+        routes, _ = find_top_k_routes(timetable, source, destination, k=20, criterion="crowding", max_transfers=2)
+        costs = [(max(leg["popularity"] for leg in route.legs), route.total_duration) for route in routes]
+        assert costs == sorted(costs), (source, destination)
+
+def test_pages_cover_every_route_without_an_empty_page(timetable, monkeypatch):
+    monkeypatch.setattr(main, "get_timetable", lambda: timetable)
+    monkeypatch.setattr(main, "route_cache", RouteCache())
+    constraints = {"max_wait_time": None, "travel_date": None, "include_overnight": True}
+    for (source, destination), limit in zip(_queries(timetable) * 3, [1] * 8 + [2] * 8 + [5] * 8):
+        main.route_cache.invalidate()
+        expected = find_top_k_routes(timetable, source, destination, k=1000, max_transfers=2)[0]
+        seen, offset = [], 0
+        while True:
+            page, has_more = main.ranked_routes(source, destination, "duration", 2, constraints, offset, limit)
+            assert page or offset == 0, (source, destination, offset)
+            seen.extend(page)
+            if not has_more:
+                break
+            offset += limit
+        assert [route.legs for route in seen] == [route.legs for route in expected], (source, destination)
@@ -0,0 +1,135 @@
+# test_reservations.py
+#
+# Seat holds in memory and in a TrainStore: all-or-nothing holds, expiry,
+# confirmation and concurrent bookers. Run with:
+# python -m pytest -q test_reservations.py
+
+import threading
+import pytest
+from reservations import SeatInventory, StoredSeatInventory, ReservationError, InsufficientSeats, HoldNotFound
+from storage import TrainStore
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def _train(train_id: str, seats: int) -> dict:
+    return {"train_id": train_id, "train_name": train_id, "source": "A", "destination": "B",
+            "departure_time": "08:00", "arrival_time": "09:00", "days_available": ["Daily"],
+            "seats_available": seats, "popularity": 0.5}
+
+@pytest.fixture(params=["memory", "store"])
+def inventory(request, tmp_path):
+    """An inventory over trains T1 (5 seats) and T2 (2 seats), with a clock to move"""
+    clock = Clock()
+    if request.param == "memory":
+        seats = {"T1": 5, "T2": 2}
+        inventory = SeatInventory(lambda ids: {i: seats[i] for i in ids if i in seats}, seats.__setitem__,
+                                  hold_seconds=60, clock=clock)
+        yield inventory, clock
+        return
+    store = TrainStore(str(tmp_path / "trains.db"))
+    store.replace_trains([_train("T1", 5), _train("T2", 2)])
+    yield StoredSeatInventory(store, hold_seconds=60, clock=clock), clock
+    store.close()
+
+def test_hold_takes_seats_on_every_leg(inventory):
+    inventory, _ = inventory
+    hold = inventory.hold(["T1", "T2", "T1"], seats=2)
+    assert hold.train_ids == ["T1", "T2"]
+    assert inventory.seats(["T1", "T2"]) == {"T1": 3, "T2": 0}
+    assert len(inventory) == 1
+
+def test_failed_hold_reserves_nothing(inventory):
+    inventory, _ = inventory
+    version = inventory.version()
+    with pytest.raises(InsufficientSeats) as error:
+        inventory.hold(["T1", "T2"], seats=3)
+    assert (error.value.train_id, error.value.available) == ("T2", 2)
+    with pytest.raises(ReservationError):
+        inventory.hold(["T1", "NOPE"])
+    assert inventory.seats(["T1", "T2"]) == {"T1": 5, "T2": 2}
+    assert inventory.version() == version
+
+def test_expired_hold_gives_seats_back(inventory):
+    inventory, clock = inventory
+    hold = inventory.hold(["T1"], seats=4)
+    version = inventory.version()
+    clock.now += 61
+    assert inventory.seats(["T1"]) == {"T1": 5}
+    assert inventory.version() > version
+    assert inventory.get(hold.hold_id) is None
+    with pytest.raises(HoldNotFound):
+        inventory.confirm(hold.hold_id)
+    assert inventory.seats(["T1"]) == {"T1": 5}
+
+def test_confirmed_hold_keeps_its_seats(inventory):
+    inventory, clock = inventory
+    hold = inventory.hold(["T1", "T2"])
+    assert inventory.confirm(hold.hold_id).confirmed
+    clock.now += 3600
+    assert inventory.seats(["T1", "T2"]) == {"T1": 4, "T2": 1}
+    with pytest.raises(HoldNotFound):
+        inventory.confirm(hold.hold_id)
+    with pytest.raises(HoldNotFound):
+        inventory.release(hold.hold_id)
+
+def test_release_gives_seats_back(inventory):
+    inventory, _ = inventory
+    hold = inventory.hold(["T1", "T2"], seats=2)
+    inventory.release(hold.hold_id)
+    assert inventory.seats(["T1", "T2"]) == {"T1": 5, "T2": 2}
+    with pytest.raises(HoldNotFound):
+        inventory.release(hold.hold_id)
+
+def _race(workers: int, work) -> list:
+    results = [None] * workers
+    barrier = threading.Barrier(workers)
+
+    def run(number):
+        barrier.wait()
+        try:
+            results[number] = work(number)
+        except ReservationError as error:
+            results[number] = error
+
+    threads = [threading.Thread(target=run, args=(number,)) for number in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_holds_never_oversell(inventory):
+    inventory, _ = inventory
+    results = _race(8, lambda _: inventory.hold(["T1", "T2"]))
+    held = [result for result in results if not isinstance(result, ReservationError)]
+    assert len(held) == 2
+    assert all(isinstance(result, InsufficientSeats) for result in results if result not in held)
+    assert inventory.seats(["T1", "T2"]) == {"T1": 3, "T2": 0}
+
+def test_confirm_and_release_race_has_one_winner(inventory):
+    inventory, _ = inventory
+    hold = inventory.hold(["T1"], seats=2)
+    results = _race(6, lambda number: (inventory.confirm if number % 2 else inventory.release)(hold.hold_id))
+    winners = [result for result in results if not isinstance(result, ReservationError)]
+    assert len(winners) == 1
+    # A confirmed hold keeps its seats, a released one gives them back
+    assert inventory.seats(["T1"]) == {"T1": 3 if winners[0].confirmed else 5}
+
+def test_memory_hold_rolls_back_when_a_write_fails():
+    seats = {"T1": 5, "T2": 2}
+
+    def set_seats(train_id, value):
+        if train_id == "T2" and value < 2:
+            raise RuntimeError("write failed")
+        seats[train_id] = value
+
+    inventory = SeatInventory(lambda ids: {i: seats[i] for i in ids}, set_seats)
+    with pytest.raises(RuntimeError):
+        inventory.hold(["T1", "T2"])
+    assert seats == {"T1": 5, "T2": 2}
+    assert len(inventory) == 0
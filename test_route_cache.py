@@ -0,0 +1,51 @@
+# test_route_cache.py
+#
+# RouteCache expiry, LRU eviction and invalidation. Run with:
+# python -m pytest -q test_route_cache.py
+
+from datetime import date
+from route_cache import RouteCache
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_keys_normalize_parameters():
+    assert (RouteCache.make_key(" Mumbai ", "Delhi", engine=" DFS ", travel_date=date(2024, 5, 1), max_transfers=2)
+            == RouteCache.make_key("Mumbai", "Delhi", max_transfers=2, travel_date=date(2024, 5, 1), engine="dfs"))
+    assert RouteCache.make_key("Mumbai", "Delhi", max_transfers=1) != RouteCache.make_key("Mumbai", "Delhi", max_transfers=2)
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = RouteCache(ttl_seconds=10, clock=clock)
+    cache.put("key", ["route"])
+    clock.now = 10
+    assert cache.get("key") == ["route"]
+    clock.now = 10.5
+    assert cache.get("key") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["entries"]) == (1, 1, 1, 0)
+
+def test_least_recently_used_entry_is_evicted():
+    cache = RouteCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_invalidation_drops_all_or_only_affected_entries():
+    cache = RouteCache()
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+    assert cache.invalidate_where(lambda key: key != "b") == 2
+    assert cache.keys() == ["b"]
+    cache.invalidate()
+    assert cache.keys() == []
+    stats = cache.stats()
+    assert (stats["invalidations"], stats["invalidated_entries"]) == (2, 3)
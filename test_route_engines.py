@@ -0,0 +1,99 @@
+# test_route_engines.py
+#
+# Seeded comparisons of the route engines against find_alternative_routes:
+# the same routes, or for the connection scan the same (transfers, arrival)
+# Pareto front. Run with: python -m pytest -q test_route_engines.py
+
+import random
+from datetime import date
+import pytest
+from synthetic_timetable import generate_timetable
+from timetable import TimetableIndex, CompiledTrain
+from route_finder import find_alternative_routes
+from goal_directed import find_routes_bidirectional
+from connection_scan import find_routes_csa
+from transfer_patterns import TransferPatternIndex
+
+SEED = 7
+QUERIES = 12
+
+def _trains(routes):
+    return {tuple(leg["train_id"] for leg in route.legs) for route in routes}
+
+def _routes(routes):
+    return sorted((tuple(leg["train_id"] for leg in route.legs), route.total_duration, route.total_wait_time)
+                  for route in routes)
+
+def _front(routes):
+    """Earliest arrival, in minutes from midnight of day 0, for each number of transfers that improves it"""
+    front, earliest = [], float("inf")
+    for transfers, arrives in sorted((route.transfers, CompiledTrain(route.legs[0]).departure + route.total_duration)
+                                     for route in routes):
+        if arrives < earliest:
+            front.append((transfers, arrives))
+            earliest = arrives
+    return front
+
+@pytest.fixture(scope="module", params=["grid", "hub"])
+def timetable(request):
+    return TimetableIndex(generate_timetable(request.param, 300, seed=SEED))
+
+def _queries(timetable):
+    stations = sorted(timetable.stations())
+    rng = random.Random(SEED)
+    queries = [tuple(rng.sample(stations, 2)) for _ in range(QUERIES)]
+    if "Grid2_1" in stations and "Grid3_4" in stations:
+        queries.append(("Grid2_1", "Grid3_4"))
+    return queries
+
+@pytest.mark.parametrize("max_transfers", [0, 1, 2, 3])
+@pytest.mark.parametrize("constraints", [
+    {},
+    {"max_wait_time": 120},
+    {"max_wait_time": 240, "travel_date": date(2024, 5, 1), "include_overnight": False}
+])
+def test_bidirectional_matches_depth_first(timetable, max_transfers, constraints):
+    for source, destination in _queries(timetable):
+        expected = find_alternative_routes(timetable, source, destination, max_transfers, **constraints)
+        found = find_routes_bidirectional(timetable, source, destination, max_transfers, **constraints)
+        assert _routes(found) == _routes(expected), (source, destination)
+
+@pytest.mark.parametrize("max_transfers", [0, 1, 2, 3])
+@pytest.mark.parametrize("constraints", [
+    {},
+    {"max_wait_time": 120},
+    {"travel_date": date(2024, 5, 1)},
+    {"max_wait_time": 240, "travel_date": date(2024, 5, 1), "include_overnight": False}
+])
+def test_connection_scan_matches_depth_first_front(timetable, max_transfers, constraints):
+    for source, destination in _queries(timetable):
+        expected = find_alternative_routes(timetable, source, destination, max_transfers, **constraints)
+        found = find_routes_csa(timetable, source, destination, max_transfers, **constraints)
+        assert _front(found) == _front(expected), (source, destination)
+        for route in found:
+            stations = [route.legs[0]["source"]] + [leg["destination"] for leg in route.legs]
+            assert len(set(stations)) == len(stations), (source, destination)
+
+@pytest.mark.parametrize("max_transfers", [1, 2, 3])
+def test_transfer_patterns_keep_optimal_routes(timetable, max_transfers):
+    index = TransferPatternIndex.build(timetable, max_transfers)
+    for source, destination in _queries(timetable):
+        expected = find_alternative_routes(timetable, source, destination, max_transfers)
+        found = index.find_routes(timetable, source, destination, max_transfers)
+        assert _trains(found) <= _trains(expected), (source, destination)
+        assert bool(found) == bool(expected), (source, destination)
+        if expected:
+            assert min(route.total_duration for route in found) == min(route.total_duration for route in expected)
+            assert min(route.transfers for route in found) == min(route.transfers for route in expected)
+
+def test_transfer_patterns_refresh_after_a_change(timetable):
+    timetable = TimetableIndex(list(timetable))
+    index = TransferPatternIndex.build(timetable, 2)
+    index.follow(timetable)
+    assert not index.is_stale(timetable)
+    train = dict(next(iter(timetable)), departure_time="03:17")
+    timetable.add_train(train)
+    assert not index.is_stale(timetable)
+    assert index.refreshed_sources > 0
+    fresh = TransferPatternIndex.build(timetable, 2)
+    assert index.patterns == fresh.patterns
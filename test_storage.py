@@ -0,0 +1,93 @@
+# test_storage.py
+#
+# SQLite TrainStore: the connection pool, timetable versions and the holds
+# tables. Run with: python -m pytest -q test_storage.py
+
+import pytest
+from storage import ConnectionPool, TrainStore
+
+def _train(train_id: str, source: str = "A", destination: str = "B", days=("Daily",), seats: int = 5) -> dict:
+    return {"train_id": train_id, "train_name": train_id, "source": source, "destination": destination,
+            "departure_time": "08:00", "arrival_time": "09:00", "days_available": list(days),
+            "seats_available": seats, "popularity": 0.5}
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "trains.db")
+
+@pytest.fixture
+def store(path):
+    store = TrainStore(path)
+    store.replace_trains([_train("T1"), _train("T2", destination="C", days=("Mon", "Fri"), seats=1)])
+    yield store
+    store.close()
+
+def test_pool_hands_out_its_connections_and_times_out(path):
+    TrainStore(path).close()
+    pool = ConnectionPool(path, size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    with pool.connection() as connection:
+        assert connection.execute("SELECT 1").fetchone() == (1,)
+    pool.close()
+
+def test_pool_block_is_one_transaction(store):
+    with pytest.raises(RuntimeError):
+        with store.pool.connection() as connection:
+            connection.execute("UPDATE trains SET seats_available = 0")
+            raise RuntimeError("abort")
+    assert store.seat_availability(["T1", "T2"]) == {"T1": 5, "T2": 1}
+
+def test_trains_round_trip_and_filter(store):
+    assert store.get_train("T2")["days_available"] == ["Mon", "Fri"]
+    assert [train["train_id"] for train in store.get_trains("A")] == ["T1", "T2"]
+    assert [train["train_id"] for train in store.get_trains("A", "C")] == ["T2"]
+    # Tuesday
+    assert [train["train_id"] for train in store.get_trains("A", weekday=1)] == ["T1"]
+
+def test_timetable_changes_bump_the_shared_version(store, path):
+    other = TrainStore(path)
+    version = store.version()
+    assert store.upsert_trains([_train("T3")]) == version + 1
+    assert other.version() == version + 1
+    assert store.delete_train("T3") == version + 2
+    assert store.delete_train("T3") is None
+    assert other.version() == version + 2
+    # Seat counts are not part of the timetable version
+    assert store.update_seats("T1", 3) and not store.update_seats("NOPE", 3)
+    assert other.version() == version + 2
+    other.close()
+
+def test_hold_seats_takes_every_leg_or_none(store):
+    seat_version = store.seat_version()
+    assert store.hold_seats("h1", ["T1", "T2"], 2, expires_at=100.0) == ("T2", 1)
+    assert store.hold_seats("h2", ["T1", "NOPE"], 1, expires_at=100.0) == ("NOPE", None)
+    assert store.seat_availability(["T1", "T2"]) == {"T1": 5, "T2": 1}
+    assert store.count_holds(0.0) == 0
+    assert store.seat_version() == seat_version
+
+    assert store.hold_seats("h3", ["T1", "T2"], 1, expires_at=100.0) is None
+    assert store.seat_availability(["T1", "T2"]) == {"T1": 4, "T2": 0}
+    assert store.get_hold("h3", 50.0) == {"hold_id": "h3", "train_ids": ["T1", "T2"], "seats": 1, "expires_at": 100.0}
+    assert store.seat_version() == seat_version + 1
+
+def test_holds_end_once(store):
+    store.hold_seats("live", ["T1"], 1, expires_at=100.0)
+    store.hold_seats("old", ["T1"], 2, expires_at=10.0)
+    assert store.count_holds(50.0) == 1
+    assert store.get_hold("old", 50.0) is None
+    assert store.expire_holds(50.0) == 1
+    assert store.expire_holds(50.0) == 0
+    assert store.seat_availability(["T1"]) == {"T1": 4}
+
+    assert store.confirm_hold("live", 50.0)["hold_id"] == "live"
+    assert store.confirm_hold("live", 50.0) is None
+    assert store.release_hold("live") is None
+    assert store.seat_availability(["T1"]) == {"T1": 4}
+
+    store.hold_seats("late", ["T1"], 1, expires_at=60.0)
+    # Confirming after expiry gives the seats back instead
+    assert store.confirm_hold("late", 70.0) is None
+    assert store.seat_availability(["T1"]) == {"T1": 4}
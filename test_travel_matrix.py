@@ -0,0 +1,48 @@
+# test_travel_matrix.py
+#
+# Travel-time matrices against find_alternative_routes on seeded timetables.
+# Run with: python -m pytest -q test_travel_matrix.py
+
+import random
+import numpy as np
+import pytest
+from synthetic_timetable import generate_timetable
+from timetable import TimetableIndex, MINUTES_PER_DAY
+from route_finder import find_alternative_routes
+from travel_matrix import MatrixTimetable, UNREACHABLE, travel_time_matrix
+
+SEED = 7
+
+@pytest.fixture(scope="module", params=["grid", "hub"])
+def timetable(request):
+    return TimetableIndex(generate_timetable(request.param, 300, seed=SEED))
+
+@pytest.mark.parametrize("max_wait_time", [0, 45, 120, 1439, 5000])
+def test_transfers_are_every_pair_within_the_wait(timetable, max_wait_time):
+    compiled = MatrixTimetable(timetable)
+    arriving, departing, waits, starts = compiled.transfers(max_wait_time)
+    expected = set()
+    for connection in range(len(compiled.departure)):
+        station = compiled.destination[connection]
+        for onward in range(compiled.first[station], compiled.first[station + 1]):
+            wait = (compiled.departure[onward] - compiled.arrival[connection]) % MINUTES_PER_DAY
+            if wait <= max_wait_time and compiled.destination[onward] != compiled.source[connection]:
+                expected.add((connection, onward, int(wait)))
+    assert set(zip(arriving.tolist(), departing.tolist(), waits.tolist())) == expected
+    # starts[c]:starts[c + 1] are exactly the transfers out of connection c
+    assert (np.repeat(np.arange(len(starts) - 1), np.diff(starts)) == arriving).all()
+
+@pytest.mark.parametrize("max_transfers", [1, 2])
+def test_wait_limited_times_are_lower_bounds(timetable, max_transfers):
+    stations = sorted(timetable.stations())
+    rng = random.Random(SEED)
+    sources = rng.sample(stations, 6)
+    _, targets, matrix = travel_time_matrix(timetable, sources, None, max_transfers, max_wait_time=120, workers=1)
+    for row, source in enumerate(sources):
+        for column, target in enumerate(targets):
+            if target == source:
+                continue
+            routes = find_alternative_routes(timetable, source, target, max_transfers, max_wait_time=120)
+            if routes:
+                assert matrix[row, column] != UNREACHABLE, (source, target)
+                assert matrix[row, column] <= min(route.total_duration for route in routes), (source, target)
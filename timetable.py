@@ -0,0 +1,203 @@
+# timetable.py
+
+from functools import lru_cache
+from typing import Callable, List, Dict, Iterable, Optional, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ALL_DAYS = (1 << len(DAY_NAMES)) - 1
+
+@lru_cache(maxsize=MINUTES_PER_DAY)
+def parse_time(value: str) -> int:
+    """Convert an "HH:MM" time to minutes since midnight"""
+    hours, minutes = value.split(":")
+    return int(hours) * 60 + int(minutes)
+
+def days_mask(days_available: Iterable[str]) -> int:
+    """Convert a days_available list to a service-day bitmask (bit 0 is Monday)"""
+    mask = 0
+    for day in days_available:
+        if day == "Daily":
+            return ALL_DAYS
+        mask |= 1 << DAY_NAMES.index(day)
+    return mask
+
+class CompiledTrain:
+    """Train record with times pre-parsed to integer minutes since midnight"""
+
+    __slots__ = ("train", "train_id", "source", "destination", "departure", "arrival", "duration", "days")
+
+    def __init__(self, train: Dict):
+        self.train = train
+        self.train_id = train["train_id"]
+        self.source = train["source"]
+        self.destination = train["destination"]
+        self.departure = parse_time(train["departure_time"])
+        self.arrival = parse_time(train["arrival_time"])
+        # Overnight journeys wrap past midnight
+        self.duration = (self.arrival - self.departure) % MINUTES_PER_DAY
+        self.days = days_mask(train["days_available"])
+
+    @classmethod
+    def from_columns(cls, train: Dict, departure: int, arrival: int, days: int) -> "CompiledTrain":
+        """Build a record from times and days already in minutes and bitmask form, as in a snapshot"""
+        record = cls.__new__(cls)
+        record.train = train
+        record.train_id = train["train_id"]
+        record.source = train["source"]
+        record.destination = train["destination"]
+        record.departure = departure
+        record.arrival = arrival
+        record.duration = (arrival - departure) % MINUTES_PER_DAY
+        record.days = days
+        return record
+
+    def runs_on(self, weekday: int) -> bool:
+        """Whether the train departs on a weekday (0 is Monday)"""
+        return bool(self.days >> (weekday % 7) & 1)
+
+    def wait_until(self, next_train: "CompiledTrain") -> int:
+        """Minutes between this train's arrival and the next train's departure"""
+        return (next_train.departure - self.arrival) % MINUTES_PER_DAY
+
+class TimetableIndex:
+    """Hash indexes over the train list for constant-time lookups"""
+
+    def __init__(self, trains: Optional[Iterable[Dict]] = None):
+        self.by_source: Dict[str, List[Dict]] = {}
+        self.by_destination: Dict[str, List[Dict]] = {}
+        self.by_pair: Dict[Tuple[str, str], List[Dict]] = {}
+        self.by_id: Dict[str, Dict] = {}
+        self.records: Dict[str, CompiledTrain] = {}
+        self.departures_by_source: Dict[str, List[CompiledTrain]] = {}
+        self.arrivals_by_destination: Dict[str, List[CompiledTrain]] = {}
+        self.version = 0
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        for train in trains or []:
+            self._insert(train)
+
+    @classmethod
+    def from_groups(cls, trains: List[Dict], records: List[CompiledTrain], pairs: Iterable[Tuple[int, int]],
+                    arrivals: Dict[str, List[int]]) -> "TimetableIndex":
+        """Build the indexes from trains already grouped by source and destination, as in a snapshot.
+
+        pairs are the (start, end) row ranges sharing a source and destination,
+        in row order, and arrivals lists the rows arriving at each station. Each
+        index is filled with slices instead of one insert per train.
+        """
+        index = cls()
+        for start, end in pairs:
+            first = trains[start]
+            index.by_pair[(first["source"], first["destination"])] = trains[start:end]
+            index.by_source.setdefault(first["source"], []).extend(trains[start:end])
+            index.departures_by_source.setdefault(first["source"], []).extend(records[start:end])
+        for station, rows in arrivals.items():
+            index.by_destination[station] = list(map(trains.__getitem__, rows))
+            index.arrivals_by_destination[station] = list(map(records.__getitem__, rows))
+        train_ids = [record.train_id for record in records]
+        index.by_id = dict(zip(train_ids, trains))
+        index.records = dict(zip(train_ids, records))
+        return index
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def __contains__(self, train_id: str) -> bool:
+        return train_id in self.by_id
+
+    def _insert(self, train: Dict):
+        record = CompiledTrain(train)
+        self.by_id[train["train_id"]] = train
+        self.records[train["train_id"]] = record
+        self.departures_by_source.setdefault(train["source"], []).append(record)
+        self.arrivals_by_destination.setdefault(train["destination"], []).append(record)
+        self.by_source.setdefault(train["source"], []).append(train)
+        self.by_destination.setdefault(train["destination"], []).append(train)
+        self.by_pair.setdefault((train["source"], train["destination"]), []).append(train)
+
+    @staticmethod
+    def _discard(index: Dict, key, train: Dict):
+        bucket = index.get(key)
+        if bucket is None:
+            return
+        bucket[:] = [t for t in bucket if t is not train and getattr(t, "train", None) is not train]
+        if not bucket:
+            del index[key]
+
+    def load(self, trains: Iterable[Dict]):
+        """Replace every indexed train with a new timetable"""
+        for index in (self.by_source, self.by_destination, self.by_pair, self.by_id, self.records, self.departures_by_source,
+                      self.arrivals_by_destination):
+            index.clear()
+        for train in trains:
+            self._insert(train)
+        self._notify("reload", None)
+
+    def subscribe(self, listener: Callable[[str, Dict], None]):
+        """Call listener(change, train) after a train is added or removed, or the timetable is reloaded"""
+        self._listeners.append(listener)
+
+    def _notify(self, change: str, train: Dict):
+        self.version += 1
+        for listener in self._listeners:
+            listener(change, train)
+
+    def add_train(self, train: Dict):
+        """Add a train, replacing any existing train with the same ID"""
+        # Listeners see the replaced train leave before the new one arrives
+        self.remove_train(train["train_id"])
+        self._insert(train)
+        self._notify("add", train)
+
+    def _remove(self, train: Dict):
+        del self.by_id[train["train_id"]]
+        del self.records[train["train_id"]]
+        self._discard(self.departures_by_source, train["source"], train)
+        self._discard(self.arrivals_by_destination, train["destination"], train)
+        self._discard(self.by_source, train["source"], train)
+        self._discard(self.by_destination, train["destination"], train)
+        self._discard(self.by_pair, (train["source"], train["destination"]), train)
+
+    def remove_train(self, train_id: str) -> Optional[Dict]:
+        """Remove a train by ID and return it, or None if it is not indexed"""
+        train = self.by_id.get(train_id)
+        if train is None:
+            return None
+        self._remove(train)
+        self._notify("remove", train)
+        return train
+
+    def get(self, train_id: str) -> Optional[Dict]:
+        """Look up a train by ID"""
+        return self.by_id.get(train_id)
+
+    def record(self, train_id: str) -> Optional[CompiledTrain]:
+        """Look up a compiled train record by ID"""
+        return self.records.get(train_id)
+
+    def departures(self, station: str) -> List[CompiledTrain]:
+        """Compiled records of trains departing from a station"""
+        return self.departures_by_source.get(station, [])
+
+    def arrivals(self, station: str) -> List[CompiledTrain]:
+        """Compiled records of trains arriving at a station"""
+        return self.arrivals_by_destination.get(station, [])
+
+    def from_source(self, station: str) -> List[Dict]:
+        """Trains departing from a station"""
+        return self.by_source.get(station, [])
+
+    def to_destination(self, station: str) -> List[Dict]:
+        """Trains arriving at a station"""
+        return self.by_destination.get(station, [])
+
+    def between(self, source: str, destination: str) -> List[Dict]:
+        """Direct trains from source to destination"""
+        return self.by_pair.get((source, destination), [])
+
+    def stations(self) -> set:
+        """All stations served by at least one train"""
+        return set(self.by_source) | set(self.by_destination)
@@ -0,0 +1,319 @@
+# transfer_patterns.py
+#
+# Offline transfer-pattern index. For each indexed source station it stores
+# the optimal sequences of stations (source, transfer stations...,
+# destination): for every train leaving the source, the journeys that reach
+# a station earlier than any journey there with fewer trains. A query only
+# evaluates trains along those sequences instead of exploring the whole
+# network. Patterns depend on train times, so the index is fresh while the
+# trains' stations, times and days are unchanged; seat counts are read from
+# the live timetable. An index following a timetable rebuilds only the
+# sources that can reach a changed train.
+#
+#   python transfer_patterns.py build patterns.json --max-transfers 2
+#   python transfer_patterns.py build patterns.json --pairs popular_pairs.txt
+#   python transfer_patterns.py check patterns.json
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from metrics import record_search
+from route_finder import Route, make_leg_filter, next_departure
+from timetable import TimetableIndex, CompiledTrain, MINUTES_PER_DAY
+
+FORMAT_VERSION = 3
+
+# (timetable identity, version) -> timetable fingerprint
+_fingerprints: Dict[Tuple[int, int], int] = {}
+
+def _train_hash(train: Dict) -> int:
+    fields = (train["train_id"], train["source"], train["destination"], train["departure_time"],
+              train["arrival_time"], ",".join(train["days_available"]))
+    return int.from_bytes(hashlib.blake2b("\x00".join(fields).encode("utf-8"), digest_size=16).digest(), "big")
+
+def _remember(timetable: TimetableIndex, fingerprint: int):
+    _fingerprints.clear()
+    _fingerprints[(id(timetable), timetable.version)] = fingerprint
+
+def timetable_fingerprint(timetable: TimetableIndex) -> str:
+    """Order-independent hash of the trains' stations, times and days, cached per timetable version.
+
+    It is the XOR of one hash per train, so adding or removing a train
+    updates it without rehashing the others.
+    """
+    fingerprint = _fingerprints.get((id(timetable), timetable.version))
+    if fingerprint is None:
+        fingerprint = 0
+        for train in timetable:
+            fingerprint ^= _train_hash(train)
+        _remember(timetable, fingerprint)
+    return f"{fingerprint:032x}"
+
+def hop_distances(timetable: TimetableIndex, station: str, max_hops: int, reverse: bool = False) -> Dict[str, int]:
+    """Fewest trains from station to each station within max_hops, or to station when reverse is True"""
+    distances = {station: 0}
+    frontier = [station]
+    for hops in range(1, max_hops + 1):
+        following = []
+        for current in frontier:
+            neighbours = timetable.to_destination(current) if reverse else timetable.from_source(current)
+            for train in neighbours:
+                other = train["source"] if reverse else train["destination"]
+                if other not in distances:
+                    distances[other] = hops
+                    following.append(other)
+        frontier = following
+    return distances
+
+class TransferPatternIndex:
+    """Optimal station sequences between indexed station pairs"""
+
+    def __init__(self, patterns: Dict[str, Dict[str, List[Tuple[str, ...]]]], max_transfers: int,
+                 fingerprint: str, complete_sources: Iterable[str] = (), built_at: Optional[float] = None):
+        self.patterns = patterns
+        self.max_transfers = max_transfers
+        self.fingerprint = fingerprint
+        # Sources indexed for every destination, so a missing pair means no route
+        self.complete_sources = set(complete_sources)
+        self.built_at = built_at or time.time()
+        self.refreshed_sources = 0
+        # Sources of trains added or removed since the last staleness check
+        self._pending: Set[str] = set()
+        self._pending_fresh = False
+
+    @classmethod
+    def build(cls, timetable: TimetableIndex, max_transfers: int = 2,
+              pairs: Optional[Iterable[Tuple[str, str]]] = None) -> "TransferPatternIndex":
+        """Find patterns for every station, or only for the given (source, destination) pairs"""
+        wanted: Optional[Dict[str, Set[str]]] = None
+        if pairs is not None:
+            wanted = {}
+            for source, destination in pairs:
+                wanted.setdefault(source, set()).add(destination)
+        sources = sorted(wanted) if wanted is not None else sorted(timetable.stations())
+
+        patterns = {
+            source: _source_patterns(timetable, source, max_transfers, wanted[source] if wanted is not None else None)
+            for source in sources
+        }
+        return cls(patterns, max_transfers, timetable_fingerprint(timetable),
+                   complete_sources=sources if wanted is None else ())
+
+    def follow(self, timetable: TimetableIndex):
+        """Keep the index fresh as live updates add and remove trains"""
+        timetable_fingerprint(timetable)
+        timetable.subscribe(lambda change, train: self._on_change(timetable, change, train))
+
+    def _on_change(self, timetable: TimetableIndex, change: str, train: Optional[Dict]):
+        previous = _fingerprints.get((id(timetable), timetable.version - 1))
+        # After a reload, or without the previous fingerprint, staleness is decided by a full rehash
+        if change == "reload" or previous is None:
+            self._pending.clear()
+            return
+        _remember(timetable, previous ^ _train_hash(train))
+        # Patterns are rebuilt lazily, so a delay's remove and add cost one refresh
+        if not self._pending:
+            self._pending_fresh = self.fingerprint == f"{previous:032x}"
+        self._pending.add(train["source"])
+
+    def refresh(self, timetable: TimetableIndex, sources: Iterable[str]):
+        """Rebuild the patterns of the given indexed sources from the current trains"""
+        for source in sources:
+            if source in self.complete_sources:
+                self.patterns[source] = _source_patterns(timetable, source, self.max_transfers)
+            elif source in self.patterns:
+                targets = set(self.patterns[source])
+                self.patterns[source] = _source_patterns(timetable, source, self.max_transfers, targets)
+            else:
+                continue
+            self.refreshed_sources += 1
+
+    def is_stale(self, timetable: TimetableIndex) -> bool:
+        """Whether trains changed since the index was built or last refreshed"""
+        current = timetable_fingerprint(timetable)
+        if self._pending:
+            if self._pending_fresh and current != self.fingerprint:
+                # Only sources that can reach a changed train within max_transfers are affected
+                affected: Set[str] = set()
+                for origin in self._pending:
+                    affected.update(hop_distances(timetable, origin, self.max_transfers, reverse=True))
+                self.refresh(timetable, affected)
+                self.fingerprint = current
+            self._pending.clear()
+        return self.fingerprint != current
+
+    def covers(self, source: str, destination: str, max_transfers: int) -> bool:
+        """Whether the index can answer a query without a live search"""
+        if max_transfers > self.max_transfers:
+            return False
+        return source in self.complete_sources or destination in self.patterns.get(source, {})
+
+    def find_routes(self, timetable: TimetableIndex, source: str, destination: str, max_transfers: int = 2,
+                    max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                    include_overnight: bool = True) -> List[Route]:
+        """Evaluate the patterns between two stations.
+
+        Returns the routes of find_alternative_routes that follow an optimal
+        station sequence, which include the fastest route and the one with
+        fewest transfers when there are no wait, day or overnight limits.
+        """
+        allowed = make_leg_filter(travel_date, include_overnight)
+        legs_between: Dict[Tuple[str, str], List[CompiledTrain]] = {}
+        routes: List[Route] = []
+        stats = {"expanded": 0, "pruned": 0}
+
+        def candidates(pair: Tuple[str, str]) -> List[CompiledTrain]:
+            if pair not in legs_between:
+                legs_between[pair] = [record for record in timetable.departures(pair[0]) if record.destination == pair[1]]
+            return legs_between[pair]
+
+        def evaluate(pattern: Tuple[str, ...], index: int, current_route: List[CompiledTrain],
+                     arrives: int, total_duration: int, total_wait_time: int):
+            stats["expanded"] += 1
+            previous = current_route[-1] if current_route else None
+            for next_leg in candidates((pattern[index], pattern[index + 1])):
+                boarding = next_departure(previous, next_leg, arrives, max_wait_time)
+                if boarding is None or not allowed(next_leg, boarding[1]):
+                    stats["pruned"] += 1
+                    continue
+                wait_time, departs = boarding
+                duration = total_duration + wait_time + next_leg.duration
+                wait = total_wait_time + wait_time
+                if index + 2 == len(pattern):
+                    routes.append(Route(
+                        legs=[leg.train for leg in current_route] + [next_leg.train],
+                        total_duration=duration,
+                        total_wait_time=wait,
+                        transfers=len(current_route)
+                    ))
+                else:
+                    evaluate(pattern, index + 1, current_route + [next_leg], departs + next_leg.duration, duration, wait)
+
+        for pattern in self.patterns.get(source, {}).get(destination, ()):
+            if len(pattern) - 2 <= max_transfers:
+                evaluate(pattern, 0, [], 0, 0, 0)
+        record_search("patterns", stats["expanded"], stats["pruned"], len(routes))
+
+        # Sort routes by total duration, direct routes first on ties
+        return sorted(routes, key=lambda x: (x.total_duration, x.transfers))
+
+    def status(self, timetable: TimetableIndex) -> Dict:
+        return {
+            "max_transfers": self.max_transfers,
+            "sources": len(self.patterns),
+            "patterns": sum(len(found) for by_destination in self.patterns.values() for found in by_destination.values()),
+            "built_at": self.built_at,
+            "refreshed_sources": self.refreshed_sources,
+            "stale": self.is_stale(timetable)
+        }
+
+    def save(self, path: str):
+        """Write the index as JSON, atomically"""
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({
+                "format_version": FORMAT_VERSION,
+                "max_transfers": self.max_transfers,
+                "fingerprint": self.fingerprint,
+                "built_at": self.built_at,
+                "complete_sources": sorted(self.complete_sources),
+                # Only the transfer stations are stored; the ends are the keys
+                "patterns": {
+                    source: {destination: [list(pattern[1:-1]) for pattern in found] for destination, found in by_destination.items()}
+                    for source, by_destination in self.patterns.items()
+                }
+            }, f, separators=(",", ":"))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "TransferPatternIndex":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} transfer pattern index")
+        patterns = {
+            source: {destination: [(source, *stops, destination) for stops in found] for destination, found in by_destination.items()}
+            for source, by_destination in data["patterns"].items()
+        }
+        return cls(patterns, data["max_transfers"], data["fingerprint"], data["complete_sources"], data["built_at"])
+
+def _source_patterns(timetable: TimetableIndex, source: str, max_transfers: int,
+                     targets: Optional[Set[str]] = None) -> Dict[str, List[Tuple[str, ...]]]:
+    """Optimal station sequences from source with up to max_transfers + 1 trains, by destination.
+
+    For each train leaving the source, a round per further train keeps the
+    journeys that reach a station earlier than any with fewer trains, so
+    the sequences kept are Pareto-optimal in arrival time and transfers.
+    Waits are taken modulo a day, as in CompiledTrain.wait_until.
+    """
+    found: Dict[str, Set[Tuple[str, ...]]] = {}
+
+    def keep(reached: Dict[str, Tuple[int, Tuple[str, ...]]]):
+        for station, (_, path) in reached.items():
+            if targets is None or station in targets:
+                found.setdefault(station, set()).add(path)
+
+    for first in timetable.departures(source):
+        arrives = first.departure + first.duration
+        # Nothing improves on the source, so journeys never pass back through it
+        best = {source: -1, first.destination: arrives}
+        reached = {first.destination: (arrives, (source, first.destination))}
+        keep(reached)
+        for _ in range(max_transfers):
+            improved: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
+            for station, (arrived, path) in reached.items():
+                for train in timetable.departures(station):
+                    arrives = arrived + (train.departure - arrived) % MINUTES_PER_DAY + train.duration
+                    if arrives < best.get(train.destination, arrives + 1):
+                        best[train.destination] = arrives
+                        improved[train.destination] = (arrives, path + (train.destination,))
+            if not improved:
+                break
+            keep(improved)
+            reached = improved
+    return {station: sorted(paths) for station, paths in found.items()}
+
+def read_pairs(path: str) -> List[Tuple[str, str]]:
+    """Read "source,destination" lines, ignoring blanks and # comments"""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                source, destination = (part.strip() for part in line.split(",", 1))
+                pairs.append((source, destination))
+    return pairs
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or check the transfer pattern index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="precompute patterns from the current timetable")
+    build.add_argument("output")
+    build.add_argument("--max-transfers", type=int, default=2)
+    build.add_argument("--pairs", help="file of \"source,destination\" lines to index instead of every station")
+    check = commands.add_parser("check", help="exit with status 1 if the index is stale")
+    check.add_argument("index")
+    args = parser.parse_args()
+
+    from dummyDB import get_timetable
+    timetable = get_timetable()
+    if args.command == "build":
+        started = time.perf_counter()
+        index = TransferPatternIndex.build(timetable, args.max_transfers, read_pairs(args.pairs) if args.pairs else None)
+        index.save(args.output)
+        status = index.status(timetable)
+        print(f"Indexed {status['patterns']} patterns from {status['sources']} stations "
+              f"in {time.perf_counter() - started:.1f}s")
+    else:
+        status = TransferPatternIndex.load(args.index).status(timetable)
+        print("stale" if status["stale"] else "fresh")
+        if status["stale"]:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# travel_matrix.py
+#
+# Many-to-many travel-time matrices. For each source, a vectorized profile
+# search runs every departure from that source at once: arrival times are a
+# (departures x stations) array relaxed once per leg. When waits are limited
+# they are kept per connection instead, as sparse (departure, connection,
+# arrival) labels for the connections each round actually reaches. Sources
+# are spread over a process pool.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from timetable import TimetableIndex, MINUTES_PER_DAY
+
+UNREACHABLE = -1
+INFINITY = np.int64(1) << 40
+
+# Sources per pool task, and the fewest sources worth starting a pool for
+CHUNK_SIZE = 16
+MIN_PARALLEL_SOURCES = 64
+
+class MatrixTimetable:
+    """Connections as NumPy columns, sorted by source station"""
+
+    def __init__(self, timetable: TimetableIndex):
+        self.version = timetable.version
+        self.stations: List[str] = sorted(timetable.stations())
+        self.index: Dict[str, int] = {station: number for number, station in enumerate(self.stations)}
+        records = sorted(timetable.records.values(), key=lambda record: self.index[record.source])
+        self.source = np.array([self.index[record.source] for record in records], dtype=np.int32)
+        self.destination = np.array([self.index[record.destination] for record in records], dtype=np.int32)
+        self.departure = np.array([record.departure for record in records], dtype=np.int64)
+        self.duration = np.array([record.duration for record in records], dtype=np.int64)
+        self.days = np.array([record.days for record in records], dtype=np.int64)
+        # first[s]:first[s + 1] are the connections leaving station s
+        self.first = np.searchsorted(self.source, np.arange(len(self.stations) + 1)).astype(np.int64)
+        # Relaxation groups connections by destination for a segmented minimum
+        self.by_destination = np.argsort(self.destination, kind="stable")
+
+        self.arrival = (self.departure + self.duration) % MINUTES_PER_DAY
+        self._transfers: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def transfers(self, max_wait_time: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Connection pairs with a wait of at most max_wait_time, as (arriving, departing, wait, starts).
+
+        Pairs are sorted by arriving connection; starts[c]:starts[c + 1] are
+        the transfers out of connection c. Each arrival finds the departures
+        in its wait window by binary search over departures sorted by station
+        and time, with windows past midnight continuing from the day's start.
+        """
+        if max_wait_time not in self._transfers:
+            # Waits are taken modulo a day, as in CompiledTrain.wait_until
+            window = min(max_wait_time, MINUTES_PER_DAY - 1)
+            outbound = np.lexsort((self.departure, self.source))
+            times = self.source[outbound].astype(np.int64) * MINUTES_PER_DAY + self.departure[outbound]
+            day = self.destination.astype(np.int64) * MINUTES_PER_DAY
+            late = np.minimum(self.arrival + window, MINUTES_PER_DAY - 1)
+            wrapped = self.arrival + window - MINUTES_PER_DAY
+            arriving, positions = [], []
+            for low, high in ((day + self.arrival, day + late), (day, day + wrapped)):
+                starts = np.searchsorted(times, low, side="left")
+                counts = np.maximum(np.searchsorted(times, high, side="right") - starts, 0)
+                total = int(counts.sum())
+                arriving.append(np.repeat(np.arange(len(counts)), counts))
+                positions.append(np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total))
+            arriving = np.concatenate(arriving)
+            departing = outbound[np.concatenate(positions)]
+            # Going straight back where the arriving train came from revisits a station
+            keep = self.destination[departing] != self.source[arriving]
+            arriving, departing = arriving[keep], departing[keep]
+            order = np.argsort(arriving, kind="stable")
+            arriving, departing = arriving[order], departing[order]
+            waits = (self.departure[departing] - self.arrival[arriving]) % MINUTES_PER_DAY
+            starts = np.searchsorted(arriving, np.arange(len(self.departure) + 1))
+            self._transfers[max_wait_time] = (arriving, departing, waits, starts)
+        return self._transfers[max_wait_time]
+
+    def arrays(self, max_wait_time: Optional[int] = None) -> Tuple:
+        """The columns one_to_all works on, with the allowed transfers when waits are limited"""
+        transfers = self.transfers(max_wait_time) if max_wait_time is not None else None
+        return (len(self.stations), self.source, self.destination, self.departure, self.duration,
+                self.days, self.first, self.by_destination, transfers)
+
+_compiled: Optional[MatrixTimetable] = None
+_compiled_source: Optional[TimetableIndex] = None
+
+def get_matrix_timetable(timetable: TimetableIndex) -> MatrixTimetable:
+    """Return the compiled connection arrays, rebuilding them when the timetable changes"""
+    global _compiled, _compiled_source
+    if _compiled is None or _compiled_source is not timetable or _compiled.version != timetable.version:
+        _compiled = MatrixTimetable(timetable)
+        _compiled_source = timetable
+    return _compiled
+
+def _segment_minimum(values: np.ndarray, keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Column-wise minimum of values over runs of equal keys, returned as (keys, minima)"""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.minimum.reduceat(values, starts, axis=1)
+
+def _key_minimum(keys: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Minimum of values for each distinct key, returned as (sorted keys, minima)"""
+    if not len(keys):
+        return keys, values
+    order = np.argsort(keys, kind="stable")
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.minimum.reduceat(values, starts)
+
+def one_to_all(arrays: Tuple, source: int, max_transfers: int = 2, max_wait_time: Optional[int] = None,
+               weekday: Optional[int] = None, include_overnight: bool = True) -> np.ndarray:
+    """Shortest journey in minutes from one station to every station, UNREACHABLE where there is none.
+
+    Waits and service days follow find_alternative_routes. Without a wait
+    limit the earliest arrival at a station is all that matters, so arrivals
+    are kept per station; with one they are kept per connection, relaxed over
+    the transfers the limit allows. arrays comes from MatrixTimetable.arrays.
+
+    The result is an approximation. Journeys may pass a station twice
+    through a cycle of three or more trains, which find_alternative_routes
+    never returns, so with a wait limit every time is a lower bound on the
+    shortest route it finds. Without one, a travel_date is only checked
+    against the earliest arrival at each station, so a route needing a later
+    arrival to catch a train that runs that day can be missed.
+    """
+    stations, from_station, to_station, departure, duration, days, first, by_destination, transfers = arrays
+    start, end = first[source], first[source + 1]
+    result = np.full(stations, UNREACHABLE, dtype=np.int64)
+    result[source] = 0
+
+    # One row per departure from the source; first legs leave on day 0
+    departs = departure[start:end]
+    usable = np.ones(end - start, dtype=bool)
+    if weekday is not None:
+        usable &= (days[start:end] >> weekday) & 1 == 1
+    if not include_overnight:
+        usable &= departs + duration[start:end] < MINUTES_PER_DAY
+    rows = np.flatnonzero(usable)
+    if not len(rows):
+        return result
+    departs = departs[rows]
+    first_legs = start + rows
+    best = np.full((len(rows), stations), INFINITY, dtype=np.int64)
+
+    def relax(arrived: np.ndarray, waits, legs: np.ndarray) -> np.ndarray:
+        # Arrival over each candidate leg, INFINITY where it cannot be boarded
+        boards = arrived + waits
+        ok = arrived < INFINITY
+        if weekday is not None:
+            ok &= (days[legs] >> ((weekday + boards // MINUTES_PER_DAY) % 7)) & 1 == 1
+        arrives = boards + duration[legs]
+        if not include_overnight:
+            ok &= arrives < MINUTES_PER_DAY
+        return np.where(ok, arrives, INFINITY)
+
+    if transfers is None:
+        current = np.full_like(best, INFINITY)
+        current[np.arange(len(rows)), to_station[first_legs]] = departs + duration[first_legs]
+        current[:, source] = INFINITY
+        np.minimum(best, current, out=best)
+        for _ in range(max_transfers):
+            # Connections leaving a station reached with the previous number of legs,
+            # grouped by destination so each group's minimum is that station's arrival
+            reached = (current < INFINITY).any(axis=0)
+            legs = by_destination[reached[from_station[by_destination]]]
+            if not len(legs):
+                break
+            arrived = current[:, from_station[legs]]
+            arrives = relax(arrived, (departure[legs] - arrived) % MINUTES_PER_DAY, legs)
+            targets, minima = _segment_minimum(arrives, to_station[legs])
+            current = np.full_like(best, INFINITY)
+            current[:, targets] = minima
+            # Routes never pass back through their source
+            current[:, source] = INFINITY
+            np.minimum(best, current, out=best)
+    else:
+        arriving, departing, waits, starts = transfers
+        allowed = to_station[departing] != source
+        connections = len(departure)
+        flat_best = best.reshape(-1)
+        # Labels (row, connection, arrival) for connections ridden with the current number of legs
+        label_rows = np.arange(len(rows))
+        label_legs = first_legs
+        label_arrivals = departs + duration[first_legs]
+        for transfer in range(max_transfers + 1):
+            cells, minima = _key_minimum(label_rows * stations + to_station[label_legs], label_arrivals)
+            flat_best[cells] = np.minimum(flat_best[cells], minima)
+            if transfer == max_transfers:
+                break
+            # Transfers out of each label's connection, concatenated
+            counts = starts[label_legs + 1] - starts[label_legs]
+            total = int(counts.sum())
+            if not total:
+                break
+            owners = np.repeat(np.arange(len(label_legs)), counts)
+            pairs = np.repeat(starts[label_legs] - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            pairs_allowed = allowed[pairs]
+            owners, pairs = owners[pairs_allowed], pairs[pairs_allowed]
+            legs = departing[pairs]
+            arrives = relax(label_arrivals[owners], waits[pairs], legs)
+            boarded = arrives < INFINITY
+            keys, label_arrivals = _key_minimum(label_rows[owners[boarded]] * connections + legs[boarded],
+                                                arrives[boarded])
+            label_rows, label_legs = keys // connections, keys % connections
+            if not len(label_legs):
+                break
+
+    durations = (best - departs[:, None]).min(axis=0)
+    reachable = best.min(axis=0) < INFINITY
+    result[reachable] = durations[reachable]
+    result[source] = 0
+    return result
+
+_worker_arrays: Optional[Tuple] = None
+
+def _init_worker(arrays: Tuple):
+    global _worker_arrays
+    _worker_arrays = arrays
+
+def _rows(sources: Sequence[int], options: Tuple) -> List[np.ndarray]:
+    return [one_to_all(_worker_arrays, source, *options) for source in sources]
+
+def iter_matrix_rows(timetable: TimetableIndex, sources: Sequence[str], max_transfers: int = 2,
+                     max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                     include_overnight: bool = True, workers: Optional[int] = None) -> Iterator[Tuple[str, np.ndarray]]:
+    """Yield (source, durations to every station) in source order, computing rows on a process pool"""
+    compiled = get_matrix_timetable(timetable)
+    indexes = [compiled.index[source] for source in sources]
+    options = (max_transfers, max_wait_time, travel_date.weekday() if travel_date else None, include_overnight)
+    arrays = compiled.arrays(max_wait_time)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(indexes) < MIN_PARALLEL_SOURCES:
+        for source, index in zip(sources, indexes):
+            yield source, one_to_all(arrays, index, *options)
+        return
+
+    chunks = [indexes[i:i + CHUNK_SIZE] for i in range(0, len(indexes), CHUNK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(arrays,)) as pool:
+        position = 0
+        for rows in pool.map(_rows, chunks, [options] * len(chunks)):
+            for row in rows:
+                yield sources[position], row
+                position += 1
+
+def travel_time_matrix(timetable: TimetableIndex, sources: Optional[Sequence[str]] = None,
+                       targets: Optional[Sequence[str]] = None, max_transfers: int = 2,
+                       max_wait_time: Optional[int] = None, travel_date: Optional[date] = None,
+                       include_overnight: bool = True, workers: Optional[int] = None) -> Tuple[List[str], List[str], np.ndarray]:
+    """Shortest journey minutes between every source and target station (all stations by default).
+
+    Returns (sources, targets, matrix) where matrix[i, j] is UNREACHABLE when
+    no route exists. Raises KeyError for stations without trains.
+    """
+    compiled = get_matrix_timetable(timetable)
+    sources = list(sources) if sources else compiled.stations
+    targets = list(targets) if targets else compiled.stations
+    columns = [compiled.index[target] for target in targets]
+    for source in sources:
+        compiled.index[source]
+    matrix = np.empty((len(sources), len(targets)), dtype=np.int32)
+    rows = iter_matrix_rows(timetable, sources, max_transfers, max_wait_time, travel_date, include_overnight, workers)
+    for number, (_, row) in enumerate(rows):
+        matrix[number] = row[columns]
+    return sources, targets, matrix